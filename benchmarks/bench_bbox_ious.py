@@ -0,0 +1,82 @@
+"""
+Benchmark: bbox_ious do tracker (loop Python original x NumPy vetorizado x numba).
+
+Escala de 10x10 até 2000x500 pares (tracks x detecções) e confere que
+todos os backends devolvem exatamente o mesmo resultado do loop original.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_bbox_ious
+"""
+
+import time
+
+import numpy as np
+
+from tracker import matching
+
+SIZES = [(10, 10), (50, 50), (100, 100), (300, 100), (1000, 300), (2000, 500)]
+
+
+def bbox_ious_loop(a, b):
+    """Implementação original (loop duplo em Python)."""
+    ious = np.zeros((a.shape[0], b.shape[0]), dtype=np.float32)
+    for i in range(a.shape[0]):
+        for j in range(b.shape[0]):
+            xa1, ya1, xa2, ya2 = a[i]
+            xb1, yb1, xb2, yb2 = b[j]
+
+            inter_x1 = max(xa1, xb1)
+            inter_y1 = max(ya1, yb1)
+            inter_x2 = min(xa2, xb2)
+            inter_y2 = min(ya2, yb2)
+
+            inter = max(0, inter_x2 - inter_x1) * max(0, inter_y2 - inter_y1)
+            area_a = (xa2 - xa1) * (ya2 - ya1)
+            area_b = (xb2 - xb1) * (yb2 - yb1)
+            union = area_a + area_b - inter + 1e-6
+
+            ious[i, j] = inter / union
+    return ious
+
+
+def random_tlbr(rng, n):
+    xy = rng.uniform(0, 1800, size=(n, 2))
+    wh = rng.uniform(5, 200, size=(n, 2))
+    return np.concatenate([xy, xy + wh], axis=1)
+
+
+def bench(fn, a, b, budget_s=0.5):
+    fn(a, b)
+    runs, t0 = 0, time.perf_counter()
+    while True:
+        fn(a, b)
+        runs += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= budget_s or runs >= 200:
+            return elapsed / runs * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    backends = {"numpy": lambda a, b: matching.bbox_ious(a, b, backend="numpy")}
+    if matching.numba is not None:
+        backends["numba"] = lambda a, b: matching.bbox_ious(a, b, backend="numba")
+    else:
+        print("ℹ️ numba não instalado: backend numba ignorado")
+
+    print("=" * 72)
+    print(f"{'pares':>11} | {'loop (ms)':>10} | " + " | ".join(f"{k + ' (ms)':>12}" for k in backends)
+          + " | idêntico")
+    print("=" * 72)
+    for n, m in SIZES:
+        a, b = random_tlbr(rng, n), random_tlbr(rng, m)
+        ref = bbox_ious_loop(a, b)
+        same = all(np.array_equal(fn(a, b), ref) for fn in backends.values())
+        t_loop = bench(bbox_ious_loop, a, b, budget_s=0.0)
+        times = [bench(fn, a, b) for fn in backends.values()]
+        print(f"{n:>5}x{m:<5} | {t_loop:10.2f} | " + " | ".join(f"{t:12.3f}" for t in times)
+              + f" | {'sim' if same else 'NÃO'}")
+
+
+if __name__ == "__main__":
+    main()
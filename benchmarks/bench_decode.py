@@ -0,0 +1,82 @@
+"""
+Micro-benchmark: decodificação YOLO em loop Python vs vetorizada.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_decode
+"""
+
+import time
+
+import numpy as np
+
+from detector.decode import decode_yolo_output
+
+
+def decode_loop(output, conf):
+    """Implementação original (loop por predição) usada como referência."""
+    detections = []
+    for pred in output[0]:
+        x_center, y_center, width, height = pred[:4]
+        objectness = float(pred[4])
+        if objectness < conf:
+            continue
+        class_scores = pred[5:]
+        cls_id = int(np.argmax(class_scores))
+        score = float(class_scores[cls_id] * objectness)
+        if score < conf:
+            continue
+        detections.append((cls_id, score, x_center - width / 2, y_center - height / 2))
+    return detections
+
+
+def make_output(num_preds, channels_first, rng):
+    """Gera uma saída sintética com poucas predições acima do threshold."""
+    boxes = rng.uniform(0, 640, size=(num_preds, 4)).astype(np.float32)
+    if channels_first:
+        cls = rng.uniform(0, 0.2, size=(num_preds, 80)).astype(np.float32)
+        cls[rng.choice(num_preds, num_preds // 100, replace=False), 0] = 0.9
+        out = np.concatenate([boxes, cls], axis=1)
+        return np.ascontiguousarray(out.T[None])
+    obj = rng.uniform(0, 0.5, size=(num_preds, 1)).astype(np.float32)
+    obj[rng.choice(num_preds, num_preds // 100, replace=False)] = 0.9
+    cls = rng.uniform(0, 1, size=(num_preds, 80)).astype(np.float32)
+    return np.concatenate([boxes, obj, cls], axis=1)[None]
+
+
+def bench(fn, repeat):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    conf = 0.25
+
+    print("=" * 60)
+    print("Decodificação YOLO: loop Python vs NumPy vetorizado")
+    print("=" * 60)
+
+    # Layout clássico (1, 25200, 85)
+    output = make_output(25200, channels_first=False, rng=rng)
+    ref = decode_loop(output, conf)
+    boxes, scores, cls_ids = decode_yolo_output(output, conf)
+    assert len(ref) == len(scores)
+    assert np.allclose([s for _, s, _, _ in ref], scores, atol=1e-6)
+    assert [c for c, _, _, _ in ref] == cls_ids.tolist()
+
+    t_loop = bench(lambda: decode_loop(output, conf), repeat=3)
+    t_vec = bench(lambda: decode_yolo_output(output, conf), repeat=50)
+    print(f"(1, 25200, 85) loop:       {t_loop:8.2f} ms")
+    print(f"(1, 25200, 85) vetorizado: {t_vec:8.2f} ms  ({t_loop / t_vec:.0f}x)")
+
+    # Layout anchor-free (1, 84, 8400) do yolov5nu
+    output = make_output(8400, channels_first=True, rng=rng)
+    t_vec = bench(lambda: decode_yolo_output(output, conf), repeat=50)
+    print(f"(1, 84, 8400)  vetorizado: {t_vec:8.2f} ms  ({len(decode_yolo_output(output, conf)[1])} deteccoes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark: GMC (sparseOptFlow e ecc) numa sequência sintética 1920x1080 com
+movimento de câmera conhecido (translação + leve rotação) e objetos que se
+movem por conta própria.
+
+Compara o rastreamento contínuo dos pontos (novos cantos só abaixo de
+`min_features`) com a detecção de cantos a cada frame (min_features acima do
+orçamento, como o caminho antigo fazia), e o ECC em escala única vs
+pirâmide, com e sem orçamento de tempo, em tempo por frame e erro da
+translação estimada.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_gmc
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+from tracker.gmc import GMC
+
+W, H = 1920, 1080
+FRAMES = 120
+N_OBJ = 40
+
+
+def make_sequence(rng, n_frames=FRAMES, still=0, camera_step=3):
+    """
+    Frames BGR, detecções (N, 5) e a matriz 2x3 real do movimento da câmera em cada frame.
+
+    Args:
+        n_frames: número de frames
+        still: frames iniciais com a câmera parada (só os objetos se movem)
+        camera_step: desvio padrão do deslocamento da câmera por frame (px)
+    """
+    # Cena maior que o frame, com textura para o goodFeaturesToTrack
+    scene = rng.integers(0, 255, size=(H // 8 + 40, W // 8 + 40), dtype=np.uint8)
+    scene = cv2.resize(scene, (W + 320, H + 320), interpolation=cv2.INTER_CUBIC)
+    scene = cv2.GaussianBlur(scene, (5, 5), 1.0)
+    scene = cv2.cvtColor(scene, cv2.COLOR_GRAY2BGR)
+
+    pos = rng.uniform([100, 100], [W - 100, H - 100], size=(N_OBJ, 2))
+    vel = rng.normal(0, 6, size=(N_OBJ, 2))
+    size = rng.uniform(40, 160, size=(N_OBJ, 2))
+    colors = rng.integers(0, 255, size=(N_OBJ, 3))
+
+    frames, dets, warps = [], [], []
+    cam = np.array([160.0, 160.0])
+    angle = 0.0
+    for f in range(n_frames):
+        step = rng.normal(0, camera_step, 2) if f >= still else np.zeros(2)
+        turn = rng.normal(0, 0.05) if f >= still else 0.0
+        cam += step
+        angle += turn
+        # Câmera: rotação em torno do centro do frame e deslocamento dentro da cena
+        M = cv2.getRotationMatrix2D((W / 2, H / 2), angle, 1.0)
+        M[:, 2] -= M[:, :2] @ cam
+        frame = cv2.warpAffine(scene, M, (W, H), borderMode=cv2.BORDER_REFLECT)
+
+        pos += vel
+        vel[(pos[:, 0] < 100) | (pos[:, 0] > W - 100), 0] *= -1
+        vel[(pos[:, 1] < 100) | (pos[:, 1] > H - 100), 1] *= -1
+        boxes = np.concatenate([pos - size / 2, pos + size / 2], 1)
+        for (x1, y1, x2, y2), c in zip(boxes.astype(int), colors):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), tuple(int(v) for v in c), -1)
+
+        frames.append(frame)
+        dets.append(np.concatenate([boxes, np.ones((N_OBJ, 1))], 1).astype(np.float32))
+        warps.append(M)
+
+    # Movimento real entre frames consecutivos: M_t . M_{t-1}^-1
+    truth = [np.eye(2, 3)]
+    for prev, curr in zip(warps, warps[1:]):
+        inv = cv2.invertAffineTransform(prev)
+        truth.append(curr[:, :2] @ np.vstack([inv, [0, 0, 1]])[:2] + np.c_[np.zeros((2, 2)), curr[:, 2]])
+    return frames, dets, truth
+
+
+def run(frames, dets, truth, method='sparseOptFlow', **kwargs):
+    gmc = GMC(method=method, downscale=2, **kwargs)
+    times, errors = [], []
+    for frame, det, real in zip(frames, dets, truth):
+        t0 = time.perf_counter()
+        warp = gmc.apply(frame, det)
+        times.append(time.perf_counter() - t0)
+        errors.append(np.abs(warp[:, 2] - real[:, 2]).max())
+    return np.mean(times[1:]) * 1000, np.mean(errors[1:]), np.max(errors[1:])
+
+
+def main():
+    rng = np.random.default_rng(0)
+    frames, dets, truth = make_sequence(rng)
+
+    print("=" * 72)
+    print(f"{'modo':>34} | {'ms/frame':>8} | {'erro médio (px)':>15} | {'máx':>6}")
+    print("=" * 72)
+    for name, kwargs in [("cantos a cada frame (antigo)", dict(max_features=1000, min_features=1001)),
+                         ("rastreamento contínuo", dict(max_features=1000)),
+                         ("rastreamento contínuo, 400 pontos", dict(max_features=400)),
+                         ("ecc escala única", dict(method='ecc', ecc_levels=1)),
+                         ("ecc pirâmide 3 níveis", dict(method='ecc', ecc_levels=3)),
+                         ("ecc pirâmide 4 níveis, 5 ms", dict(method='ecc', ecc_levels=4, ecc_budget_ms=5))]:
+        ms, err, worst = run(frames, dets, truth, **kwargs)
+        print(f"{name:>34} | {ms:8.2f} | {err:15.3f} | {worst:6.2f}")
+
+    # Câmera rápida: o ECC em escala única não converge, a pirâmide sim
+    frames, dets, truth = make_sequence(rng, 40, camera_step=12)
+    print("=" * 72)
+    print("câmera rápida (12 px/frame)")
+    print("=" * 72)
+    for name, kwargs in [("ecc escala única", dict(method='ecc', ecc_levels=1)),
+                         ("ecc pirâmide 3 níveis", dict(method='ecc', ecc_levels=3))]:
+        ms, err, worst = run(frames, dets, truth, **kwargs)
+        print(f"{name:>34} | {ms:8.2f} | {err:15.3f} | {worst:6.2f}")
+
+
+if __name__ == "__main__":
+    main()
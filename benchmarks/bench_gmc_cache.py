@@ -0,0 +1,97 @@
+"""
+Benchmark: gravação e reprodução dos warps do GMC em sidecar.
+
+Grava a sequência sintética de bench_gmc num vídeo temporário, roda o GMC
+sparseOptFlow sobre ele gravando o sidecar (1ª execução), roda de novo
+reproduzindo o sidecar (2ª execução) e confere que os warps são idênticos.
+Também confere que uma execução interrompida (ESC) não deixa um sidecar
+reproduzível, que um sidecar mais curto que o vídeo é reproduzido e depois
+completado com os warps calculados, e que mudar um parâmetro do GMC, o modo
+assíncrono ou a fonte das detecções mascaradas gera outro sidecar.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_gmc_cache
+"""
+
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.bench_gmc import make_sequence
+from tracker.gmc import GMC
+from tracker.gmc_cache import HEADER_DTYPE, WARP_DTYPE, read_header
+
+
+def write_video(path, frames):
+    height, width = frames[0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (width, height))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+
+
+def run(video, cache_dir, dets, stop=None, **kwargs):
+    """(warps, ms/frame do GMC, modo) de uma passada sobre o vídeo (interrompida após `stop` frames)."""
+    gmc = GMC(method='sparseOptFlow', cache_dir=cache_dir, video=video, **kwargs)
+    mode = 'reprodução' if gmc.replay is not None else 'gravação'
+    cap = cv2.VideoCapture(video)
+    warps, elapsed = [], 0.0
+    finished = False
+    for det in dets + [None]:
+        if stop is not None and len(warps) == stop:
+            break
+        ok, frame = cap.read()
+        if not ok:
+            finished = True
+            break
+        t0 = time.perf_counter()
+        warps.append(gmc.apply(frame, det))
+        elapsed += time.perf_counter() - t0
+    cap.release()
+    gmc.close(complete=finished)
+    return np.array(warps), elapsed / len(warps) * 1000, mode
+
+
+def main():
+    rng = np.random.default_rng(0)
+    frames, dets, _ = make_sequence(rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = os.path.join(tmp, 'seq.avi')
+        cache_dir = os.path.join(tmp, 'gmc')
+        write_video(video, frames)
+
+        print("=" * 60)
+        _, _, mode_cut = run(video, cache_dir, dets, stop=len(dets) // 2)
+        print(f"execução interrompida na metade ({mode_cut})")
+        first, ms_first, mode_first = run(video, cache_dir, dets)
+        print(f"execução completa ({mode_first}): {ms_first:7.2f} ms/frame")
+        second, ms_second, mode_second = run(video, cache_dir, dets)
+        print(f"execução seguinte ({mode_second}): {ms_second:7.3f} ms/frame")
+        print(f"warps idênticos: {'sim' if np.array_equal(first, second) else 'NÃO'}")
+
+        # Sidecar completo, mas cortado na metade: reproduz e completa o resto
+        path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+        os.truncate(path, HEADER_DTYPE.itemsize + len(first) // 2 * WARP_DTYPE.itemsize)
+        resumed, _, _ = run(video, cache_dir, dets)
+        header = read_header(path)
+        again, _, mode_again = run(video, cache_dir, dets)
+        err = np.abs(resumed - first)[:, :, 2].max()
+        print(f"sidecar curto: completado {'sim' if header['complete'] else 'NÃO'}, depois {mode_again},"
+              f" {len(again)} frames, diferença máx. da translação {err:.3f} px")
+
+        _, _, mode_other = run(video, cache_dir, dets, max_features=400)
+        print(f"max_features=400: {mode_other}")
+        _, _, mode_async = run(video, cache_dir, dets, async_mode=True)
+        _, _, mode_source = run(video, cache_dir, dets, detections_source=dict(track_high_thresh=0.6))
+        print(f"async_mode=True: {mode_async} | outra fonte de detecções: {mode_source}")
+        sidecars = sorted(os.listdir(cache_dir))
+        size = os.path.getsize(os.path.join(cache_dir, sidecars[0]))
+        print(f"sidecars: {len(sidecars)} ({size} bytes cada, {len(first)} frames)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark: bypass do GMC com câmera parada (gmc_static_bypass).
+
+Sequência sintética 1920x1080 com a câmera parada nos primeiros frames (só
+os objetos se movem) e em movimento depois. Mede o tempo por frame do GMC
+nas duas fases, quantos frames foram atendidos pelo bypass e quantos frames
+o GMC levou para voltar a estimar depois que a câmera começou a se mover.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_gmc_static
+"""
+
+import time
+
+import numpy as np
+
+from benchmarks.bench_gmc import make_sequence
+from tracker.gmc import GMC
+
+FRAMES = 240
+STILL = 180
+
+
+def run(frames, dets, truth, **kwargs):
+    gmc = GMC(method='sparseOptFlow', downscale=2, **kwargs)
+    times, errors, bypassed = [], [], []
+    for frame, det, real in zip(frames, dets, truth):
+        t0 = time.perf_counter()
+        warp = gmc.apply(frame, det)
+        times.append(time.perf_counter() - t0)
+        errors.append(np.abs(warp[:, 2] - real[:, 2]).max())
+        bypassed.append(gmc.static)
+    times, errors, bypassed = map(np.array, (times, errors, bypassed))
+    resumed = np.flatnonzero(~bypassed[STILL:])
+    return dict(still_ms=times[1:STILL].mean() * 1000, moving_ms=times[STILL:].mean() * 1000,
+                bypassed=int(bypassed[:STILL].sum()),
+                delay=int(resumed[0]) if len(resumed) else None, moving_err=errors[STILL:].mean())
+
+
+def main():
+    rng = np.random.default_rng(0)
+    frames, dets, truth = make_sequence(rng, FRAMES, still=STILL)
+
+    print("=" * 78)
+    print(f"{STILL} frames com a câmera parada, {FRAMES - STILL} em movimento")
+    print("=" * 78)
+    for name, kwargs in [("sem bypass", dict()),
+                         ("bypass, conferência a cada 30", dict(static_bypass=True, static_check_interval=30)),
+                         ("bypass, conferência a cada 10", dict(static_bypass=True, static_check_interval=10))]:
+        r = run(frames, dets, truth, **kwargs)
+        print(f"{name:>30} | parada {r['still_ms']:6.2f} ms/frame ({r['bypassed']:3d} em bypass)"
+              f" | movimento {r['moving_ms']:6.2f} ms/frame, erro {r['moving_err']:.2f} px"
+              f" | retomou após {r['delay']} frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: compensação de movimento da câmera nos estados dos tracks
+(STrack.multi_gmc) de 0 a 1000 tracks.
+
+Compara o loop original (kron 8x8 + dois produtos 8x8 por track) com a
+versão em lote por blocos 2x2 (STrack.warp_states) e mede o atalho para
+a transformação identidade. Confere que os resultados batem.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_gmc_warp
+"""
+
+import time
+
+import numpy as np
+
+from tracker.bot_sort import STrack
+from tracker.track_bank import TrackBank
+
+SIZES = [0, 1, 10, 100, 300, 1000]
+
+
+def warp_loop(multi_mean, multi_covariance, H):
+    """Implementação original de STrack.multi_gmc."""
+    R = H[:2, :2]
+    R8x8 = np.kron(np.eye(4, dtype=float), R)
+    t = H[:2, 2]
+    means, covs = [], []
+    for mean, cov in zip(multi_mean, multi_covariance):
+        mean = R8x8.dot(mean)
+        mean[:2] += t
+        cov = R8x8.dot(cov).dot(R8x8.transpose())
+        means.append(mean)
+        covs.append(cov)
+    return np.asarray(means).reshape(-1, 8), np.asarray(covs).reshape(-1, 8, 8)
+
+
+def make_tracks(rng, n):
+    bank = TrackBank()
+    tracks = []
+    for _ in range(n):
+        track = STrack(np.r_[rng.uniform(0, 1800, 2), rng.uniform(10, 200, 2)], 0.9)
+        track.attach(bank)
+        track.mean = rng.normal(0, 50, 8)
+        a = rng.normal(0, 1, (8, 8))
+        track.covariance = a @ a.T
+        tracks.append(track)
+    return bank, tracks
+
+
+def bench(fn, repeat=50):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    angle = 0.01
+    H = np.array([[np.cos(angle), -np.sin(angle), 3.0], [np.sin(angle), np.cos(angle), -2.0]])
+    identity = np.eye(2, 3)
+
+    print("=" * 72)
+    print(f"{'tracks':>7} | {'loop (ms)':>10} | {'blocos 2x2 (ms)':>15} | {'identidade (ms)':>15} | confere")
+    print("=" * 72)
+    for n in SIZES:
+        bank, tracks = make_tracks(rng, n)
+        slots = STrack.slots(tracks)
+        means, covs = bank.mean[slots].copy(), bank.covariance[slots].copy()
+
+        ref = warp_loop(means, covs, H)
+        new = STrack.warp_states(means.copy(), covs, H)
+        ok = all(np.allclose(r, x, rtol=1e-12, atol=1e-9) for r, x in zip(ref, new))
+
+        t_loop = bench(lambda: warp_loop(means, covs, H))
+        t_batch = bench(lambda: STrack.multi_gmc(tracks, H))
+        t_identity = bench(lambda: STrack.multi_gmc(tracks, identity))
+        print(f"{n:>7} | {t_loop:10.3f} | {t_batch:15.3f} | {t_identity:15.4f} | {'sim' if ok else 'NÃO'}")
+
+
+if __name__ == "__main__":
+    main()
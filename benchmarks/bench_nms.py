@@ -0,0 +1,96 @@
+"""
+Benchmark: filtro de sobreposição O(n²) do main.py vs NMS vetorizado.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_nms
+"""
+
+import time
+
+import numpy as np
+
+from detector.nms import batched_nms
+
+
+def calculate_iou(box1, box2):
+    x1 = max(box1[0], box2[0])
+    y1 = max(box1[1], box2[1])
+    x2 = min(box1[2], box2[2])
+    y2 = min(box1[3], box2[3])
+    inter_area = max(0, x2 - x1) * max(0, y2 - y1)
+    box1_area = (box1[2] - box1[0]) * (box1[3] - box1[1])
+    box2_area = (box2[2] - box2[0]) * (box2[3] - box2[1])
+    union_area = box1_area + box2_area - inter_area
+    return inter_area / union_area if union_area > 0 else 0
+
+
+def filter_loop(dets, iou_threshold):
+    """Implementação original de filter_overlapping_detections (referência)."""
+    dets_sorted = sorted(dets, key=lambda x: x[4], reverse=True)
+    filtered = []
+    for det in dets_sorted:
+        keep = True
+        for kept_det in filtered:
+            if det[5] == kept_det[5] and calculate_iou(det[:4], kept_det[:4]) > iou_threshold:
+                keep = False
+                break
+        if keep:
+            filtered.append(det)
+    return filtered
+
+
+def make_dets(n, rng):
+    """Boxes agrupadas em torno de alguns objetos (cenário de multidão)."""
+    centers = rng.uniform(0, 1920, size=(max(1, n // 10), 2))
+    idx = rng.integers(0, len(centers), size=n)
+    xy = centers[idx] + rng.normal(0, 8, size=(n, 2))
+    wh = rng.uniform(30, 120, size=(n, 2))
+    boxes = np.concatenate([xy - wh / 2, xy + wh / 2], axis=1)
+    scores = rng.uniform(0.2, 1.0, size=n)
+    classes = rng.choice([0, 1, 2, 3, 5, 7], size=n)
+    return np.concatenate([boxes, scores[:, None], classes[:, None]], axis=1).astype(np.float32)
+
+
+def bench(fn, repeat):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    iou = 0.5
+
+    print("=" * 72)
+    print(f"{'boxes':>6} | {'loop O(n²)':>12} | {'numpy':>10} | {'cv2':>10} | {'mantidas':>8}")
+    print("=" * 72)
+
+    for n in (100, 1000, 10000):
+        arr = make_dets(n, rng)
+        dets = arr.tolist()
+
+        keep = batched_nms(arr[:, :4], arr[:, 4], arr[:, 5], iou, top_k=None)
+        keep_cv2 = batched_nms(arr[:, :4], arr[:, 4], arr[:, 5], iou, top_k=None, backend="cv2")
+
+        # O loop original é proibitivo em 10k boxes; só mede até 1k
+        if n <= 1000:
+            ref = filter_loop(dets, iou)
+            assert len(ref) == len(keep)
+            t_loop = f"{bench(lambda: filter_loop(dets, iou), repeat=1):9.2f} ms"
+        else:
+            t_loop = f"{'-':>12}"
+
+        t_np = bench(lambda: batched_nms(arr[:, :4], arr[:, 4], arr[:, 5], iou, top_k=None), repeat=5)
+        t_cv = bench(lambda: batched_nms(arr[:, :4], arr[:, 4], arr[:, 5], iou, top_k=None,
+                                         backend="cv2"), repeat=5)
+        print(f"{n:>6} | {t_loop} | {t_np:7.2f} ms | {t_cv:7.2f} ms | {len(keep):>4}/{len(keep_cv2):<4}")
+
+    arr = make_dets(10000, rng)
+    t_topk = bench(lambda: batched_nms(arr[:, :4], arr[:, 4], arr[:, 5], iou, top_k=300), repeat=5)
+    print(f"\n10000 boxes com top_k=300 (numpy): {t_topk:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark: tempo de startup do ONNXDetector com e sem cache do grafo otimizado.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_onnx_startup [caminho/modelo.onnx]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from detector.onnx_detector import ONNXDetector
+
+
+def startup(model_path, cache_dir):
+    t0 = time.perf_counter()
+    ONNXDetector(model_path, cache_dir=cache_dir)
+    return (time.perf_counter() - t0) * 1000
+
+
+def main():
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "weights/yolov5nu.onnx"
+    if not os.path.exists(model_path):
+        print(f"❌ Modelo não encontrado: {model_path}")
+        return
+
+    cache_dir = tempfile.mkdtemp(prefix="ort_cache_")
+    repeat = 3
+    try:
+        no_cache = [startup(model_path, None) for _ in range(repeat)]
+
+        cold = []
+        for _ in range(repeat):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            cold.append(startup(model_path, cache_dir))
+
+        cached = [startup(model_path, cache_dir) for _ in range(repeat)]
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print("\n" + "=" * 56)
+    print(f"Startup do ONNXDetector: {model_path}")
+    print("=" * 56)
+    print(f"{'sem cache':>24}: {min(no_cache):8.1f} ms")
+    print(f"{'cold start (gera cache)':>24}: {min(cold):8.1f} ms")
+    print(f"{'cached start':>24}: {min(cached):8.1f} ms  ({min(cold) / min(cached):.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: alocações e tempo por frame do pré-processamento.
+
+Compara o pré-processamento antigo do ONNXDetector (resize esticado +
+cvtColor + astype + /255 + transpose + expand_dims) com o
+LetterboxPreprocessor, que escreve direto no buffer persistente.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_preprocess
+"""
+
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from detector.preprocess import LetterboxPreprocessor
+
+
+def preprocess_old(frame, width=640, height=640):
+    img = cv2.resize(frame, (width, height))
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    img = img.astype(np.float32) / 255.0
+    img = np.transpose(img, (2, 0, 1))
+    img = np.expand_dims(img, axis=0)
+    return img
+
+
+def allocations(fn, frame, frames=10):
+    """
+    Memória alocada por frame, medida com tracemalloc: pico transitório
+    durante a chamada e número de blocos que sobrevivem à chamada.
+    """
+    fn(frame)  # aquecimento: buffers persistentes são criados aqui
+    tracemalloc.start()
+    results = []
+    peak_total = 0
+    before = tracemalloc.take_snapshot()
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        results.append(fn(frame))
+        peak_total += tracemalloc.get_traced_memory()[1] - current
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "lineno")
+    blocks = sum(max(s.count_diff, 0) for s in stats)
+    return blocks / frames, peak_total / frames
+
+
+def bench(fn, frame, repeat=50):
+    fn(frame)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(frame)
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    frame = np.random.default_rng(0).integers(0, 255, size=(720, 1280, 3), dtype=np.uint8)
+    letterbox = LetterboxPreprocessor(640, 640, layout="nchw")
+
+    print("=" * 64)
+    print("Pré-processamento 1280x720 -> 1x3x640x640 float32")
+    print("=" * 64)
+    for name, fn in (("antigo", preprocess_old), ("letterbox", letterbox)):
+        blocks, peak = allocations(fn, frame)
+        ms = bench(fn, frame)
+        print(f"{name:>10}: {peak / 1e6:6.2f} MB alocados/frame (pico), "
+              f"{blocks:4.1f} blocos retidos/frame, {ms:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: associação densa (iou_distance + fuse_score + fuse_motion +
+linear_assignment) vs esparsa (matching.sparse_assignment) de 50 a 2000
+objetos numa cena 1920x1080.
+
+Confere que os matches e os não associados são idênticos nos dois caminhos.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_sparse_assignment
+"""
+
+import time
+
+import numpy as np
+
+from tracker import matching
+from tracker.bot_sort import STrack
+from tracker.kalman_filter import KalmanFilter
+from tracker.track_bank import TrackBank
+
+SIZES = [50, 100, 300, 500, 1000, 2000]
+MATCH_THRESH = 0.8
+
+
+def make_scene(rng, kf, n):
+    """n tracks ativados (com slot no banco) e ~n detecções deslocadas, com faltas e falsos positivos."""
+    bank = TrackBank()
+    xy = rng.uniform([0, 0], [1920, 1080], size=(n, 2))
+    wh = rng.uniform(15, 80, size=(n, 2))
+    tracks = []
+    for c, s in zip(xy, wh):
+        track = STrack(np.r_[c - s / 2, s], 0.9)
+        track.activate(kf, 1, bank)
+        tracks.append(track)
+    STrack.multi_predict(tracks)
+
+    seen = rng.random(n) > 0.1
+    det_xy = np.r_[xy[seen] + rng.normal(0, 4, (seen.sum(), 2)), rng.uniform([0, 0], [1920, 1080], (n // 10, 2))]
+    det_wh = np.r_[wh[seen], rng.uniform(15, 80, (n // 10, 2))]
+    scores = rng.uniform(0.5, 1.0, len(det_xy)).astype(np.float32)
+    detections = [STrack(np.r_[c - s / 2, s], sc) for c, s, sc in zip(det_xy, det_wh, scores)]
+    return tracks, detections
+
+
+def dense(kf, tracks, detections):
+    dists = matching.iou_distance(tracks, detections)
+    dists = matching.fuse_score(dists, detections)
+    dists = matching.fuse_motion(kf, dists, tracks, detections, only_position=True)
+    return matching.linear_assignment(dists, thresh=MATCH_THRESH)
+
+
+def sparse(kf, tracks, detections):
+    return matching.sparse_assignment(tracks, detections, MATCH_THRESH, kf=kf, use_score=True, only_position=True)
+
+
+def same(a, b):
+    return all(np.array_equal(np.asarray(x).reshape(-1), np.asarray(y).reshape(-1)) for x, y in zip(a, b))
+
+
+def bench(fn, repeat):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    kf = KalmanFilter()
+
+    print("=" * 60)
+    print(f"{'objetos':>8} | {'denso (ms)':>11} | {'esparso (ms)':>12} | {'ganho':>6} | idêntico")
+    print("=" * 60)
+    for n in SIZES:
+        tracks, detections = make_scene(rng, kf, n)
+        ok = same(dense(kf, tracks, detections), sparse(kf, tracks, detections))
+        repeat = max(3, 2000 // n)
+        t_dense = bench(lambda: dense(kf, tracks, detections), repeat)
+        t_sparse = bench(lambda: sparse(kf, tracks, detections), repeat)
+        print(f"{n:>8} | {t_dense:11.2f} | {t_sparse:12.2f} | {t_dense / t_sparse:5.1f}x | {'sim' if ok else 'NÃO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: alocação de memória por frame no BoTSORT.update (tracemalloc).
+
+1. Representação das detecções de um frame: um STrack por detecção
+   (como o update fazia) vs DetectionSet (linhas de arrays).
+2. Tamanho de um STrack (com __slots__, sem __dict__).
+3. BoTSORT.update completo numa cena sintética: pico de memória transitória
+   e blocos alocados por frame.
+
+Sai com erro (AssertionError) se o DetectionSet não alocar ao menos
+MIN_BYTES_RATIO vezes menos bytes e MIN_BLOCKS_RATIO vezes menos blocos que
+um STrack por detecção, ou se o STrack voltar a ter __dict__/features sem ReID.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_tracker_alloc
+"""
+
+import tracemalloc
+
+import numpy as np
+
+from tracker.bot_sort import BoTSORT, STrack
+from tracker.detection_set import DetectionSet
+
+FRAMES = 200
+SIZES = [50, 300]
+
+# Redução mínima de alocação (STrack por detecção / DetectionSet)
+MIN_BYTES_RATIO = 1.5
+MIN_BLOCKS_RATIO = 5.0
+
+
+def make_frames(rng, n_obj, frames):
+    """Sequência de arrays (N, 6) [x1, y1, x2, y2, score, cls] com objetos em movimento."""
+    pos = rng.uniform([0, 0], [1920, 1080], size=(n_obj, 2))
+    vel = rng.normal(0, 4, size=(n_obj, 2))
+    size = rng.uniform(20, 120, size=(n_obj, 2))
+    cls = rng.choice([0, 2, 3, 5, 7], size=n_obj)
+    out = []
+    for _ in range(frames):
+        pos += vel
+        seen = rng.random(n_obj) > 0.1
+        boxes = np.concatenate([pos - size / 2, pos + size / 2], 1) + rng.normal(0, 2, (n_obj, 4))
+        scores = rng.uniform(0.05, 1.0, n_obj)
+        out.append(np.concatenate([boxes, scores[:, None], cls[:, None]], 1)[seen].astype(np.float32))
+    return out
+
+
+def measure(fn):
+    """(bytes no pico acima do início, blocos alocados e ainda vivos ao fim) de uma chamada."""
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    start, _ = tracemalloc.get_traced_memory()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    return peak - start, blocks, result
+
+
+def detections_as_stracks(dets):
+    return [STrack(STrack.tlbr_to_tlwh(tlbr), s, cls_id=int(c)) for (tlbr, s, c) in zip(dets[:, :4], dets[:, 4], dets[:, 5])]
+
+
+def detections_as_rows(dets):
+    return DetectionSet(dets[:, :4], dets[:, 4], dets[:, 5])
+
+
+def main():
+    rng = np.random.default_rng(0)
+    tracemalloc.start()
+
+    print("=" * 66)
+    print("Detecções de um frame (mantidas vivas)")
+    print("=" * 66)
+    for n in SIZES:
+        dets = make_frames(rng, n, 1)[0]
+        b_obj, n_obj, _ = measure(lambda: detections_as_stracks(dets))
+        b_rows, n_rows, _ = measure(lambda: detections_as_rows(dets))
+        print(f"   {len(dets):4d} detecções | STrack por detecção: {b_obj / 1024:7.1f} KiB, {n_obj:5d} blocos"
+              f" | DetectionSet: {b_rows / 1024:6.1f} KiB, {n_rows:3d} blocos")
+        assert b_obj >= MIN_BYTES_RATIO * b_rows, \
+            f"{len(dets)} detecções: DetectionSet aloca {b_rows} bytes, STrack {b_obj} (< {MIN_BYTES_RATIO}x)"
+        assert n_obj >= MIN_BLOCKS_RATIO * n_rows, \
+            f"{len(dets)} detecções: DetectionSet aloca {n_rows} blocos, STrack {n_obj} (< {MIN_BLOCKS_RATIO}x)"
+
+    track = STrack(np.array([0, 0, 10, 10.0]), 0.9)
+    print(f"\n   STrack sem __dict__: {not hasattr(track, '__dict__')} | features alocadas sem ReID: {track.features is not None}")
+    assert not hasattr(track, '__dict__'), "STrack voltou a ter __dict__"
+    assert track.features is None, "STrack sem ReID alocou o deque de features"
+
+    print("\n" + "=" * 66)
+    print(f"BoTSORT.update ({FRAMES} frames, média por frame)")
+    print("=" * 66)
+    for n in SIZES:
+        frames = make_frames(rng, n, FRAMES)
+        tracker = BoTSORT(track_buffer=600, gmc_method='none')
+        img = np.zeros((8, 8, 3), np.uint8)
+        peaks, blocks = [], []
+        for f, dets in enumerate(frames):
+            peak, count, _ = measure(lambda: tracker.update(dets, img, frame_time=f / 30))
+            peaks.append(peak)
+            blocks.append(count)
+        # Ignora o aquecimento (primeiros frames criam todos os tracks)
+        warm = slice(FRAMES // 4, None)
+        print(f"   {n:4d} objetos | pico transitório {np.mean(peaks[warm]) / 1024:7.1f} KiB"
+              f" | blocos novos vivos {np.mean(blocks[warm]):6.1f}")
+
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark: YOLOv7 via torch.hub (caminho antigo) x caminho rápido
+(checkpoint local + TorchScript + inference_mode + channels_last).
+Para INT8, use o detector ONNX (python -m tools.quantize e onnx_prefer_int8).
+
+Mede o startup (cold = rastreia e grava o cache, cached = só carrega o
+TorchScript) e a latência por frame de ponta a ponta (pré-processamento,
+inferência, NMS e conversão para NumPy).
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_yolov7 [weights/yolov7.pt] [--repo caminho/yolov7] [--threads N]
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from detector.yolov7_detector import YOLOv7Detector
+
+
+class HubDetector:
+    """Caminho antigo: autoshape do torch.hub (letterbox, NMS e .cpu().numpy() no wrapper)."""
+
+    def __init__(self, weights, conf):
+        self.conf = conf
+        self.model = torch.hub.load('WongKinYiu/yolov7', 'custom', path_or_model=str(Path(weights).resolve()),
+                                    trust_repo=True, force_reload=False)
+        self.model.conf = conf
+
+    def detect(self, frame):
+        results = self.model(frame)
+        dets = results.xyxy[0].cpu().numpy()
+        return dets[dets[:, 4] >= self.conf]
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - t0) * 1000
+
+
+def latency_ms(detector, frame, repeat):
+    detector.detect(frame)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        detector.detect(frame)
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do YOLOv7Detector")
+    parser.add_argument("weights", nargs="?", default="weights/yolov7.pt")
+    parser.add_argument("--repo", default=None, help="Clone do WongKinYiu/yolov7 (padrão: cache do torch.hub)")
+    parser.add_argument("--threads", type=int, default=0, help="torch.set_num_threads (0 = padrão)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--no-hub", action="store_true", help="Não medir o caminho torch.hub")
+    args = parser.parse_args()
+
+    if not Path(args.weights).exists():
+        print(f"❌ Pesos não encontrados: {args.weights}")
+        return
+
+    frame = np.random.default_rng(0).integers(0, 255, size=(720, 1280, 3), dtype=np.uint8)
+    rows = []
+
+    if not args.no_hub:
+        hub, ms = timed(lambda: HubDetector(args.weights, 0.25))
+        rows.append(("torch.hub", ms, None, latency_ms(hub, frame, args.repeat)))
+        del hub
+
+    cache_dir = tempfile.mkdtemp(prefix="ts_cache_")
+    try:
+        def make():
+            return YOLOv7Detector(args.weights, conf=0.25, repo_dir=args.repo, cache_dir=cache_dir,
+                                  num_threads=args.threads)
+        _, cold = timed(make)
+        detector, cached = timed(make)
+        rows.append(("TorchScript FP32", cold, cached, latency_ms(detector, frame, args.repeat)))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print("\n" + "=" * 72)
+    print(f"YOLOv7 CPU ({torch.get_num_threads()} threads), frame 1280x720, {args.weights}")
+    print("=" * 72)
+    print(f"{'caminho':>22} | {'startup cold':>12} | {'cached':>9} | {'ms/frame':>9}")
+    for name, cold, cached, ms in rows:
+        cached_txt = f"{cached:7.0f}ms" if cached is not None else f"{'-':>9}"
+        print(f"{name:>22} | {cold:10.0f}ms | {cached_txt} | {ms:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
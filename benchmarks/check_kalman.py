@@ -0,0 +1,101 @@
+"""
+Verificação: as versões em lote do KalmanFilter (multi_predict,
+multi_predict_steps, multi_update, multi_gating_distance) batem numericamente com as versões
+por track (predict, update, gating_distance), e quanto tempo cada uma leva.
+
+Sai com erro (AssertionError) se alguma diferença passar da tolerância.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.check_kalman
+"""
+
+import time
+
+import numpy as np
+
+from tracker.kalman_filter import KalmanFilter
+
+RTOL = 1e-9
+ATOL = 1e-9
+
+
+def random_states(kf, rng, n):
+    """Estados com covariâncias realistas: initiate + alguns ciclos predict/update."""
+    means, covs = [], []
+    for _ in range(n):
+        xywh = np.r_[rng.uniform(0, 1920), rng.uniform(0, 1080), rng.uniform(10, 200, size=2)]
+        mean, cov = kf.initiate(xywh)
+        for _ in range(rng.integers(1, 5)):
+            mean, cov = kf.predict(mean, cov, dt=rng.uniform(0.5, 5.0))
+            mean, cov = kf.update(mean, cov, mean[:4] + rng.normal(0, 3, size=4))
+        means.append(mean)
+        covs.append(cov)
+    return np.asarray(means), np.asarray(covs)
+
+
+def timed(fn, repeat=20):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - t0) / repeat * 1000
+
+
+def check(name, reference, batched):
+    for ref, new in zip(reference, batched):
+        np.testing.assert_allclose(new, ref, rtol=RTOL, atol=ATOL, err_msg=name)
+    err = max(float(np.max(np.abs(np.asarray(n) - np.asarray(r)))) for r, n in zip(reference, batched))
+    print(f"   ✅ {name}: max |Δ| = {err:.2e}")
+
+
+def main():
+    kf = KalmanFilter()
+    rng = np.random.default_rng(0)
+
+    for n in (1, 10, 100, 500):
+        means, covs = random_states(kf, rng, n)
+        measurements = means[:, :4] + rng.normal(0, 5, size=(n, 4))
+        dets = np.c_[rng.uniform(0, 1920, (40, 1)), rng.uniform(0, 1080, (40, 1)), rng.uniform(10, 200, (40, 2))]
+        dt = 2.5
+
+        print(f"\n{n} tracks")
+
+        ref, t_ref = timed(lambda: [kf.predict(m, c, dt) for m, c in zip(means, covs)])
+        new, t_new = timed(lambda: kf.multi_predict(means, covs, dt))
+        check("predict", (np.array([r[0] for r in ref]), np.array([r[1] for r in ref])), new)
+        print(f"      {t_ref:8.3f} ms -> {t_new:8.3f} ms")
+
+        # Predição adiada de tracks perdidos (vw = vh = 0): k passos de uma vez
+        lost = means.copy()
+        lost[:, 6:] = 0
+        steps = rng.integers(1, 60, size=n)
+
+        def step_by_step():
+            out_means, out_covs = [], []
+            for m, c, k in zip(lost, covs, steps):
+                for _ in range(k):
+                    m, c = kf.predict(m, c, dt)
+                out_means.append(m)
+                out_covs.append(c)
+            return np.array(out_means), np.array(out_covs)
+
+        ref, t_ref = timed(step_by_step, repeat=2)
+        new, t_new = timed(lambda: kf.multi_predict_steps(lost, covs, dt * steps, steps))
+        check("predict_steps", ref, new)
+        print(f"      {t_ref:8.3f} ms -> {t_new:8.3f} ms")
+
+        ref, t_ref = timed(lambda: [kf.update(m, c, z) for m, c, z in zip(means, covs, measurements)])
+        new, t_new = timed(lambda: kf.multi_update(means, covs, measurements))
+        check("update", (np.array([r[0] for r in ref]), np.array([r[1] for r in ref])), new)
+        print(f"      {t_ref:8.3f} ms -> {t_new:8.3f} ms")
+
+        for only_position in (True, False):
+            ref, t_ref = timed(lambda: np.array([kf.gating_distance(m, c, dets, only_position)
+                                                 for m, c in zip(means, covs)]))
+            new, t_new = timed(lambda: kf.multi_gating_distance(means, covs, dets, only_position))
+            check(f"gating (only_position={only_position})", (ref,), (new,))
+            print(f"      {t_ref:8.3f} ms -> {t_new:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Decodificação vetorizada das saídas YOLO.
+
+Suporta os dois layouts exportados pelos modelos usados no projeto:
+- clássico (YOLOv5/YOLOv7): (1, N, 5 + nc) -> [cx, cy, w, h, obj, cls...]
+- anchor-free (YOLOv5u/YOLOv8): (1, 4 + nc, N) -> [cx, cy, w, h, cls...]
+"""
+
+import numpy as np
+
+
+def detect_layout(output, num_classes=80):
+    """
+    Identifica o layout da saída bruta do modelo.
+
+    Args:
+        output: Array (1, A, B) ou (A, B) retornado pelo modelo
+        num_classes: Número de classes do modelo (80 no COCO)
+
+    Returns:
+        (channels_first, has_objectness)
+    """
+    rows, cols = output.shape[-2:]
+    known = (num_classes + 4, num_classes + 5)
+
+    if cols in known:
+        channels_first = False
+    elif rows in known:
+        channels_first = True
+    else:
+        # O número de predições é sempre maior que o número de canais
+        channels_first = rows < cols
+    channels = rows if channels_first else cols
+
+    if channels == num_classes + 5:
+        has_objectness = True
+    elif channels == num_classes + 4:
+        has_objectness = False
+    else:
+        # Número de classes desconhecido: anchor-free exporta canais primeiro
+        has_objectness = not channels_first
+
+    return channels_first, has_objectness
+
+
+def _dequantize_candidates(output, conf, channels_first, cls_start, scale, zero_point):
+    """
+    Filtra as predições ainda no domínio quantizado (o threshold é convertido
+    para inteiro) e só então desquantiza as candidatas, em vez da saída inteira.
+    """
+    threshold = conf / scale + zero_point
+    axis = 0 if channels_first else 1
+    cls_block = output[cls_start:] if channels_first else output[:, cls_start:]
+    if cls_start == 5:
+        gate = output[4] if channels_first else output[:, 4]
+    else:
+        gate = cls_block.max(axis=axis)
+    keep = gate >= threshold
+    candidates = output[:, keep] if channels_first else output[keep]
+    return (candidates.astype(np.float32) - np.float32(zero_point)) * np.float32(scale)
+
+
+def decode_yolo_output(output, conf=0.25, num_classes=80, quantization=None):
+    """
+    Decodifica a saída bruta YOLO inteiramente com operações NumPy.
+
+    Args:
+        output: Array (1, N, 5 + nc), (1, 4 + nc, N) ou sem a dimensão de batch
+        conf: Confidence threshold (aplicado à objectness e ao score final)
+        num_classes: Número de classes do modelo
+        quantization: (scale, zero_point) se a saída for int8/uint8 (TFLite)
+
+    Returns:
+        (boxes, scores, class_ids)
+        boxes: (K, 4) float32 [x1, y1, x2, y2] no espaço de entrada do modelo
+        scores: (K,) float32
+        class_ids: (K,) int64
+    """
+    output = np.asarray(output)
+    if output.ndim == 3:
+        output = output[0]
+
+    channels_first, has_objectness = detect_layout(output, num_classes)
+    cls_start = 5 if has_objectness else 4
+
+    if quantization is not None and quantization[0]:
+        output = _dequantize_candidates(output, conf, channels_first, cls_start, *quantization)
+
+    if channels_first:
+        # (C, N): reduzir ao longo do eixo dos canais, sem transpor a matriz toda
+        # (argmax no eixo 0 copiaria o bloco inteiro: o max é feito antes e o
+        # argmax só nas colunas candidatas)
+        class_block = output[cls_start:]
+        if has_objectness:
+            keep = output[4] >= conf
+        else:
+            keep = class_block.max(axis=0) >= conf
+        class_block = class_block[:, keep]
+        cls_ids = class_block.argmax(axis=0)
+        scores = np.take_along_axis(class_block, cls_ids[None, :], axis=0)[0]
+        if has_objectness:
+            scores = scores * output[4, keep]
+        xywh = output[:4, keep].T
+    else:
+        # (N, C): filtrar pela objectness antes do argmax reduz o trabalho
+        if has_objectness:
+            output = output[output[:, 4] >= conf]
+        class_block = output[:, cls_start:]
+        cls_ids = class_block.argmax(axis=1)
+        scores = np.take_along_axis(class_block, cls_ids[:, None], axis=1)[:, 0]
+        if has_objectness:
+            scores = scores * output[:, 4]
+        xywh = output[:, :4]
+
+    mask = scores >= conf
+    xywh = xywh[mask].astype(np.float32, copy=False)
+    scores = scores[mask].astype(np.float32, copy=False)
+    cls_ids = cls_ids[mask].astype(np.int64, copy=False)
+
+    # Converter coordenadas de center para corner
+    boxes = np.empty((len(xywh), 4), dtype=np.float32)
+    half_wh = xywh[:, 2:4] * 0.5
+    np.subtract(xywh[:, 0:2], half_wh, out=boxes[:, 0:2])
+    np.add(xywh[:, 0:2], half_wh, out=boxes[:, 2:4])
+
+    return boxes, scores, cls_ids
+
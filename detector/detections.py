@@ -0,0 +1,64 @@
+"""
+Tipo colunar de detecções compartilhado por todos os detectores.
+
+Todas as detecções de um frame ficam em um único array float32 contíguo
+(N, 6) no formato [x1, y1, x2, y2, score, cls] — exatamente o formato que
+BoTSORT.update espera —, com views sem cópia para boxes, scores e classes.
+"""
+
+import numpy as np
+
+
+class Detections:
+    __slots__ = ("data",)
+
+    def __init__(self, data=None):
+        """
+        Args:
+            data: Array (N, 6) [x1, y1, x2, y2, score, cls]. Convertido para
+                  float32 contíguo apenas se necessário.
+        """
+        if data is None:
+            data = np.empty((0, 6), dtype=np.float32)
+        self.data = np.ascontiguousarray(data, dtype=np.float32).reshape(-1, 6)
+
+    @classmethod
+    def empty(cls):
+        return cls()
+
+    @classmethod
+    def from_arrays(cls, boxes, scores, class_ids):
+        """Monta as detecções a partir de boxes (N, 4), scores (N,) e classes (N,)."""
+        data = np.empty((len(scores), 6), dtype=np.float32)
+        data[:, :4] = boxes
+        data[:, 4] = scores
+        data[:, 5] = class_ids
+        return cls(data)
+
+    @property
+    def boxes(self):
+        """View (N, 4) [x1, y1, x2, y2]."""
+        return self.data[:, :4]
+
+    @property
+    def scores(self):
+        """View (N,) dos scores."""
+        return self.data[:, 4]
+
+    @property
+    def class_ids(self):
+        """View (N,) das classes (float32; use .astype(int) para índices)."""
+        return self.data[:, 5]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        """Seleciona por máscara booleana, array de índices ou slice."""
+        return Detections(self.data[index])
+
+    def __array__(self, dtype=None, copy=None):
+        return self.data if dtype is None else self.data.astype(dtype)
+
+    def __repr__(self):
+        return f"Detections(n={len(self)})"
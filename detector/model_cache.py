@@ -0,0 +1,36 @@
+"""
+Caminhos de cache em disco dos modelos preparados pelos detectores (grafo
+ONNX otimizado, módulo TorchScript rastreado).
+"""
+
+import hashlib
+import json
+import os
+
+
+def model_cache_path(model_path, cache_dir, runtime_version, options, suffix):
+    """
+    Caminho em cache para esta combinação de modelo, versão do runtime e opções.
+
+    A chave combina o hash SHA-256 do arquivo do modelo, a versão do runtime e
+    as opções; qualquer mudança gera um arquivo novo.
+
+    Args:
+        model_path: Arquivo do modelo/checkpoint de origem
+        cache_dir: Diretório do cache
+        runtime_version: Versão do runtime que gera o arquivo (ex.: ort.__version__)
+        options: dict serializável em JSON com as opções que mudam o resultado
+        suffix: Extensão do arquivo em cache (ex.: ".opt.onnx")
+
+    Returns:
+        <cache_dir>/<nome do modelo>-<16 hex do hash><suffix>
+    """
+    sha = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    sha.update(runtime_version.encode())
+    sha.update(json.dumps(options or {}, sort_keys=True).encode())
+
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(cache_dir, f"{stem}-{sha.hexdigest()[:16]}{suffix}")
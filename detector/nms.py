@@ -0,0 +1,177 @@
+"""
+Non-Maximum Suppression vetorizada (NumPy) com backend opcional do OpenCV.
+
+Usada pelos detectores ONNX/TFLite (que não fazem NMS no grafo) e pelo
+filtro de duplicatas do main.py.
+"""
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+def _has_cv2_batched():
+    return cv2 is not None and hasattr(cv2, "dnn") and hasattr(cv2.dnn, "NMSBoxesBatched")
+
+
+def _overlap_pairs(boxes, iou_thres, max_pairs):
+    """
+    Encontra os pares (i, j) com IoU > iou_thres por varredura no eixo x:
+    após ordenar por x1, só boxes cujo x1 cai dentro de [x1_i, x2_i) podem
+    sobrepor a box i.
+
+    Returns:
+        (a, b) índices dos pares sobrepostos, ou None se o número de
+        candidatos exceder max_pairs (cena muito densa).
+    """
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    by_x = np.argsort(x1, kind="stable")
+    x1_sorted = x1[by_x]
+    hi = np.searchsorted(x1_sorted, x2[by_x], side="left")
+    counts = np.maximum(hi - np.arange(len(boxes)) - 1, 0)
+    total = int(counts.sum())
+    if total > max_pairs:
+        return None
+    if total == 0:
+        empty = np.empty((0,), dtype=np.int64)
+        return empty, empty
+
+    # Gerar todos os pares (pos, pos + 1 ... hi - 1) sem loop Python
+    first = np.repeat(np.arange(len(boxes)), counts)
+    starts = np.cumsum(counts) - counts
+    second = first + 1 + (np.arange(total) - np.repeat(starts, counts))
+    a, b = by_x[first], by_x[second]
+
+    inter = (np.maximum(0.0, np.minimum(x2[a], x2[b]) - np.maximum(x1[a], x1[b])) *
+             np.maximum(0.0, np.minimum(y2[a], y2[b]) - np.maximum(y1[a], y1[b])))
+    areas = (x2 - x1) * (y2 - y1)
+    union = areas[a] + areas[b] - inter
+    iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+    over = iou > iou_thres
+    return a[over], b[over]
+
+
+def _greedy_nms(boxes, scores, iou_thres, max_keep):
+    """NMS guloso clássico: O(n) passos vetorizados. Usado em cenas muito densas."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind="stable")
+
+    keep = []
+    while order.size > 0 and len(keep) < max_keep:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+
+        xx1 = np.maximum(x1[i], x1[rest])
+        yy1 = np.maximum(y1[i], y1[rest])
+        xx2 = np.minimum(x2[i], x2[rest])
+        yy2 = np.minimum(y2[i], y2[rest])
+        inter = np.maximum(0.0, xx2 - xx1) * np.maximum(0.0, yy2 - yy1)
+        union = areas[i] + areas[rest] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+        order = rest[iou <= iou_thres]
+
+    return np.asarray(keep, dtype=np.int64)
+
+
+def nms(boxes, scores, iou_thres=0.45, top_k=None, max_pairs=4_000_000):
+    """
+    NMS guloso: percorre as boxes em ordem decrescente de score, mantendo cada
+    uma que não tenha IoU > iou_thres com alguma box já mantida.
+
+    Os pares sobrepostos são calculados de uma vez (varredura em x); boxes sem
+    vizinhos são mantidas direto e só as que se sobrepõem passam pelo loop de
+    supressão. Se a cena for densa demais (mais de max_pairs candidatos), usa
+    o NMS guloso clássico.
+
+    Args:
+        boxes: (N, 4) [x1, y1, x2, y2]
+        scores: (N,)
+        iou_thres: IoU acima do qual uma box é suprimida
+        top_k: Número máximo de boxes mantidas (None = sem limite)
+        max_pairs: Limite de pares candidatos da varredura
+
+    Returns:
+        Índices (int64) das boxes mantidas, em ordem decrescente de score
+    """
+    boxes = np.asarray(boxes, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float32)
+    n = len(boxes)
+    if n == 0:
+        return np.empty((0,), dtype=np.int64)
+    max_keep = n if top_k is None else int(top_k)
+
+    pairs = _overlap_pairs(boxes, iou_thres, max_pairs)
+    if pairs is None:
+        return _greedy_nms(boxes, scores, iou_thres, max_keep)
+
+    order = np.argsort(-scores, kind="stable")
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+
+    # Aresta orientada: a box de maior score (menor rank) suprime a outra
+    a, b = pairs
+    swap = rank[a] > rank[b]
+    src = np.where(swap, b, a)
+    dst = np.where(swap, a, b)
+    by_src = np.argsort(src, kind="stable")
+    src, dst = src[by_src], dst[by_src]
+    bounds = np.searchsorted(src, np.arange(n + 1)).tolist()
+    dst = dst.tolist()
+
+    suppressed = np.zeros(n, dtype=bool)
+    suppressed_list = suppressed.tolist()
+    for i in order[np.isin(order, src)].tolist():
+        if suppressed_list[i]:
+            continue
+        for j in dst[bounds[i]:bounds[i + 1]]:
+            suppressed_list[j] = True
+    suppressed[:] = suppressed_list
+
+    keep = order[~suppressed[order]]
+    return keep[:max_keep]
+
+
+def batched_nms(boxes, scores, class_ids, iou_thres=0.45, top_k=300, backend="numpy"):
+    """
+    NMS por classe em uma única passada: cada classe é deslocada para uma região
+    disjunta do plano (class offset), de modo que boxes de classes diferentes
+    nunca se sobrepõem.
+
+    Args:
+        boxes: (N, 4) [x1, y1, x2, y2]
+        scores: (N,)
+        class_ids: (N,)
+        iou_thres: IoU acima do qual uma box da mesma classe é suprimida
+        top_k: Número máximo de detecções mantidas (None ou 0 = sem limite)
+        backend: "numpy" ou "cv2" (cv2.dnn.NMSBoxesBatched, se disponível)
+
+    Returns:
+        Índices (int64) das boxes mantidas, em ordem decrescente de score
+    """
+    boxes = np.asarray(boxes, dtype=np.float32)
+    scores = np.asarray(scores, dtype=np.float32)
+    class_ids = np.asarray(class_ids)
+    if len(boxes) == 0:
+        return np.empty((0,), dtype=np.int64)
+    if not top_k:
+        top_k = None
+
+    if backend == "cv2" and _has_cv2_batched():
+        xywh = boxes.astype(np.float64)
+        xywh[:, 2:] -= xywh[:, :2]
+        keep = cv2.dnn.NMSBoxesBatched(
+            xywh, scores, class_ids.astype(np.int32), -np.inf, float(iou_thres)
+        )
+        keep = np.asarray(keep, dtype=np.int64).reshape(-1)
+        keep = keep[np.argsort(-scores[keep], kind="stable")]
+        return keep[:top_k]
+
+    span = float(boxes.max() - boxes.min()) + 1.0
+    offsets = class_ids.astype(np.float64)[:, None] * span
+    return nms(boxes + offsets, scores, iou_thres, top_k)
@@ -3,24 +3,129 @@ Detector usando ONNX Runtime
 Otimizado para Raspberry Pi - mais leve que TFLite
 """
 
+import glob
+import os
+
 import numpy as np
 import onnxruntime as ort
 
+from detector.decode import decode_yolo_output
+from detector.detections import Detections
+from detector.model_cache import model_cache_path
+from detector.nms import batched_nms
+from detector.preprocess import LetterboxPreprocessor
+
+
+_EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+_GRAPH_OPT_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+_ORT_TYPES = {
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+    "tensor(double)": np.float64,
+    "tensor(int64)": np.int64,
+    "tensor(int32)": np.int32,
+    "tensor(uint8)": np.uint8,
+    "tensor(int8)": np.int8,
+}
+
+
+def make_session_options(intra_op_threads=0, inter_op_threads=0, execution_mode="sequential",
+                         graph_optimization_level="all", enable_mem_pattern=True, allow_spinning=True):
+    """
+    Monta o SessionOptions do ONNX Runtime.
+    
+    Em placas ARM de 4 núcleos que dividem a CPU com decodificação e tracking,
+    limitar as threads e desligar o spinning evita disputar núcleos com o
+    resto do pipeline.
+    
+    Args:
+        intra_op_threads: Threads dentro de cada operador (0 = padrão do ORT)
+        inter_op_threads: Threads entre operadores (só usado em modo "parallel")
+        execution_mode: "sequential" ou "parallel"
+        graph_optimization_level: "disable", "basic", "extended" ou "all"
+        enable_mem_pattern: Pré-planejar as alocações de memória da sessão
+        allow_spinning: Threads ociosas ficam em busy-wait (menor latência,
+                        mais CPU)
+    """
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = int(intra_op_threads)
+    options.inter_op_num_threads = int(inter_op_threads)
+    options.execution_mode = _EXECUTION_MODES[execution_mode.lower()]
+    options.graph_optimization_level = _GRAPH_OPT_LEVELS[graph_optimization_level.lower()]
+    options.enable_mem_pattern = bool(enable_mem_pattern)
+    spinning = "1" if allow_spinning else "0"
+    options.add_session_config_entry("session.intra_op.allow_spinning", spinning)
+    options.add_session_config_entry("session.inter_op.allow_spinning", spinning)
+    return options
+
+
+def quantized_model_path(model_path):
+    """Caminho padrão do modelo INT8 gerado por tools/quantize.py: x.onnx -> x-int8.onnx."""
+    stem, ext = os.path.splitext(model_path)
+    return f"{stem}-int8{ext}"
+
+
+def optimized_model_cache_path(model_path, cache_dir, session_options=None):
+    """
+    Caminho do modelo otimizado em cache para esta combinação de modelo,
+    versão do ONNX Runtime e opções de sessão (ver model_cache_path).
+    """
+    return model_cache_path(model_path, cache_dir, ort.__version__, session_options, ".opt.onnx")
+
+
+def _static_dim(dim, default):
+    return int(dim) if isinstance(dim, int) else default
+
 
 class ONNXDetector:
-    def __init__(self, model_path="weights/yolov5nu.onnx", conf=0.25):
+    def __init__(self, model_path="weights/yolov5nu.onnx", conf=0.25, iou=0.45, max_det=300,
+                 nms_backend="numpy", session_options=None, use_iobinding=True, cache_dir=None,
+                 prefer_int8=False):
         """
         Inicializa o detector ONNX.
         
         Args:
             model_path: Caminho para o modelo .onnx
             conf: Confidence threshold
+            iou: IoU threshold do NMS por classe
+            max_det: Número máximo de detecções por frame (top-k do NMS)
+            nms_backend: "numpy" ou "cv2"
+            session_options: dict com os argumentos de make_session_options
+            use_iobinding: Ligar buffers de entrada/saída pré-alocados à sessão
+            cache_dir: Diretório do cache do grafo otimizado (None = sem cache)
+            prefer_int8: Usar <modelo>-int8.onnx (tools/quantize.py) se existir
         """
+        if prefer_int8:
+            int8_path = quantized_model_path(model_path)
+            if os.path.exists(int8_path):
+                print(f"🔢 Usando modelo quantizado INT8: {int8_path}")
+                model_path = int8_path
+            else:
+                print(f"⚠️ Modelo INT8 não encontrado ({int8_path}), usando FP32")
+
         self.model_path = model_path
         self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.nms_backend = nms_backend
         
         # Carregar modelo ONNX
-        self.session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        self.session_options = make_session_options(**(session_options or {}))
+        if cache_dir:
+            self.session = self._load_cached_session(model_path, cache_dir, session_options)
+        else:
+            self.session = ort.InferenceSession(model_path, sess_options=self.session_options,
+                                                providers=['CPUExecutionProvider'])
         
         # Obter informações de entrada/saída
         self.input_name = self.session.get_inputs()[0].name
@@ -28,12 +133,92 @@ class ONNXDetector:
         
         self.output_names = [output.name for output in self.session.get_outputs()]
         
-        self.input_height = int(self.input_shape[2]) if len(self.input_shape) > 2 else 640
-        self.input_width = int(self.input_shape[3]) if len(self.input_shape) > 3 else 640
+        # Modelo end-to-end (tools/export.py): única saída (K, 6) já com NMS no grafo
+        outputs = self.session.get_outputs()
+        self.end_to_end = len(outputs) == 1 and len(outputs[0].shape) == 2 and outputs[0].shape[-1] == 6
+        
+        self.input_height = _static_dim(self.input_shape[2], 640) if len(self.input_shape) > 2 else 640
+        self.input_width = _static_dim(self.input_shape[3], 640) if len(self.input_shape) > 3 else 640
+        
+        # Buffer de entrada NCHW float32 reaproveitado entre frames
+        self.preprocessor = LetterboxPreprocessor(self.input_width, self.input_height, layout="nchw")
+        
+        self.io_binding = None
+        self.output_buffers = None
+        if use_iobinding:
+            self._bind_buffers()
         
         print(f"✅ Modelo ONNX carregado: {model_path}")
         print(f"   Input: {self.input_shape}")
-        print(f"   Outputs: {len(self.output_names)}")
+        print(f"   Outputs: {len(self.output_names)}{' (end-to-end, NMS no grafo)' if self.end_to_end else ''}")
+        print(f"   IOBinding: {'sim' if self.io_binding is not None else 'não'}")
+    
+    def _load_cached_session(self, model_path, cache_dir, session_options):
+        """
+        Carrega a sessão a partir do grafo já otimizado em disco, se existir.
+        
+        Na primeira execução o ORT otimiza o modelo normalmente e salva o
+        resultado (optimized_model_filepath); nas seguintes o grafo salvo é
+        carregado com as otimizações desligadas, pulando o re-parse/re-otimização
+        que custa segundos no Raspberry Pi a cada restart do watchdog.
+        """
+        cache_path = optimized_model_cache_path(model_path, cache_dir, session_options)
+        
+        if os.path.exists(cache_path):
+            self.session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            try:
+                session = ort.InferenceSession(cache_path, sess_options=self.session_options,
+                                               providers=['CPUExecutionProvider'])
+                print(f"⚡ Grafo otimizado carregado do cache: {cache_path}")
+                return session
+            except Exception as e:
+                print(f"⚠️ Cache do grafo inválido ({e}), otimizando novamente")
+                self.session_options = make_session_options(**(session_options or {}))
+        
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        self.session_options.optimized_model_filepath = tmp_path
+        session = ort.InferenceSession(model_path, sess_options=self.session_options,
+                                       providers=['CPUExecutionProvider'])
+        
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, cache_path)
+            
+            # Remover caches antigos do mesmo modelo (outra versão/opções)
+            stem = os.path.basename(cache_path).rsplit("-", 1)[0]
+            for old in glob.glob(os.path.join(cache_dir, f"{stem}-{'?' * 16}.opt.onnx")):
+                if old != cache_path:
+                    os.remove(old)
+            print(f"💾 Grafo otimizado salvo em cache: {cache_path}")
+        
+        return session
+    
+    def _bind_buffers(self):
+        """
+        Liga o buffer de entrada do preprocessor e buffers de saída pré-alocados
+        à sessão. O ORT lê e escreve direto nesses arrays a cada run, sem criar
+        arrays novos. Saídas com shape dinâmico (ex.: modelo end-to-end) são
+        alocadas pelo ORT e copiadas após o run.
+        """
+        outputs = self.session.get_outputs()
+        
+        self.io_binding = self.session.io_binding()
+        self._input_ortvalue = ort.OrtValue.ortvalue_from_numpy(self.preprocessor.buffer)
+        self.io_binding.bind_ortvalue_input(self.input_name, self._input_ortvalue)
+        
+        if not all(isinstance(d, int) for o in outputs for d in o.shape):
+            for output in outputs:
+                self.io_binding.bind_output(output.name, "cpu")
+            return
+        
+        self.output_buffers = []
+        self._output_ortvalues = []
+        for output in outputs:
+            buf = np.empty(output.shape, dtype=_ORT_TYPES.get(output.type, np.float32))
+            ortvalue = ort.OrtValue.ortvalue_from_numpy(buf)
+            self.io_binding.bind_ortvalue_output(output.name, ortvalue)
+            self.output_buffers.append(buf)
+            self._output_ortvalues.append(ortvalue)
     
     def detect(self, frame):
         """
@@ -43,16 +228,22 @@ class ONNXDetector:
             frame: Imagem BGR do OpenCV
             
         Returns:
-            Lista de detecções no formato:
-            [{'cls': int, 'score': float, 'bbox': [x1, y1, x2, y2]}, ...]
+            Detections (N, 6) [x1, y1, x2, y2, score, cls]
         """
         h, w = frame.shape[:2]
         
-        # Preparar input
+        # Preparar input (escrito no buffer persistente já ligado à sessão)
         input_data = self._preprocess(frame)
         
         # Inferência
-        outputs = self.session.run(self.output_names, {self.input_name: input_data})
+        if self.io_binding is not None:
+            self.session.run_with_iobinding(self.io_binding)
+            if self.output_buffers is not None:
+                outputs = self.output_buffers
+            else:
+                outputs = self.io_binding.copy_outputs_to_cpu()
+        else:
+            outputs = self.session.run(self.output_names, {self.input_name: input_data})
         
         # Pós-processamento
         detections = self._postprocess(outputs, h, w)
@@ -62,76 +253,40 @@ class ONNXDetector:
     def _preprocess(self, frame):
         """
         Pré-processar frame para ONNX.
-        Redimensiona, normaliza e converte para float32.
+        Letterbox + BGR->RGB + normalização escritos direto no buffer NCHW
+        float32 persistente do detector (sem arrays intermediários).
         """
-        # Redimensionar (usar cv2 para compatibilidade)
-        import cv2
-        img = cv2.resize(frame, (self.input_width, self.input_height))
-        
-        # Converter BGR para RGB
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
-        # Normalizar para [0, 1]
-        img = img.astype(np.float32) / 255.0
-        
-        # Transpor para formato NCHW (necessário para ONNX)
-        img = np.transpose(img, (2, 0, 1))
-        
-        # Adicionar batch dimension
-        img = np.expand_dims(img, axis=0)
-        
-        return img
+        return self.preprocessor(frame)
     
     def _postprocess(self, outputs, h, w):
         """
         Pós-processar outputs do modelo ONNX.
         
-        YOLOv5 output: (1, 25200, 85) ou similar
-        Formato: [x, y, w, h, objectness, class_scores...]
+        Aceita tanto o layout clássico do YOLOv5 (1, 25200, 85) com objectness
+        quanto o layout anchor-free do yolov5nu (1, 84, 8400), detectado
+        automaticamente. A decodificação é feita em lote com NumPy, seguida
+        de NMS por classe. Modelos end-to-end já devolvem as detecções finais
+        (K, 6) e só têm as boxes remapeadas para o frame.
         """
-        detections = []
-        
         try:
-            # Output do YOLOv5 ONNX
-            output = outputs[0][0]  # (num_predictions, 85)
+            if self.end_to_end:
+                data = outputs[0]
+                boxes = np.array(data[:, :4], dtype=np.float32)
+                self.preprocessor.unmap_boxes(boxes)
+                return Detections.from_arrays(boxes, data[:, 4], data[:, 5])
+            
+            boxes, scores, cls_ids = decode_yolo_output(outputs[0], self.conf)
+            
+            # NMS por classe (o modelo exportado não faz NMS no grafo)
+            keep = batched_nms(boxes, scores, cls_ids, self.iou, self.max_det, self.nms_backend)
+            boxes, scores, cls_ids = boxes[keep], scores[keep], cls_ids[keep]
             
-            for pred in output:
-                # Primeiros 4: coordenadas
-                x_center, y_center, width, height = pred[:4]
-                
-                # Próximo: objectness score
-                objectness = float(pred[4])
-                
-                if objectness < self.conf:
-                    continue
-                
-                # Resto: class scores
-                class_scores = pred[5:]
-                cls_id = int(np.argmax(class_scores))
-                score = float(class_scores[cls_id] * objectness)
-                
-                if score < self.conf:
-                    continue
-                
-                # Converter coordenadas de center to corner
-                x1 = int((x_center - width / 2) * w)
-                y1 = int((y_center - height / 2) * h)
-                x2 = int((x_center + width / 2) * w)
-                y2 = int((y_center + height / 2) * h)
-                
-                # Clamp to image bounds
-                x1 = max(0, min(x1, w - 1))
-                y1 = max(0, min(y1, h - 1))
-                x2 = max(0, min(x2, w - 1))
-                y2 = max(0, min(y2, h - 1))
-                
-                detections.append({
-                    'cls': cls_id,
-                    'score': score,
-                    'bbox': [x1, y1, x2, y2]
-                })
+            # Coordenadas no espaço do letterbox -> pixels do frame
+            self.preprocessor.unmap_boxes(boxes)
+            
+            return Detections.from_arrays(boxes, scores, cls_ids)
         
         except Exception as e:
             print(f"⚠️ Erro no pós-processamento ONNX: {e}")
         
-        return detections
+        return Detections.empty()
@@ -0,0 +1,151 @@
+"""
+Pré-processamento com letterbox escrevendo direto em buffers persistentes.
+
+O frame é redimensionado (mantendo a proporção) para dentro de um canvas
+uint8 reaproveitado entre frames e, em seguida, convertido BGR -> RGB e
+normalizado direto no tensor de entrada do detector (NCHW ou NHWC), sem
+arrays intermediários do tamanho da imagem.
+"""
+
+import cv2
+import numpy as np
+
+
+class LetterboxPreprocessor:
+    def __init__(self, width=640, height=640, layout="nchw", dtype=np.float32, pad_value=114,
+                 buffer=None, quantization=None, allocate=True):
+        """
+        Args:
+            width, height: Tamanho de entrada do modelo
+            layout: "nchw" (ONNX/PyTorch) ou "nhwc" (TFLite)
+            dtype: dtype do tensor de entrada
+            pad_value: Cor (cinza) das bordas do letterbox
+            buffer: Tensor de entrada já alocado (opcional). Se None, o
+                    preprocessor aloca e mantém o seu próprio.
+            quantization: (scale, zero_point) do tensor de entrada int8/uint8;
+                          q = round(pixel / 255 / scale + zero_point)
+            allocate: Se False, não aloca buffer próprio (o destino é sempre
+                      passado em __call__, ex.: tensor interno do TFLite)
+        """
+        self.width = int(width)
+        self.height = int(height)
+        self.layout = layout.lower()
+        self.pad_value = pad_value
+        self.dtype = np.dtype(dtype)
+
+        shape = (1, 3, self.height, self.width) if self.layout == "nchw" else (1, self.height, self.width, 3)
+        if buffer is not None:
+            self.buffer = buffer
+        else:
+            self.buffer = np.empty(shape, dtype=self.dtype) if allocate else None
+
+        # Entrada quantizada: buffer float temporário persistente para o arredondamento
+        self.quantization = None
+        self._qtmp = None
+        if quantization is not None and quantization[0] and self.dtype.kind in "iu":
+            scale, zero_point = quantization
+            self.quantization = (float(scale), int(zero_point))
+            self._qtmp = np.empty(shape[1:], dtype=np.float32)
+
+        # Canvas BGR com as bordas do letterbox (preenchidas só quando o tamanho do frame muda)
+        self.canvas = np.full((self.height, self.width, 3), pad_value, dtype=np.uint8)
+        self._region = None
+        self._frame_shape = None
+
+        self.ratio = 1.0
+        self.pad = (0, 0)
+
+    def _configure(self, h, w):
+        """Recalcula escala/padding para um novo tamanho de frame."""
+        r = min(self.width / w, self.height / h)
+        new_w, new_h = int(round(w * r)), int(round(h * r))
+        left = (self.width - new_w) // 2
+        top = (self.height - new_h) // 2
+
+        self.canvas[...] = self.pad_value
+        self._region = self.canvas[top:top + new_h, left:left + new_w]
+        self._frame_shape = (h, w)
+        self.ratio = r
+        self.pad = (left, top)
+
+    def __call__(self, frame, out=None):
+        """
+        Aplica letterbox + BGR->RGB + /255 escrevendo no tensor de entrada.
+
+        Args:
+            frame: Imagem BGR uint8 do OpenCV
+            out: Tensor de destino (opcional, ex.: view de um tensor do runtime).
+                 Por padrão usa o buffer persistente do preprocessor.
+
+        Returns:
+            O tensor preenchido
+        """
+        h, w = frame.shape[:2]
+        if self._frame_shape != (h, w):
+            self._configure(h, w)
+
+        region = self._region
+        if region.shape[:2] == (h, w):
+            region[...] = frame
+        else:
+            resized = cv2.resize(frame, (region.shape[1], region.shape[0]), dst=region,
+                                 interpolation=cv2.INTER_LINEAR)
+            if not np.may_share_memory(resized, region):
+                region[...] = resized
+
+        out = self.buffer if out is None else out
+        self._fill(out)
+        return out
+
+    def _fill(self, out):
+        if self.quantization is not None:
+            self._fill_quantized(out)
+            return
+        scale = np.float32(1.0 / 255.0)
+        if self.layout == "nchw":
+            # Canal RGB c do tensor vem do canal BGR (2 - c) do canvas
+            for c in range(3):
+                np.multiply(self.canvas[:, :, 2 - c], scale, out=out[0, c], casting="unsafe")
+        else:
+            np.multiply(self.canvas[:, :, ::-1], scale, out=out[0], casting="unsafe")
+
+    def _fill_quantized(self, out):
+        scale, zero_point = self.quantization
+        rgb = self.canvas[:, :, ::-1]
+
+        # Caso comum (uint8 com scale 1/255, zp 0): o valor quantizado é o próprio pixel
+        if self.dtype == np.uint8 and zero_point == 0 and abs(scale * 255.0 - 1.0) < 1e-6:
+            if self.layout == "nchw":
+                out[0][...] = rgb.transpose(2, 0, 1)
+            else:
+                out[0][...] = rgb
+            return
+
+        tmp = self._qtmp
+        src = rgb.transpose(2, 0, 1) if self.layout == "nchw" else rgb
+        info = np.iinfo(self.dtype)
+        np.multiply(src, np.float32(1.0 / (255.0 * scale)), out=tmp, casting="unsafe")
+        tmp += np.float32(zero_point)
+        np.rint(tmp, out=tmp)
+        np.clip(tmp, info.min, info.max, out=tmp)
+        np.copyto(out[0], tmp, casting="unsafe")
+
+    def unmap_boxes(self, boxes):
+        """
+        Converte boxes (in-place) do espaço do letterbox para pixels do frame
+        original e limita às bordas da imagem.
+
+        Args:
+            boxes: (K, 4) float32 [x1, y1, x2, y2] no espaço de entrada do modelo
+
+        Returns:
+            O próprio array `boxes`
+        """
+        h, w = self._frame_shape
+        left, top = self.pad
+        boxes[:, 0::2] -= left
+        boxes[:, 1::2] -= top
+        boxes /= self.ratio
+        np.clip(boxes[:, 0::2], 0, w - 1, out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0, h - 1, out=boxes[:, 1::2])
+        return boxes
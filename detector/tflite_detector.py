@@ -4,183 +4,237 @@ Otimizado para Raspberry Pi e dispositivos com recursos limitados
 """
 
 import numpy as np
-import tensorflow as tf
 from pathlib import Path
 
+# tflite_runtime é bem mais leve que o tensorflow completo no Raspberry Pi
+try:
+    from tflite_runtime import interpreter as tflite
+except ImportError:
+    import tensorflow as tf
+    tflite = tf.lite
+
+from detector.decode import decode_yolo_output
+from detector.detections import Detections
+from detector.nms import batched_nms
+from detector.preprocess import LetterboxPreprocessor
+
+
+def make_interpreter(model_path, num_threads=None, use_xnnpack=True):
+    """
+    Cria o Interpreter do TFLite.
+
+    Args:
+        model_path: Caminho para o modelo .tflite
+        num_threads: Threads do interpreter/XNNPACK (None = padrão)
+        use_xnnpack: Se False, desativa os delegates padrão (XNNPACK)
+    """
+    kwargs = {"model_path": model_path, "num_threads": num_threads}
+    # tf.lite expõe o enum em tf.lite.experimental; o tflite_runtime, no próprio módulo
+    resolver = getattr(getattr(tflite, "experimental", None), "OpResolverType", None)
+    if resolver is None:
+        resolver = getattr(tflite, "OpResolverType", None)
+    if resolver is not None:
+        kwargs["experimental_op_resolver_type"] = (
+            resolver.AUTO if use_xnnpack else resolver.BUILTIN_WITHOUT_DEFAULT_DELEGATES)
+    try:
+        return tflite.Interpreter(**kwargs)
+    except TypeError:
+        # Versões antigas não aceitam experimental_op_resolver_type
+        kwargs.pop("experimental_op_resolver_type", None)
+        return tflite.Interpreter(**kwargs)
+
+
+def _quantization(detail):
+    """(scale, zero_point) de um tensor quantizado, ou None se for float."""
+    scale, zero_point = detail['quantization']
+    return (scale, zero_point) if scale else None
+
 
 class TFLiteDetector:
-    def __init__(self, model_path="weights/yolov5n-int8.tflite", conf=0.25):
+    def __init__(self, model_path="weights/yolov5n-int8.tflite", conf=0.25, iou=0.45, max_det=300,
+                 nms_backend="numpy", num_threads=None, use_xnnpack=True, interpreter=None):
         """
         Inicializa o detector TFLite.
-        
+
         Args:
             model_path: Caminho para o modelo .tflite
             conf: Confidence threshold
+            iou: IoU threshold do NMS por classe
+            max_det: Número máximo de detecções por frame (top-k do NMS)
+            nms_backend: "numpy" ou "cv2"
+            num_threads: Threads do interpreter (None = padrão do TFLite)
+            use_xnnpack: Usar o delegate XNNPACK (padrão do TFLite em CPU)
+            interpreter: Interpreter já criado (ex.: Coral TPU)
         """
         self.model_path = model_path
         self.conf = conf
-        
+        self.iou = iou
+        self.max_det = max_det
+        self.nms_backend = nms_backend
+
         # Carregar modelo TFLite
-        self.interpreter = tf.lite.Interpreter(model_path=model_path)
+        if interpreter is None:
+            interpreter = make_interpreter(model_path, num_threads, use_xnnpack)
+        self.interpreter = interpreter
         self.interpreter.allocate_tensors()
-        
+
         # Obter detalhes de entrada/saída
         self.input_details = self.interpreter.get_input_details()
         self.output_details = self.interpreter.get_output_details()
-        
+        self.input_index = self.input_details[0]['index']
+        self.output_quantization = [_quantization(d) for d in self.output_details]
+
         # Tamanho de entrada esperado
         self.input_shape = self.input_details[0]['shape']
         self.input_height, self.input_width = self.input_shape[1], self.input_shape[2]
-        
+
+        # O preprocessor escreve direto no tensor de entrada do interpreter
+        # (quantizando com scale/zero-point do modelo se a entrada for int8/uint8)
+        self.preprocessor = LetterboxPreprocessor(
+            self.input_width, self.input_height, layout="nhwc",
+            dtype=self.input_details[0]['dtype'],
+            quantization=_quantization(self.input_details[0]),
+            allocate=False,
+        )
+
         print(f"✅ Modelo TFLite carregado: {model_path}")
-        print(f"   Entrada: {self.input_shape}")
+        print(f"   Entrada: {self.input_shape} {np.dtype(self.input_details[0]['dtype']).name}")
         print(f"   Outputs: {len(self.output_details)}")
-    
+
     def detect(self, frame):
         """
         Detecta objetos no frame.
-        
+
         Args:
             frame: Imagem BGR do OpenCV
-            
+
         Returns:
-            Lista de detecções no formato:
-            [{'cls': int, 'score': float, 'bbox': [x1, y1, x2, y2]}, ...]
+            Detections (N, 6) [x1, y1, x2, y2, score, cls]
         """
         h, w = frame.shape[:2]
-        
-        # Preparar input
-        input_data = self._preprocess(frame)
-        
+
+        # Preparar input direto no tensor do interpreter (sem set_tensor)
+        self._preprocess(frame)
+
         # Inferência
-        self.interpreter.set_tensor(self.input_details[0]['index'], input_data)
         self.interpreter.invoke()
-        
+
         # Pós-processamento
         detections = self._postprocess(frame, h, w)
-        
+
         return detections
-    
+
     def _preprocess(self, frame):
         """
         Pré-processar frame para TFLite.
-        
-        Redimensiona, normaliza e converte para o formato esperado.
+
+        Letterbox + BGR->RGB + normalização/quantização escritos direto no
+        tensor de entrada do interpreter (mesmo motor do ONNXDetector).
+        A view é liberada antes do invoke, como o TFLite exige.
         """
-        # Redimensionar
-        img = tf.image.resize(frame, (self.input_height, self.input_width))
-        
-        # Normalizar para [0, 1]
-        img = img / 255.0
-        
-        # Converter para float32 e adicionar batch dimension
-        img = tf.cast(img, tf.float32)
-        img = tf.expand_dims(img, axis=0)
-        
-        return img.numpy()
-    
+        input_view = self.interpreter.tensor(self.input_index)()
+        self.preprocessor(frame, out=input_view)
+        del input_view
+
+    def _output(self, i):
+        """View (sem cópia) da i-ésima saída, sem a dimensão de batch."""
+        return self.interpreter.tensor(self.output_details[i]['index'])()[0]
+
+    def _dequantized(self, i):
+        """i-ésima saída em float32 (desquantizada se necessário)."""
+        data = self._output(i)
+        quant = self.output_quantization[i]
+        if quant is None:
+            return data
+        scale, zero_point = quant
+        return (data.astype(np.float32) - np.float32(zero_point)) * np.float32(scale)
+
     def _postprocess(self, frame, h, w):
         """
         Pós-processar outputs do modelo.
-        
+
         Nota: O formato exato depende do modelo TFLite usado.
         Este código assume formato padrão de YOLO.
         """
-        detections = []
-        
         try:
             # Saídas típicas de YOLO TFLite:
             # boxes: [1, num_detections, 4] (y1, x1, y2, x2 normalizado)
             # classes: [1, num_detections] (class_id)
             # scores: [1, num_detections] (confidence)
-            
-            output_data = self.interpreter.get_tensor(self.output_details[0]['index'])
-            
+
             # Se tem múltiplos outputs, processa cada um
             if len(self.output_details) >= 3:
-                boxes = self.interpreter.get_tensor(self.output_details[0]['index'])[0]
-                classes = self.interpreter.get_tensor(self.output_details[1]['index'])[0]
-                scores = self.interpreter.get_tensor(self.output_details[2]['index'])[0]
-            else:
-                # Single output: assume formato [1, num_detections, 6] (x1,y1,x2,y2,score,cls)
-                output_data = output_data[0]
-                
-                for detection in output_data:
-                    x1, y1, x2, y2, score, cls_id = detection
-                    
-                    if score < self.conf:
-                        continue
-                    
-                    # Converter coordenadas normalizadas para pixels
-                    x1 = int(x1 * w)
-                    y1 = int(y1 * h)
-                    x2 = int(x2 * w)
-                    y2 = int(y2 * h)
-                    
-                    detections.append({
-                        'cls': int(cls_id),
-                        'score': float(score),
-                        'bbox': [x1, y1, x2, y2]
-                    })
-                
-                return detections
-            
-            # Processar boxes, classes, scores separados
-            for box, cls_id, score in zip(boxes, classes, scores):
-                if score < self.conf:
-                    continue
-                
+                boxes = self._dequantized(0)
+                classes = self._dequantized(1)
+                scores = self._dequantized(2)
+
                 # Box em formato [y1, x1, y2, x2] normalizado
-                y1, x1, y2, x2 = box
-                
-                # Converter para pixels
-                x1 = int(x1 * w)
-                y1 = int(y1 * h)
-                x2 = int(x2 * w)
-                y2 = int(y2 * h)
-                
-                detections.append({
-                    'cls': int(cls_id),
-                    'score': float(score),
-                    'bbox': [x1, y1, x2, y2]
-                })
-        
+                boxes = boxes[:, [1, 0, 3, 2]]
+            elif self.output_details[0]['shape'][-1] == 6:
+                # Single output: assume formato [1, num_detections, 6] (x1,y1,x2,y2,score,cls)
+                output_data = self._dequantized(0)
+                boxes = output_data[:, :4]
+                scores = output_data[:, 4]
+                classes = output_data[:, 5]
+            else:
+                # Saída YOLO crua (1, N, 85) / (1, 84, N) com coordenadas normalizadas:
+                # filtra ainda quantizada e só desquantiza as candidatas
+                boxes, scores, classes = decode_yolo_output(
+                    self._output(0), self.conf, quantization=self.output_quantization[0])
+
+            mask = scores >= self.conf
+            boxes = boxes[mask].astype(np.float32)
+            scores = scores[mask].astype(np.float32)
+            classes = classes[mask].astype(np.int64)
+
+            keep = batched_nms(boxes, scores, classes, self.iou, self.max_det, self.nms_backend)
+
+            # Coordenadas normalizadas -> espaço do letterbox -> pixels do frame
+            boxes = boxes[keep] * np.array([self.input_width, self.input_height] * 2, dtype=np.float32)
+            self.preprocessor.unmap_boxes(boxes)
+
+            return Detections.from_arrays(boxes, scores[keep], classes[keep])
+
         except Exception as e:
             print(f"⚠️ Erro no pós-processamento TFLite: {e}")
-        
-        return detections
+
+        return Detections.empty()
 
 
 class TFLiteDetectorAdvanced(TFLiteDetector):
     """
     Versão avançada com suporte a Coral TPU.
     """
-    
-    def __init__(self, model_path="weights/yolov5n-int8.tflite", conf=0.25, use_coral=False):
+
+    def __init__(self, model_path="weights/yolov5n-int8.tflite", conf=0.25, use_coral=False,
+                 iou=0.45, max_det=300, nms_backend="numpy", num_threads=None, use_xnnpack=True):
         """
         Args:
             model_path: Caminho para o modelo .tflite
             conf: Confidence threshold
             use_coral: Se True, tenta usar Google Coral TPU
+            iou: IoU threshold do NMS por classe
+            max_det: Número máximo de detecções por frame (top-k do NMS)
+            nms_backend: "numpy" ou "cv2"
+            num_threads: Threads do interpreter (None = padrão do TFLite)
+            use_xnnpack: Usar o delegate XNNPACK (padrão do TFLite em CPU)
         """
         self.use_coral = use_coral
-        
+        interpreter = None
+
         if use_coral:
             try:
-                from pycoral.adapters import common
-                from pycoral.utils.edgetpu import make_interpreter
-                
+                from pycoral.utils.edgetpu import make_interpreter as make_edgetpu_interpreter
+
                 print("🪨 Usando Google Coral TPU...")
                 # Modelo deve ter "_edgetpu" no nome
-                self.interpreter = make_interpreter(model_path)
-                self.interpreter.allocate_tensors()
+                interpreter = make_edgetpu_interpreter(model_path)
             except ImportError:
                 print("⚠️ pycoral não instalado, usando CPU TFLite")
-                super().__init__(model_path, conf)
                 self.use_coral = False
             except Exception as e:
                 print(f"⚠️ Coral TPU não disponível: {e}, usando CPU TFLite")
-                super().__init__(model_path, conf)
                 self.use_coral = False
-        else:
-            super().__init__(model_path, conf)
+
+        super().__init__(model_path, conf, iou, max_det, nms_backend, num_threads, use_xnnpack,
+                         interpreter=interpreter)
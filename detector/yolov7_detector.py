@@ -1,51 +1,218 @@
-import torch
-import numpy as np
+"""
+Detector YOLOv7 (PyTorch) com caminho rápido em CPU.
+
+O checkpoint é carregado uma única vez a partir de arquivos locais, sem
+torch.hub, e rastreado (torch.jit.trace) para TorchScript. O módulo
+rastreado fica em cache no disco, e os starts seguintes não precisam nem
+do código-fonte do YOLOv7. A inferência roda em torch.inference_mode()
+com memória channels_last, usando o mesmo letterbox/decodificação/NMS em
+NumPy dos detectores ONNX/TFLite.
+"""
+
+import glob
+import os
+import sys
 from pathlib import Path
 
+import torch
+import torch.nn as nn
+
+from detector.decode import decode_yolo_output
+from detector.detections import Detections
+from detector.model_cache import model_cache_path
+from detector.nms import batched_nms
+from detector.preprocess import LetterboxPreprocessor
+
+
+def default_repo_dir():
+    """Clone do WongKinYiu/yolov7 deixado pelo torch.hub (se já foi baixado alguma vez)."""
+    return os.path.join(torch.hub.get_dir(), "WongKinYiu_yolov7_main")
+
+
+def torchscript_cache_path(weights, cache_dir, img_size=640, channels_last=True):
+    """
+    Caminho do módulo TorchScript em cache para esta combinação de pesos,
+    versão do PyTorch e opções de exportação (ver model_cache_path).
+    """
+    options = {"img_size": img_size, "channels_last": channels_last}
+    return model_cache_path(weights, cache_dir, torch.__version__, options, ".torchscript.pt")
+
+
+def load_checkpoint(weights, repo_dir=None):
+    """
+    Carrega o checkpoint .pt do YOLOv7 (fundido, FP32, eval) sem torch.hub.
+
+    O pickle do checkpoint referencia as classes de models/yolo.py do
+    YOLOv7, então o código-fonte precisa estar em `repo_dir` (um clone do
+    repositório; por padrão o do cache do torch.hub). Como a pasta utils
+    deste projeto foi renomeada para helpers, não há conflito com o utils
+    do YOLOv7 no sys.path.
+    """
+    repo_dir = repo_dir or default_repo_dir()
+    if not os.path.isdir(os.path.join(repo_dir, "models")):
+        raise RuntimeError(
+            f"Código do YOLOv7 não encontrado em {repo_dir}. "
+            "Clone com: git clone https://github.com/WongKinYiu/yolov7 e configure yolov7_repo"
+        )
+    if repo_dir not in sys.path:
+        sys.path.insert(0, repo_dir)
+
+    try:
+        ckpt = torch.load(weights, map_location="cpu", weights_only=False)
+    except TypeError:
+        # PyTorch < 1.13 não tem weights_only
+        ckpt = torch.load(weights, map_location="cpu")
+
+    model = (ckpt.get("ema") or ckpt["model"]).float().fuse().eval()
+
+    # Compatibilidade com checkpoints antigos (mesmo ajuste do attempt_load do YOLOv7)
+    for m in model.modules():
+        if type(m) is nn.Upsample:
+            m.recompute_scale_factor = None
+    return model
+
+
+class _PredictionHead(nn.Module):
+    """Devolve só as predições (1, N, 85) do YOLOv7 em eval, sem as saídas de treino."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x)[0]
+
 
 class YOLOv7Detector:
-    def __init__(self, weights, conf=0.4, device="cpu", img_size=640):
-        self.device = device
+    def __init__(self, weights, conf=0.4, device="cpu", img_size=640, iou=0.45, max_det=300,
+                 nms_backend="numpy", repo_dir=None, cache_dir=None, num_threads=0,
+                 channels_last=True):
+        """
+        Inicializa o detector YOLOv7.
+
+        Args:
+            weights: Checkpoint .pt do YOLOv7
+            conf: Confidence threshold
+            device: "cpu" ou "cuda:0"
+            img_size: Tamanho (quadrado) de entrada do modelo rastreado
+            iou: IoU threshold do NMS por classe
+            max_det: Número máximo de detecções por frame (top-k do NMS)
+            nms_backend: "numpy" ou "cv2"
+            repo_dir: Clone local do WongKinYiu/yolov7 (None = cache do torch.hub).
+                      Só é necessário quando o TorchScript ainda não está em cache.
+            cache_dir: Diretório do cache TorchScript (None = rastrear a cada start)
+            num_threads: torch.set_num_threads (0 = padrão do PyTorch)
+            channels_last: Usar memória channels_last (NHWC) na entrada e nos pesos
+
+        O YOLOv7 só tem convoluções (nenhuma camada Linear), então não há
+        quantização aqui: para INT8 use o detector ONNX com onnx_prefer_int8
+        (modelo gerado por python -m tools.quantize).
+        """
+        self.device = torch.device(device)
         self.conf = conf
         self.img_size = img_size
-        
+        self.iou = iou
+        self.max_det = max_det
+        self.nms_backend = nms_backend
+        self.channels_last = channels_last
+
+        if num_threads:
+            torch.set_num_threads(int(num_threads))
+
         # Converter para caminho absoluto
         weights = str(Path(weights).resolve())
-        
+
         print(f"🔄 Carregando modelo de: {weights}")
-        
+
         try:
-            # Usar torch.hub para carregar o modelo YOLOv7
-            # Agora que a pasta utils foi renomeada para helpers, não há conflito
-            self.model = torch.hub.load(
-                'WongKinYiu/yolov7',
-                'custom',
-                path_or_model=weights,
-                trust_repo=True,
-                force_reload=False
-            )
-            self.model.conf = self.conf
-            self.model.to(self.device)
-            
+            if cache_dir:
+                self.model = self._load_cached_module(weights, cache_dir, repo_dir)
+            else:
+                self.model = self._trace(load_checkpoint(weights, repo_dir))
             print(f"✅ Modelo YOLOv7 carregado com sucesso!")
-            
+
         except Exception as e:
             raise RuntimeError(f"Erro ao carregar modelo: {e}")
 
+        # Buffer de entrada persistente. Com channels_last o preprocessor escreve
+        # NHWC e o tensor é a mesma memória vista como NCHW (strides channels_last),
+        # sem cópia nem permutação por frame.
+        layout = "nhwc" if channels_last else "nchw"
+        self.preprocessor = LetterboxPreprocessor(img_size, img_size, layout=layout)
+        self._input = torch.from_numpy(self.preprocessor.buffer)
+        if channels_last:
+            self._input = self._input.permute(0, 3, 1, 2)
+
+        print(f"   Threads: {torch.get_num_threads()} | channels_last: {'sim' if channels_last else 'não'}")
+
+    def _example_input(self):
+        example = torch.zeros(1, 3, self.img_size, self.img_size, device=self.device)
+        if self.channels_last:
+            example = example.contiguous(memory_format=torch.channels_last)
+        return example
+
+    def _trace(self, model):
+        """Converte para channels_last e rastreia para TorchScript."""
+        model = _PredictionHead(model).to(self.device).eval()
+        if self.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+
+        with torch.no_grad():
+            traced = torch.jit.trace(model, self._example_input(), check_trace=False)
+        return torch.jit.freeze(traced)
+
+    def _load_cached_module(self, weights, cache_dir, repo_dir):
+        """
+        Carrega o módulo TorchScript do cache, se existir; senão carrega o
+        checkpoint, rastreia e salva. O módulo em cache dispensa o código-fonte
+        do YOLOv7 e o re-trace a cada restart.
+        """
+        cache_path = torchscript_cache_path(weights, cache_dir, self.img_size, self.channels_last)
+
+        if os.path.exists(cache_path):
+            try:
+                module = torch.jit.load(cache_path, map_location=self.device)
+                print(f"⚡ TorchScript carregado do cache: {cache_path}")
+                return module
+            except Exception as e:
+                print(f"⚠️ Cache TorchScript inválido ({e}), rastreando novamente")
+
+        module = self._trace(load_checkpoint(weights, repo_dir))
+
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        torch.jit.save(module, tmp_path)
+        os.replace(tmp_path, cache_path)
+
+        # Remover caches antigos do mesmo checkpoint (outra versão/opções)
+        stem = os.path.basename(cache_path).rsplit("-", 1)[0]
+        for old in glob.glob(os.path.join(cache_dir, f"{stem}-{'?' * 16}.torchscript.pt")):
+            if old != cache_path:
+                os.remove(old)
+        print(f"💾 TorchScript salvo em cache: {cache_path}")
+
+        return module
+
     def detect(self, frame):
-        """Detecta objetos no frame"""
+        """Detecta objetos no frame. Retorna Detections (N, 6) [x1, y1, x2, y2, score, cls]"""
+        # Letterbox + BGR->RGB + /255 direto no buffer já visto pelo tensor de entrada
+        self.preprocessor(frame)
+
         # Inferência
-        results = self.model(frame)
-        
-        # Processar detecções
-        dets = []
-        for *xyxy, conf, cls in results.xyxy[0].cpu().numpy():
-            if conf >= self.conf:
-                x1, y1, x2, y2 = map(int, xyxy)
-                dets.append({
-                    "bbox": [x1, y1, x2, y2],
-                    "score": float(conf),
-                    "cls": int(cls),
-                })
-        
-        return dets
+        with torch.inference_mode():
+            x = self._input if self.device.type == "cpu" else self._input.to(self.device)
+            pred = self.model(x)
+        pred = pred.cpu().numpy()
+
+        # (1, N, 85) [cx, cy, w, h, obj, classes...] no espaço do letterbox
+        try:
+            boxes, scores, cls_ids = decode_yolo_output(pred, self.conf)
+            keep = batched_nms(boxes, scores, cls_ids, self.iou, self.max_det, self.nms_backend)
+            boxes, scores, cls_ids = boxes[keep], scores[keep], cls_ids[keep]
+            self.preprocessor.unmap_boxes(boxes)
+            return Detections.from_arrays(boxes, scores, cls_ids)
+
+        except Exception as e:
+            print(f"⚠️ Erro no pós-processamento YOLOv7: {e}")
+
+        return Detections.empty()
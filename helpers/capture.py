@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+class ThreadedCapture:
+    """
+    Captura de vídeo numa thread dedicada com um buffer circular pequeno.
+
+    A thread decodifica continuamente (cap.read libera o GIL) para `buffer_size`
+    frames pré-alocados e reaproveitados. Em streams ao vivo (`drop_stale`), o
+    read() entrega sempre o frame mais novo e descarta os que ficaram para trás,
+    então a latência não cresce quando detecção + tracking são mais lentos que o
+    stream. Em arquivos locais nenhum frame é descartado: a thread só adianta a
+    decodificação e espera o consumidor.
+
+    O frame devolvido por read() não é sobrescrito até a próxima chamada de
+    read() (pode ser desenhado e passado ao tracker/GMC assíncrono).
+    """
+
+    def __init__(self, source, buffer_size=3, drop_stale=None):
+        """
+        Args:
+            source: URL/arquivo/índice de câmera (para cv2.VideoCapture) ou um objeto
+                com read()/release() compatível com cv2.VideoCapture
+            buffer_size: frames no buffer circular (mínimo 2)
+            drop_stale: descartar frames atrasados e entregar o mais novo;
+                None = só em streams/câmeras (não em arquivos locais)
+
+        Timestamps: em arquivos locais, o tempo do vídeo (CAP_PROP_POS_MSEC); em
+        streams/câmeras, o relógio (time.time) no fim da decodificação do frame.
+        """
+        is_file = isinstance(source, str) and os.path.isfile(source)
+        self.cap = cv2.VideoCapture(source) if isinstance(source, (str, int)) else source
+        self.video_time = is_file
+        self.drop_stale = (not is_file) if drop_stale is None else bool(drop_stale)
+        self.buffer_size = max(2, int(buffer_size))
+
+        self.slots = [None] * self.buffer_size   # frames reaproveitados
+        self.times = [0.0] * self.buffer_size    # timestamp de captura de cada slot
+        self.ready = deque()                     # slots com frame não lido (mais antigo primeiro)
+        self.held = None                         # slot entregue no último read()
+        self.captured = 0
+        self.dropped = 0
+        self.finished = False
+        self.running = True
+        self.cond = threading.Condition()
+
+        self.thread = None
+        if self.isOpened():
+            self.thread = threading.Thread(target=self._run, name="capture", daemon=True)
+            self.thread.start()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, timeout=None):
+        """
+        Próximo frame: o mais novo (drop_stale) ou o mais antigo ainda não lido.
+
+        Args:
+            timeout: segundos máximos de espera por um frame (None = sem limite)
+
+        Returns:
+            (ok, frame, capture_time); ok=False no fim do stream, em erro de
+            leitura ou ao estourar o timeout
+        """
+        with self.cond:
+            # O frame entregue antes é liberado para a thread de captura
+            self.held = None
+            self.cond.notify_all()
+
+            if not self.cond.wait_for(lambda: self.ready or self.finished, timeout):
+                return False, None, None
+            if not self.ready:
+                return False, None, None
+
+            if self.drop_stale:
+                while len(self.ready) > 1:
+                    self.ready.popleft()
+                    self.dropped += 1
+            slot = self.ready.popleft()
+            self.held = slot
+            return True, self.slots[slot], self.times[slot]
+
+    def release(self):
+        """Para a thread de captura e libera o cv2.VideoCapture."""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.cap.release()
+
+    def _free_slot(self):
+        """Slot que não está no buffer nem com o consumidor; None se todos estão ocupados."""
+        for slot in range(self.buffer_size):
+            if slot != self.held and slot not in self.ready:
+                return slot
+        return None
+
+    def _run(self):
+        while True:
+            with self.cond:
+                slot = self._free_slot()
+                if slot is None and self.drop_stale:
+                    # Buffer cheio: o frame não lido mais antigo é descartado
+                    slot = self.ready.popleft()
+                    self.dropped += 1
+                while slot is None and self.running:
+                    # Arquivo: espera o consumidor liberar um slot
+                    self.cond.wait()
+                    slot = self._free_slot()
+                if not self.running:
+                    break
+
+            # Decodifica fora do lock, no slot livre (ninguém mais o acessa)
+            ok, frame = self.cap.read(self.slots[slot])
+            if ok:
+                capture_time = (self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0 if self.video_time
+                                else time.time())
+
+            with self.cond:
+                if not ok:
+                    break
+                self.slots[slot] = frame
+                self.times[slot] = capture_time
+                self.ready.append(slot)
+                self.captured += 1
+                self.cond.notify_all()
+
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
@@ -2,8 +2,10 @@ import cv2
 import yaml
 import numpy as np
 
+from detector.nms import batched_nms
 from detector.yolov7_detector import YOLOv7Detector
 from tracker.bot_sort import BoTSORT
+from helpers.capture import ThreadedCapture
 from helpers.counting import UniqueCounter
 from helpers.drawing import draw_box, draw_hud
 
@@ -28,29 +30,66 @@ def calculate_iou(box1, box2):
     return inter_area / union_area if union_area > 0 else 0
 
 
-def filter_overlapping_detections(dets, iou_threshold=0.5):
+def build_class_filter(cfg, wanted_ids, num_classes=256):
+    """
+    Monta tabelas de lookup por classe para filtrar detecções com máscaras.
+    
+    Returns:
+        (wanted_lut, min_score_lut): bool e float32 indexados por cls_id
+    """
+    conf_person = float(cfg.get("conf_person", cfg["conf_thres"]))
+    conf_vehicle = float(cfg.get("conf_vehicle", max(cfg["conf_thres"], 0.45)))
+    conf_bicycle = float(cfg.get("conf_bicycle", max(cfg["conf_thres"], 0.35)))
+    
+    wanted_lut = np.zeros(num_classes, dtype=bool)
+    wanted_lut[list(wanted_ids)] = True
+    
+    # Threshold por classe
+    min_score_lut = np.zeros(num_classes, dtype=np.float32)
+    min_score_lut[0] = conf_person
+    min_score_lut[1] = conf_bicycle
+    min_score_lut[[2, 3, 5, 7]] = conf_vehicle
+    
+    return wanted_lut, min_score_lut
+
+
+def detections_source(cfg, detector_type):
+    """
+    Descrição (serializável em JSON) do que produz as detecções passadas ao
+    tracker: modelo, thresholds, classes e NMS. Entra na chave do sidecar do
+    GMC, que mascara as detecções ao buscar os pontos.
+    """
+    model_key = {"onnx": "onnx_model", "tflite": "tflite_model"}.get(detector_type, "weights")
+    return {
+        "detector": detector_type,
+        "model": cfg.get(model_key),
+        "onnx_prefer_int8": bool(cfg.get("onnx_prefer_int8", False)) if detector_type == "onnx" else None,
+        "imgsz": cfg.get("imgsz") if detector_type == "yolov7" else None,
+        "conf": [cfg.get(k) for k in ("conf_thres", "conf_person", "conf_vehicle", "conf_bicycle")],
+        "classes": sorted(cfg["classes"].values()),
+        "nms_iou_thres": cfg.get("nms_iou_thres"),
+        "max_det": cfg.get("max_det"),
+    }
+
+
+def filter_detections(detections, wanted_lut, min_score_lut):
+    """Mantém apenas classes desejadas que passam no threshold da sua classe"""
+    cls_ids = detections.class_ids.astype(np.intp)
+    in_range = cls_ids < len(wanted_lut)
+    cls_ids = np.where(in_range, cls_ids, 0)
+    mask = in_range & wanted_lut[cls_ids] & (detections.scores >= min_score_lut[cls_ids])
+    return detections[mask]
+
+
+def filter_overlapping_detections(dets, iou_threshold=0.5, backend="numpy"):
     """Remove detecções muito sobrepostas da mesma classe, mantendo a de maior confiança"""
     if len(dets) <= 1:
         return dets
     
-    # Ordenar por confiança (descendente)
-    dets_sorted = sorted(dets, key=lambda x: x[4], reverse=True)
-    
-    filtered = []
-    for det in dets_sorted:
-        # Verificar se overlap com alguma detecção já aceita da mesma classe
-        keep = True
-        for kept_det in filtered:
-            if det[5] == kept_det[5]:  # mesma classe
-                iou = calculate_iou(det[:4], kept_det[:4])
-                if iou > iou_threshold:
-                    keep = False
-                    break
-        
-        if keep:
-            filtered.append(det)
+    # NMS por classe vetorizado (ordena por confiança, descendente)
+    keep = batched_nms(dets.boxes, dets.scores, dets.class_ids, iou_threshold, top_k=None, backend=backend)
     
-    return filtered
+    return dets[keep]
 
 
 def main():
@@ -60,16 +99,36 @@ def main():
     wanted_classes = cfg["classes"]                  # name -> id
     wanted_ids = set(wanted_classes.values())        # {0,2,3,5,7}
     id_to_name = {v: k for k, v in wanted_classes.items()}
+    
+    # Importante: usar thresholds por classe para reduzir ruído em veículos (evita criar IDs novos toda hora)
+    wanted_lut, min_score_lut = build_class_filter(cfg, wanted_ids)
 
     # ===== detector (seleção automática) =====
     detector_type = cfg.get("detector_type", "yolov7").lower()
+    nms_iou = float(cfg.get("nms_iou_thres", 0.45))
+    max_det = int(cfg.get("max_det", 300))
+    nms_backend = cfg.get("nms_backend", "numpy")
     
     if detector_type == "onnx":
         print("🔧 Usando ONNX Runtime Detector (Raspberry Pi)...")
         from detector.onnx_detector import ONNXDetector
         detector = ONNXDetector(
             model_path=cfg.get("onnx_model", "weights/yolov5nu.onnx"),
-            conf=float(cfg["conf_thres"])
+            conf=float(cfg["conf_thres"]),
+            iou=nms_iou,
+            max_det=max_det,
+            nms_backend=nms_backend,
+            session_options={
+                "intra_op_threads": int(cfg.get("onnx_intra_op_threads", 0)),
+                "inter_op_threads": int(cfg.get("onnx_inter_op_threads", 0)),
+                "execution_mode": cfg.get("onnx_execution_mode", "sequential"),
+                "graph_optimization_level": cfg.get("onnx_graph_optimization_level", "all"),
+                "enable_mem_pattern": bool(cfg.get("onnx_enable_mem_pattern", True)),
+                "allow_spinning": bool(cfg.get("onnx_allow_spinning", True)),
+            },
+            use_iobinding=bool(cfg.get("onnx_use_iobinding", True)),
+            cache_dir=cfg.get("onnx_cache_dir", "weights/.ort_cache"),
+            prefer_int8=bool(cfg.get("onnx_prefer_int8", False)),
         )
     elif detector_type == "tflite":
         print("🔧 Usando TensorFlow Lite Detector (Raspberry Pi)...")
@@ -77,7 +136,12 @@ def main():
         detector = TFLiteDetectorAdvanced(
             model_path=cfg.get("tflite_model", "weights/yolov5n-int8.tflite"),
             conf=float(cfg["conf_thres"]),
-            use_coral=bool(cfg.get("tflite_use_coral", False))
+            use_coral=bool(cfg.get("tflite_use_coral", False)),
+            iou=nms_iou,
+            max_det=max_det,
+            nms_backend=nms_backend,
+            num_threads=cfg.get("tflite_num_threads"),
+            use_xnnpack=bool(cfg.get("tflite_use_xnnpack", True)),
         )
     else:
         print("🔧 Usando YOLOv7 Detector (Desktop)...")
@@ -85,6 +149,14 @@ def main():
             weights=cfg["weights"],
             conf=float(cfg["conf_thres"]),
             device=cfg["device"],
+            img_size=int(cfg.get("imgsz", 640)),
+            iou=nms_iou,
+            max_det=max_det,
+            nms_backend=nms_backend,
+            repo_dir=cfg.get("yolov7_repo") or None,
+            cache_dir=cfg.get("torchscript_cache_dir", "weights/.ts_cache"),
+            num_threads=int(cfg.get("torch_num_threads", 0)),
+            channels_last=bool(cfg.get("torch_channels_last", True)),
         )
 
     # ===== tracker (BoT-SORT) =====
@@ -98,7 +170,26 @@ def main():
         proximity_thresh=float(cfg.get("proximity_thresh", 0.5)),
         appearance_thresh=float(cfg.get("appearance_thresh", 0.25)),
         gmc_method=cfg.get("gmc_method", "sparseOptFlow"),
+        gmc_downscale=int(cfg.get("gmc_downscale", 2)),
+        gmc_max_features=int(cfg.get("gmc_max_features", 1000)),
+        gmc_min_features=cfg.get("gmc_min_features"),
+        gmc_async=bool(cfg.get("gmc_async", False)),
+        gmc_cache_dir=cfg.get("gmc_cache_dir") or None,
+        gmc_video=cfg["stream_url"],
+        gmc_detections_source=detections_source(cfg, detector_type),
+        gmc_ecc_levels=int(cfg.get("gmc_ecc_levels", 3)),
+        gmc_ecc_iterations=int(cfg.get("gmc_ecc_iterations", 50)),
+        gmc_ecc_budget_ms=float(cfg.get("gmc_ecc_budget_ms", 0)) or None,
+        gmc_static_bypass=bool(cfg.get("gmc_static_bypass", False)),
+        gmc_static_check_interval=int(cfg.get("gmc_static_check_interval", 30)),
         mot20=bool(cfg.get("mot20", False)),
+        removed_buffer=int(cfg.get("removed_track_buffer", 1000)),
+        archive_path=cfg.get("track_archive") or None,
+        tiered_association=bool(cfg.get("tiered_association", False)),
+        long_lost_after=int(cfg.get("long_lost_after", 30)),
+        sparse_association=bool(cfg.get("sparse_association", False)),
+        class_aware=bool(cfg.get("class_aware", False)),
+        class_workers=int(cfg.get("class_workers", 0)),
     )
 
     # ===== counter =====
@@ -107,7 +198,14 @@ def main():
     # Dicionário para armazenar confiança original de cada track
     track_confidences = {}
 
-    cap = cv2.VideoCapture(cfg["stream_url"])
+    # Captura numa thread com buffer circular; em streams entrega sempre o frame
+    # mais novo (descarta os atrasados) junto com o instante de captura
+    drop_stale = cfg.get("capture_drop_stale", "auto")
+    cap = ThreadedCapture(
+        cfg["stream_url"],
+        buffer_size=int(cfg.get("capture_buffer", 3)),
+        drop_stale=None if drop_stale in (None, "auto") else bool(drop_stale),
+    )
     if not cap.isOpened():
         raise RuntimeError("Não consegui abrir o stream.")
 
@@ -124,10 +222,12 @@ def main():
     current_fps = 0.0
     frame_start_time = time.time()
     
+    stream_finished = False
     while True:
-        ok, frame = cap.read()
+        ok, frame, capture_time = cap.read()
         if not ok:
             print("Fim do stream ou erro na leitura.")
+            stream_finished = True
             break
 
         frame_count += 1
@@ -138,6 +238,9 @@ def main():
         frame_time = frame_end_time - frame_start_time
         current_fps = 1.0 / frame_time if frame_time > 0 else 0.0
         frame_start_time = frame_end_time
+
+        # GMC do frame em paralelo com o detector (com gmc_async)
+        tracker.prefetch_gmc(frame)
         
         # Detecção
         detections = detector.detect(frame)
@@ -145,42 +248,17 @@ def main():
         # DEBUG: Log de todas as detecções antes de filtrar
         if frame_count <= 3:  # Mostrar apenas nos primeiros 3 frames
             print(f"\n[Frame {frame_count}] Detecções brutas do detector: {len(detections)}")
-            for d in detections:
-                print(f"  cls={d['cls']}, score={d['score']:.2f}, bbox={d['bbox']}")
-
-        # Filtrar apenas classes desejadas e formatar: [x1, y1, x2, y2, score, cls_id]
-        # Importante: usar thresholds por classe para reduzir ruído em veículos (evita criar IDs novos toda hora)
-        conf_person = float(cfg.get("conf_person", cfg["conf_thres"]))
-        conf_vehicle = float(cfg.get("conf_vehicle", max(cfg["conf_thres"], 0.45)))
-        conf_bicycle = float(cfg.get("conf_bicycle", max(cfg["conf_thres"], 0.35)))
-
-        dets = []
-        det_scores = []  # Salvar scores originais
-        for d in detections:
-            cls_id = int(d["cls"])
-            if cls_id not in wanted_ids:
-                continue
-            x1, y1, x2, y2 = d["bbox"]
-            score = float(d["score"])
-
-            # Threshold por classe
-            if cls_id == 0 and score < conf_person:
-                continue
-            if cls_id == 1 and score < conf_bicycle:
-                continue
-            if cls_id in (2, 3, 5, 7) and score < conf_vehicle:
-                continue
-
-            dets.append([x1, y1, x2, y2, score, cls_id])
-            det_scores.append(score)
+            for x1, y1, x2, y2, score, cls_id in detections.data.tolist():
+                print(f"  cls={int(cls_id)}, score={score:.2f}, bbox={[int(x1), int(y1), int(x2), int(y2)]}")
+
+        # Filtrar apenas classes desejadas (máscaras sobre o array [x1, y1, x2, y2, score, cls_id])
+        dets = filter_detections(detections, wanted_lut, min_score_lut)
         
         # Filtrar detecções sobrepostas da mesma classe (reduzir duplicatas)
-        dets = filter_overlapping_detections(dets, iou_threshold=0.5)
-
-        dets_np = np.asarray(dets, dtype=np.float32) if dets else np.empty((0, 6), dtype=np.float32)
+        dets = filter_overlapping_detections(dets, iou_threshold=0.5, backend=nms_backend)
 
-        # Tracking (passar frame_end_time para cálculo de dt)
-        tracks = tracker.update(dets_np, frame, frame_time=frame_end_time)
+        # Tracking (instante de captura do frame para o cálculo de dt)
+        tracks = tracker.update(dets.data, frame, frame_time=capture_time)
 
         # Processar tracks
         for t in tracks:
@@ -195,7 +273,7 @@ def main():
                 # Encontrar detecção mais próxima deste track
                 best_iou = 0
                 best_score = 0.65
-                for det in dets:
+                for det in dets.data:
                     det_bbox = det[:4]
                     iou = calculate_iou(tlbr, det_bbox)
                     if iou > best_iou and det[5] == cls_id:  # mesma classe
@@ -256,14 +334,18 @@ def main():
 
         # Log periódico
         if frame_count % 30 == 0:
-            print(f"Frame {frame_count} | Tracks: {len(tracks)} | Total: {counter.weighted_total():.1f}")
+            print(f"Frame {frame_count} | Tracks: {len(tracks)} | Total: {counter.weighted_total():.1f}"
+                  f" | Descartados: {cap.dropped}")
 
     cap.release()
+    # Sidecar do GMC só fica completo se o vídeo foi até o fim (não com ESC)
+    tracker.close(stream_finished=stream_finished)
     if cfg.get("show_window", True):
         cv2.destroyAllWindows()
     
     print("\n=== RESUMO FINAL ===")
     print(f"Total de frames processados: {frame_count}")
+    print(f"Frames capturados: {cap.captured} | descartados (atrasados): {cap.dropped}")
     print(f"Total ponderado final: {counter.weighted_total():.1f}")
     print("\nContagem por classe:")
     for k in sorted(counter.raw_counts.keys()):
@@ -0,0 +1,165 @@
+"""
+Exporta um modelo YOLO "end-to-end" para o ONNX Runtime.
+
+O pós-processamento vai para dentro do grafo: filtro de confiança, NMS por
+classe (NonMaxSuppression) e top-k. session.run passa a devolver no máximo
+K detecções finais (K, 6) [x1, y1, x2, y2, score, cls] no espaço de entrada
+do modelo, e o ONNXDetector pula a decodificação/NMS em Python ao
+reconhecer essa saída.
+
+Substitui o antigo converter.py.
+
+Uso (a partir da raiz do projeto):
+    # a partir de um .onnx cru (saída (1, 84, N) ou (1, N, 85))
+    python -m tools.export --onnx weights/yolov5nu.onnx
+    # a partir dos pesos .pt (requer: pip install ultralytics)
+    python -m tools.export --weights weights/yolov5nu.pt
+"""
+
+import argparse
+import os
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+
+from detector.decode import detect_layout
+
+OUTPUT_NAME = "detections"
+MIN_OPSET = 12
+
+
+def end_to_end_model_path(model_path):
+    """weights/x.onnx -> weights/x-e2e.onnx."""
+    stem, ext = os.path.splitext(model_path)
+    return f"{stem}-e2e{ext}"
+
+
+def export_raw_onnx(weights, imgsz, opset):
+    """Exporta os pesos .pt para ONNX cru com o ultralytics (importado só aqui)."""
+    try:
+        from ultralytics import YOLO
+    except ImportError:
+        raise SystemExit("❌ ultralytics não instalado: pip install ultralytics (ou use --onnx)")
+    return YOLO(weights).export(format="onnx", imgsz=imgsz, opset=opset)
+
+
+def add_nms_head(model, conf=0.25, iou=0.45, max_det=300, num_classes=80):
+    """
+    Acrescenta filtro de confiança + NMS por classe + top-k à saída crua do modelo.
+
+    Args:
+        model: onnx.ModelProto com uma saída YOLO (1, 4 + nc, N) ou (1, N, 5 + nc)
+        conf: Score mínimo (score_threshold do NonMaxSuppression)
+        iou: IoU threshold do NMS
+        max_det: K máximo de detecções por imagem
+        num_classes: Número de classes do modelo
+
+    Returns:
+        O próprio model, com uma única saída "detections" (K, 6)
+    """
+    opset = next(o.version for o in model.opset_import if o.domain in ("", "ai.onnx"))
+    if opset < MIN_OPSET:
+        raise ValueError(f"opset {opset} < {MIN_OPSET}: exporte o modelo com opset >= {MIN_OPSET}")
+
+    graph = model.graph
+    raw = graph.output[0]
+    dims = [d.dim_value for d in raw.type.tensor_type.shape.dim]
+    channels_first, has_objectness = detect_layout(np.empty(dims[-2:], dtype=np.uint8), num_classes)
+
+    nodes = []
+    init = []
+
+    def const(name, value, dtype=np.int64):
+        init.append(numpy_helper.from_array(np.asarray(value, dtype=dtype), f"e2e_{name}"))
+        return f"e2e_{name}"
+
+    def node(op, inputs, name, **attrs):
+        out = f"e2e_{name}"
+        nodes.append(helper.make_node(op, inputs, [out], name=out, **attrs))
+        return out
+
+    # Tudo como (1, N, C): boxes cxcywh (1, N, 4) e scores (1, N, nc)
+    pred = raw.name
+    if channels_first:
+        pred = node("Transpose", [pred], "pred_nc", perm=[0, 2, 1])
+    cxcywh = node("Slice", [pred, const("s0", [0]), const("s4", [4]), const("ax2", [2])], "cxcywh")
+    cls_start = 5 if has_objectness else 4
+    scores = node("Slice", [pred, const("sc", [cls_start]), const("se", [np.iinfo(np.int64).max]),
+                            const("ax2b", [2])], "cls_scores")
+    if has_objectness:
+        obj = node("Slice", [pred, const("so", [4]), const("so1", [5]), const("ax2c", [2])], "obj")
+        scores = node("Mul", [scores, obj], "scores_obj")
+
+    # Manter só a classe de maior score de cada box (mesmo critério do argmax em Python)
+    best = node("TopK", [scores, const("k1", [1])], "best", axis=2)
+    nodes[-1].output.append("e2e_best_idx")
+    is_best = node("Cast", [node("Equal", [scores, best], "is_best_b")], "is_best", to=TensorProto.FLOAT)
+    scores = node("Mul", [scores, is_best], "scores_best")
+
+    # NonMaxSuppression espera scores (1, nc, N) e boxes (1, N, 4) em xyxy
+    scores_cn = node("Transpose", [scores], "scores_cn", perm=[0, 2, 1])
+    to_xyxy = const("to_xyxy", [[1, 0, 1, 0], [0, 1, 0, 1], [-0.5, 0, 0.5, 0], [0, -0.5, 0, 0.5]],
+                    np.float32)
+    boxes = node("MatMul", [cxcywh, to_xyxy], "boxes")
+    selected = node("NonMaxSuppression", [boxes, scores_cn, const("max_det", [max_det]),
+                                          const("iou", [iou], np.float32),
+                                          const("conf", [conf], np.float32)], "selected")
+
+    # selected: (M, 3) [batch, classe, box]
+    sel_cls = node("Gather", [selected, const("i1", 1)], "sel_cls", axis=1)
+    sel_box = node("Gather", [selected, const("i2", 2)], "sel_box", axis=1)
+    sel_scores = node("GatherND", [scores_cn, selected], "sel_scores")
+
+    # Top-k global (o NMS limita K por classe)
+    num_sel = node("Shape", [sel_scores], "num_sel")
+    k = node("Min", [num_sel, const("max_det_k", [max_det])], "k")
+    top_scores = node("TopK", [sel_scores, k], "top_scores", axis=0)
+    nodes[-1].output.append("e2e_top_idx")
+    top_box = node("Gather", [sel_box, "e2e_top_idx"], "top_box", axis=0)
+    top_cls = node("Gather", [sel_cls, "e2e_top_idx"], "top_cls", axis=0)
+
+    boxes_n4 = node("Reshape", [boxes, const("shape_n4", [-1, 4])], "boxes_n4")
+    det_boxes = node("Gather", [boxes_n4, top_box], "det_boxes", axis=0)
+    col = const("shape_col", [-1, 1])
+    det_scores = node("Reshape", [top_scores, col], "det_scores")
+    det_cls = node("Reshape", [node("Cast", [top_cls], "top_cls_f", to=TensorProto.FLOAT), col], "det_cls")
+    nodes.append(helper.make_node("Concat", [det_boxes, det_scores, det_cls], [OUTPUT_NAME],
+                                  name="e2e_concat", axis=1))
+
+    graph.node.extend(nodes)
+    graph.initializer.extend(init)
+    del graph.output[:]
+    graph.output.append(helper.make_tensor_value_info(OUTPUT_NAME, TensorProto.FLOAT, ["num_det", 6]))
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta modelo YOLO ONNX end-to-end (NMS no grafo)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--onnx", help="Modelo ONNX cru (saída YOLO sem NMS)")
+    source.add_argument("--weights", help="Pesos .pt do ultralytics (exporta o ONNX cru antes)")
+    parser.add_argument("--output", default=None, help="Modelo gerado (padrão: <modelo>-e2e.onnx)")
+    parser.add_argument("--imgsz", type=int, default=640, help="Tamanho de entrada (só com --weights)")
+    parser.add_argument("--opset", type=int, default=17, help="Opset do export (só com --weights)")
+    parser.add_argument("--conf", type=float, default=0.20, help="Score mínimo dentro do grafo")
+    parser.add_argument("--iou", type=float, default=0.45, help="IoU threshold do NMS")
+    parser.add_argument("--max-det", type=int, default=300, help="Top-k de detecções por imagem")
+    parser.add_argument("--num-classes", type=int, default=80, help="Número de classes do modelo")
+    args = parser.parse_args()
+
+    raw_path = args.onnx or export_raw_onnx(args.weights, args.imgsz, args.opset)
+    output_path = args.output or end_to_end_model_path(raw_path)
+
+    model = onnx.load(raw_path)
+    add_nms_head(model, args.conf, args.iou, args.max_det, args.num_classes)
+    onnx.checker.check_model(model)
+    onnx.save(model, output_path)
+
+    print(f"✅ Modelo end-to-end salvo em: {output_path}")
+    print(f"   Saída: {OUTPUT_NAME} (K <= {args.max_det}, 6) [x1, y1, x2, y2, score, cls]")
+    print("   Use em config.yaml: onnx_model: \"" + output_path + "\"")
+
+
+if __name__ == "__main__":
+    main()
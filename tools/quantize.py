@@ -0,0 +1,249 @@
+"""
+Quantização estática INT8 (QDQ) do modelo ONNX usando o ONNX Runtime.
+
+Usa as imagens de calibration_image_sample_data_20x128x128x3_float32.npy
+(lidas via memory-map) para calibrar as ativações e valida o resultado
+contra o modelo FP32 em uma parte separada da amostra (held-out):
+mAP@0.5 e recall tomando as detecções FP32 como referência, e speedup
+de latência.
+
+O modelo gerado segue a convenção <modelo>-int8.onnx, que o ONNXDetector
+carrega automaticamente com onnx_prefer_int8: true.
+
+Uso (a partir da raiz do projeto):
+    python -m tools.quantize --model weights/yolov5nu.onnx
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat,
+                                      QuantType, quant_pre_process, quantize_static)
+
+from detector.decode import decode_yolo_output
+from detector.nms import batched_nms
+from detector.onnx_detector import quantized_model_path
+from detector.preprocess import LetterboxPreprocessor
+
+
+# Operadores do "head" de decodificação (concat de boxes + scores, sigmoid,
+# DFL, grid...). Quantizar a saída concatenada destrói os scores, pois eles
+# dividem a mesma escala INT8 que as coordenadas em pixels.
+HEAD_OPS = {"Concat", "Sigmoid", "Softmax", "Mul", "Add", "Sub", "Div", "Reshape",
+            "Transpose", "Split", "Slice", "Gather", "Unsqueeze", "Squeeze"}
+
+
+def output_head_nodes(model_path):
+    """Nomes dos nós do head: caminhando das saídas para trás só por HEAD_OPS."""
+    graph = onnx.load(model_path, load_external_data=False).graph
+    producer = {out: node for node in graph.node for out in node.output}
+    pending = [o.name for o in graph.output]
+    head = set()
+    while pending:
+        node = producer.get(pending.pop())
+        if node is None or node.name in head or node.op_type not in HEAD_OPS:
+            continue
+        head.add(node.name)
+        pending.extend(node.input)
+    return sorted(head)
+
+
+def to_bgr_uint8(image):
+    """Amostra de calibração (RGB float32 em [0, 1]) -> frame BGR uint8 como o da câmera."""
+    return np.ascontiguousarray((image[..., ::-1] * 255.0).round().astype(np.uint8))
+
+
+class NpyCalibrationDataReader(CalibrationDataReader):
+    """
+    Alimenta a calibração com as imagens do .npy lidas via memory-map:
+    só a imagem atual é materializada, pré-processada com o mesmo letterbox
+    usado em produção.
+    """
+
+    def __init__(self, npy_path, input_name, width, height, indices):
+        self.images = np.load(npy_path, mmap_mode="r")
+        self.input_name = input_name
+        self.preprocessor = LetterboxPreprocessor(width, height, layout="nchw")
+        self.indices = list(indices)
+        self._pos = 0
+
+    def get_next(self):
+        if self._pos >= len(self.indices):
+            return None
+        image = self.images[self.indices[self._pos]]
+        self._pos += 1
+        tensor = self.preprocessor(to_bgr_uint8(image))
+        return {self.input_name: tensor.copy()}
+
+    def rewind(self):
+        self._pos = 0
+
+
+def box_iou(a, b):
+    """IoU (len(a), len(b)) entre boxes [x1, y1, x2, y2]."""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def average_precision(recall, precision):
+    """AP (todos os pontos, estilo VOC) a partir da curva precisão x recall."""
+    mrec = np.concatenate([[0.0], recall, [1.0]])
+    mpre = np.concatenate([[1.0], precision, [0.0]])
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    steps = np.where(mrec[1:] != mrec[:-1])[0]
+    return float(np.sum((mrec[steps + 1] - mrec[steps]) * mpre[steps + 1]))
+
+
+def compare_to_reference(reference, candidate, iou_thres=0.5):
+    """
+    mAP@iou_thres e recall das detecções `candidate` tomando `reference` como
+    ground truth. Cada item é uma lista (por imagem) de arrays (N, 6)
+    [x1, y1, x2, y2, score, cls].
+    """
+    classes = np.unique(np.concatenate([r[:, 5] for r in reference] + [np.empty(0)]))
+    aps, total_tp, total_gt = [], 0, 0
+
+    for cls in classes:
+        scores, tps, num_gt = [], [], 0
+        for ref, cand in zip(reference, candidate):
+            gt = ref[ref[:, 5] == cls]
+            pred = cand[cand[:, 5] == cls]
+            pred = pred[np.argsort(-pred[:, 4], kind="stable")]
+            num_gt += len(gt)
+            matched = np.zeros(len(gt), dtype=bool)
+            ious = box_iou(pred[:, :4], gt[:, :4]) if len(gt) else np.zeros((len(pred), 0))
+            for i in range(len(pred)):
+                scores.append(pred[i, 4])
+                if ious.shape[1]:
+                    j = int(np.argmax(np.where(matched, -1.0, ious[i])))
+                    if not matched[j] and ious[i, j] >= iou_thres:
+                        matched[j] = True
+                        tps.append(1)
+                        continue
+                tps.append(0)
+        if num_gt == 0:
+            continue
+
+        order = np.argsort(-np.asarray(scores), kind="stable")
+        tp = np.cumsum(np.asarray(tps, dtype=np.float64)[order])
+        fp = np.cumsum(1.0 - np.asarray(tps, dtype=np.float64)[order])
+        recall = tp / num_gt
+        precision = tp / np.maximum(tp + fp, 1e-9)
+        aps.append(average_precision(recall, precision))
+        total_tp += int(tp[-1]) if len(tp) else 0
+        total_gt += num_gt
+
+    if total_gt == 0:
+        return None, None
+    return float(np.mean(aps)), total_tp / total_gt
+
+
+def run_detections(session, reader, conf, iou):
+    """Roda o modelo nas imagens do reader e retorna as detecções (N, 6) por imagem."""
+    results = []
+    reader.rewind()
+    while True:
+        feed = reader.get_next()
+        if feed is None:
+            break
+        output = session.run(None, feed)[0]
+        boxes, scores, cls_ids = decode_yolo_output(output, conf)
+        keep = batched_nms(boxes, scores, cls_ids, iou, top_k=300)
+        dets = np.concatenate([boxes[keep], scores[keep, None], cls_ids[keep, None]], axis=1)
+        results.append(dets.astype(np.float32))
+    return results
+
+
+def latency_ms(session, feed, repeat):
+    session.run(None, feed)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        session.run(None, feed)
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantização estática INT8 (QDQ) do modelo ONNX")
+    parser.add_argument("--model", default="weights/yolov5nu.onnx", help="Modelo ONNX FP32")
+    parser.add_argument("--output", default=None, help="Modelo INT8 (padrão: <modelo>-int8.onnx)")
+    parser.add_argument("--calib", default="calibration_image_sample_data_20x128x128x3_float32.npy",
+                        help="Amostras de calibração (N, H, W, 3) float32 RGB em [0, 1]")
+    parser.add_argument("--holdout", type=int, default=4, help="Imagens reservadas para validação")
+    parser.add_argument("--conf", type=float, default=0.25, help="Confidence threshold da validação")
+    parser.add_argument("--iou", type=float, default=0.45, help="IoU threshold do NMS da validação")
+    parser.add_argument("--per-channel", action="store_true", help="Quantizar pesos por canal")
+    parser.add_argument("--quantize-head", action="store_true",
+                        help="Quantizar também o head de decodificação (perde precisão nos scores)")
+    parser.add_argument("--repeat", type=int, default=20, help="Execuções para medir latência")
+    args = parser.parse_args()
+
+    output_path = args.output or quantized_model_path(args.model)
+    num_images = len(np.load(args.calib, mmap_mode="r"))
+    holdout = min(max(args.holdout, 0), num_images - 1)
+    calib_idx = range(num_images - holdout)
+    eval_idx = range(num_images - holdout, num_images)
+
+    fp32 = ort.InferenceSession(args.model, providers=["CPUExecutionProvider"])
+    model_input = fp32.get_inputs()[0]
+    height, width = model_input.shape[2], model_input.shape[3]
+    if not isinstance(height, int) or not isinstance(width, int):
+        height = width = 640
+
+    print("=" * 60)
+    print(f"Quantizando {args.model} -> {output_path}")
+    print(f"Calibração: {len(calib_idx)} imagens | validação: {len(eval_idx)} imagens")
+    print("=" * 60)
+
+    # Pré-processamento recomendado (shape inference + otimizações) antes de quantizar
+    prepared_path = f"{os.path.splitext(output_path)[0]}-prep.onnx"
+    quant_pre_process(args.model, prepared_path, skip_symbolic_shape=True)
+    excluded = [] if args.quantize_head else output_head_nodes(prepared_path)
+    print(f"Nós do head mantidos em FP32: {len(excluded)}")
+
+    reader = NpyCalibrationDataReader(args.calib, model_input.name, width, height, calib_idx)
+    try:
+        quantize_static(
+            prepared_path,
+            output_path,
+            reader,
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=args.per_channel,
+            calibrate_method=CalibrationMethod.MinMax,
+            nodes_to_exclude=excluded,
+        )
+    finally:
+        os.remove(prepared_path)
+    print(f"✅ Modelo INT8 salvo em: {output_path}")
+
+    # Validação contra o FP32 nas imagens reservadas
+    int8 = ort.InferenceSession(output_path, providers=["CPUExecutionProvider"])
+    if len(eval_idx):
+        eval_reader = NpyCalibrationDataReader(args.calib, model_input.name, width, height, eval_idx)
+        ref = run_detections(fp32, eval_reader, args.conf, args.iou)
+        cand = run_detections(int8, eval_reader, args.conf, args.iou)
+        map50, recall = compare_to_reference(ref, cand)
+        if map50 is None:
+            print("⚠️ O modelo FP32 não detectou nada nas imagens de validação")
+        else:
+            print(f"mAP@0.5 vs FP32: {map50:.3f} | recall vs FP32: {recall:.3f}")
+
+    eval_reader = NpyCalibrationDataReader(args.calib, model_input.name, width, height, [0])
+    feed = eval_reader.get_next()
+    t_fp32 = latency_ms(fp32, feed, args.repeat)
+    t_int8 = latency_ms(int8, feed, args.repeat)
+    print(f"Latência FP32: {t_fp32:.1f} ms | INT8: {t_int8:.1f} ms | speedup: {t_fp32 / t_int8:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
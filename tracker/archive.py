@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+
+
+# Fixed-size record of a finished track, as written to the archive log
+ARCHIVE_DTYPE = np.dtype([
+    ('track_id', np.int64),
+    ('cls_id', np.int32),
+    ('start_frame', np.int64),
+    ('end_frame', np.int64),
+    ('tlbr', np.float32, (4,)),
+    ('score', np.float32),
+])
+
+
+class TrackArchiver(object):
+    """
+    Append-only on-disk log of finished tracks.
+
+    Removed tracks are buffered in memory and written in batches as
+    fixed-size binary records (`ARCHIVE_DTYPE`), so the tracker can keep
+    only a bounded window of removed tracks while the full history stays
+    available on disk. Read it back with `read_archive`.
+
+    Parameters
+    ----------
+    path : str
+        Log file. Records are appended to it if it already exists.
+    batch_size : int
+        Number of buffered records that triggers a write.
+    """
+
+    def __init__(self, path, batch_size=256):
+        self.path = path
+        self.batch_size = max(1, int(batch_size))
+        self._pending = []
+        self.written = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def add(self, track):
+        """Buffer one finished track; writes a batch when the buffer is full."""
+        self._pending.append((track.track_id, track.cls_id, track.start_frame, track.end_frame,
+                              track.tlbr, track.score))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write every buffered record to disk."""
+        if not self._pending:
+            return
+        records = np.array(self._pending, dtype=ARCHIVE_DTYPE)
+        with open(self.path, 'ab') as f:
+            records.tofile(f)
+        self.written += len(records)
+        self._pending = []
+
+    def close(self):
+        self.flush()
+
+
+def read_archive(path, mmap=True):
+    """
+    Load an archive written by `TrackArchiver` as a structured array.
+
+    Parameters
+    ----------
+    path : str
+        Log file.
+    mmap : bool
+        Memory-map the file instead of reading it into memory.
+    """
+    if mmap:
+        if os.path.getsize(path) == 0:
+            return np.empty(0, dtype=ARCHIVE_DTYPE)
+        return np.memmap(path, dtype=ARCHIVE_DTYPE, mode='r')
+    return np.fromfile(path, dtype=ARCHIVE_DTYPE)
@@ -1,5 +1,4 @@
 import numpy as np
-from collections import OrderedDict
 
 
 class TrackState(object):
@@ -11,22 +10,24 @@ class TrackState(object):
 
 
 class BaseTrack(object):
-    _count = 0
-
-    track_id = 0
-    is_activated = False
-    state = TrackState.New
+    # Atributos por instância em __slots__ (sem __dict__); os valores iniciais ficam
+    # no __init__ em vez de atributos de classe (uma lista/dict de classe seria
+    # compartilhada entre todos os tracks)
+    __slots__ = ('track_id', 'is_activated', 'state', 'score', 'start_frame', 'frame_id')
 
-    history = OrderedDict()
-    features = []
-    curr_feature = None
-    score = 0
-    start_frame = 0
-    frame_id = 0
-    time_since_update = 0
+    _count = 0
 
     # multi-camera
     location = (np.inf, np.inf)
+    time_since_update = 0
+
+    def __init__(self):
+        self.track_id = 0
+        self.is_activated = False
+        self.state = TrackState.New
+        self.score = 0
+        self.start_frame = 0
+        self.frame_id = 0
 
     @property
     def end_frame(self):
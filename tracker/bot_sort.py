@@ -2,11 +2,15 @@ import cv2
 import matplotlib.pyplot as plt
 import numpy as np
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from tracker import matching
+from tracker.archive import TrackArchiver
 from tracker.gmc import GMC
 from tracker.basetrack import BaseTrack, TrackState
+from tracker.detection_set import DetectionSet
 from tracker.kalman_filter import KalmanFilter
+from tracker.track_bank import TrackBank
 
 try:
     from fast_reid.fast_reid_interfece import FastReIDInterface
@@ -15,10 +19,60 @@ except ImportError:
 
 
 
+class _BankField(object):
+    """
+    Track attribute that lives in the track's TrackBank slot while the track
+    owns one, and in a plain instance attribute otherwise (detections that
+    were never activated, released tracks).
+    """
+
+    def __init__(self, name, default=None):
+        self.name = name
+        self.local = '_' + name
+        self.default = default
+
+    def __get__(self, track, owner=None):
+        if track is None:
+            return self
+        if track.slot is None:
+            return getattr(track, self.local, self.default)
+        value = getattr(track.bank, self.name)[track.slot]
+        return value if value.ndim else value.item()
+
+    def __set__(self, track, value):
+        if track.slot is None:
+            setattr(track, self.local, value)
+        else:
+            getattr(track.bank, self.name)[track.slot] = value
+
+
 class STrack(BaseTrack):
     shared_kalman = KalmanFilter()
+    shared_bank = TrackBank()
+
+    # Estado guardado no TrackBank (structure-of-arrays) enquanto o track tem slot
+    mean = _BankField('mean')
+    covariance = _BankField('covariance')
+    score = _BankField('score', 0)
+    cls_id = _BankField('cls_id', -1)
+    frame_id = _BankField('frame_id', 0)
+    state = _BankField('state', TrackState.New)
+    pending_dt = _BankField('pending_dt', 0.0)
+    pending_steps = _BankField('pending_steps', 0)
+
+    # Sem __dict__: bank/slot, os atributos locais dos campos do banco (_mean, _score...,
+    # usados enquanto o track não tem slot) e o restante do estado por track
+    __slots__ = ('bank', 'slot', '_tlwh', 'kalman_filter', 'tracklet_len', 'initial_cls_id',
+                 'smooth_feat', 'curr_feat', 'features', 'feat_history', 'last_update_time') + \
+        tuple('_' + name for name in TrackBank.FIELDS)
+
+    alpha = 0.9
 
     def __init__(self, tlwh, score, feat=None, feat_history=50, cls_id=-1):
+        # Handle para o TrackBank: só recebe um slot ao ser ativado
+        self.bank = None
+        self.slot = None
+        super(STrack, self).__init__()
 
         # wait activate
         self._tlwh = np.asarray(tlwh, dtype=np.float64)
@@ -33,11 +87,12 @@ class STrack(BaseTrack):
 
         self.smooth_feat = None
         self.curr_feat = None
+        # Histórico de features criado só quando chega a primeira (tracks sem ReID não alocam)
+        self.features = None
+        self.feat_history = feat_history
         if feat is not None:
             self.update_features(feat)
-        self.features = deque([], maxlen=feat_history)
-        self.alpha = 0.9
-        
+
         # Rastreamento de tempo para Kalman dinâmico
         self.last_update_time = 0.0  # timestamp da última atualização
 
@@ -48,6 +103,8 @@ class STrack(BaseTrack):
             self.smooth_feat = feat
         else:
             self.smooth_feat = self.alpha * self.smooth_feat + (1 - self.alpha) * feat
+        if self.features is None:
+            self.features = deque([], maxlen=self.feat_history)
         self.features.append(feat)
         self.smooth_feat /= np.linalg.norm(self.smooth_feat)
 
@@ -60,41 +117,116 @@ class STrack(BaseTrack):
         self.mean, self.covariance = self.kalman_filter.predict(mean_state, self.covariance, dt=dt)
 
     @staticmethod
-    def multi_predict(stracks, dt=1.0):
-        if len(stracks) > 0:
-            multi_mean = np.asarray([st.mean.copy() for st in stracks])
-            multi_covariance = np.asarray([st.covariance for st in stracks])
-            for i, st in enumerate(stracks):
-                if st.state != TrackState.Tracked:
-                    multi_mean[i][6] = 0
-                    multi_mean[i][7] = 0
-            multi_mean, multi_covariance = STrack.shared_kalman.multi_predict(multi_mean, multi_covariance, dt=dt)
-            for i, (mean, cov) in enumerate(zip(multi_mean, multi_covariance)):
-                stracks[i].mean = mean
-                stracks[i].covariance = cov
+    def slots(stracks):
+        """Índices no TrackBank de uma lista de tracks ativados."""
+        return np.fromiter((st.slot for st in stracks), dtype=np.intp, count=len(stracks))
 
     @staticmethod
-    def multi_gmc(stracks, H=np.eye(2, 3)):
+    def multi_predict(stracks, dt=1.0):
         if len(stracks) > 0:
-            multi_mean = np.asarray([st.mean.copy() for st in stracks])
-            multi_covariance = np.asarray([st.covariance for st in stracks])
+            bank = stracks[0].bank
+            slots = STrack.slots(stracks)
+            multi_mean = bank.mean[slots]
+            multi_mean[bank.state[slots] != TrackState.Tracked, 6:8] = 0
+            multi_mean, multi_covariance = STrack.shared_kalman.multi_predict(
+                multi_mean, bank.covariance[slots], dt=dt)
+            bank.mean[slots] = multi_mean
+            bank.covariance[slots] = multi_covariance
 
-            R = H[:2, :2]
-            R8x8 = np.kron(np.eye(4, dtype=float), R)
-            t = H[:2, 2]
+    @staticmethod
+    def warp_states(multi_mean, multi_covariance, H):
+        """
+        Aplica a transformação afim da câmera H (2x3) a estados de Kalman Nx8 / Nx8x8.
 
-            for i, (mean, cov) in enumerate(zip(multi_mean, multi_covariance)):
-                mean = R8x8.dot(mean)
-                mean[:2] += t
-                cov = R8x8.dot(cov).dot(R8x8.transpose())
+        A matriz equivalente kron(I4, R) é bloco-diagonal: o estado é formado
+        por 4 pares (x, y), (w, h), (vx, vy), (vw, vh) e a covariância por 4x4
+        blocos 2x2, então basta combinar cada par/bloco com os 4 coeficientes
+        de R (aritmética elemento a elemento), sem produtos 8x8.
+        """
+        (r00, r01), (r10, r11) = H[:2, :2]
+        t = H[:2, 2]
+        n = len(multi_mean)
+
+        # Pares (x, y) do estado: p' = R p
+        pairs = multi_mean.reshape(n, 4, 2)
+        multi_mean = np.empty_like(pairs)
+        multi_mean[..., 0] = r00 * pairs[..., 0] + r01 * pairs[..., 1]
+        multi_mean[..., 1] = r10 * pairs[..., 0] + r11 * pairs[..., 1]
+        multi_mean = multi_mean.reshape(n, 8)
+        multi_mean[:, :2] += t
+
+        # Covariância: R à esquerda nos pares de linhas, R^T à direita nos pares de colunas
+        rows = multi_covariance.reshape(n, 4, 2, 8)
+        left = np.empty_like(rows)
+        left[:, :, 0] = r00 * rows[:, :, 0] + r01 * rows[:, :, 1]
+        left[:, :, 1] = r10 * rows[:, :, 0] + r11 * rows[:, :, 1]
+        cols = left.reshape(n, 8, 4, 2)
+        multi_covariance = np.empty_like(cols)
+        multi_covariance[..., 0] = r00 * cols[..., 0] + r01 * cols[..., 1]
+        multi_covariance[..., 1] = r10 * cols[..., 0] + r11 * cols[..., 1]
+        return multi_mean, multi_covariance.reshape(n, 8, 8)
 
-                stracks[i].mean = mean
-                stracks[i].covariance = cov
+    @staticmethod
+    def multi_gmc(stracks, H=np.eye(2, 3)):
+        if len(stracks) == 0:
+            return
+        # GMC sem movimento (câmera parada, método 'none' ou falha): nada a fazer
+        if np.array_equal(H, np.eye(2, 3)):
+            return
+
+        bank = stracks[0].bank
+        slots = STrack.slots(stracks)
+        if np.array_equal(H[:2, :2], np.eye(2)):
+            # Só translação: a covariância não muda
+            bank.mean[slots, :2] += H[:2, 2]
+            return
+        bank.mean[slots], bank.covariance[slots] = STrack.warp_states(
+            bank.mean[slots], bank.covariance[slots], H)
 
-    def activate(self, kalman_filter, frame_id):
+    @staticmethod
+    def multi_update(stracks, detections, frame_id):
+        """
+        Atualiza pares (track, linha de `detections`, um DetectionSet alinhado
+        com `stracks`) já associados com uma única correção de Kalman em lote;
+        tracks Tracked seguem como update(), os demais como re_activate().
+        """
+        if len(stracks) == 0:
+            return
+        bank = stracks[0].bank
+        slots = STrack.slots(stracks)
+        bank.mean[slots], bank.covariance[slots] = stracks[0].kalman_filter.multi_update(
+            bank.mean[slots], bank.covariance[slots], detections.xywh)
+
+        features = detections.curr_feat
+        for k, (track, score) in enumerate(zip(stracks, detections.score)):
+            feat = None if features is None else features[k]
+            track.mark_matched(score, feat, frame_id, reactivate=track.state != TrackState.Tracked)
+
+    def attach(self, bank):
+        """Reserva um slot no banco e move para ele o estado do track."""
+        values = {name: getattr(self, name) for name in TrackBank.FIELDS}
+        self.bank = bank
+        self.slot = bank.alloc()
+        for name, value in values.items():
+            if value is not None:
+                setattr(self, name, value)
+
+    def release(self):
+        """Devolve o slot ao banco, mantendo uma cópia do estado no próprio track."""
+        if self.slot is None:
+            return
+        values = {name: np.array(getattr(self, name)) if name in ('mean', 'covariance') else getattr(self, name)
+                  for name in TrackBank.FIELDS}
+        self.bank.release(self.slot)
+        self.slot = None
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def activate(self, kalman_filter, frame_id, bank=None):
         """Start a new tracklet"""
         self.kalman_filter = kalman_filter
         self.track_id = self.next_id()
+        self.attach(bank if bank is not None else STrack.shared_bank)
 
         self.mean, self.covariance = self.kalman_filter.initiate(self.tlwh_to_xywh(self._tlwh))
 
@@ -105,52 +237,40 @@ class STrack(BaseTrack):
         self.frame_id = frame_id
         self.start_frame = frame_id
 
-    def re_activate(self, new_track, frame_id, new_id=False):
+    def re_activate(self, new_track, frame_id, new_id=False, update_kalman=True):
 
-        self.mean, self.covariance = self.kalman_filter.update(self.mean, self.covariance, self.tlwh_to_xywh(new_track.tlwh))
-        if new_track.curr_feat is not None:
-            self.update_features(new_track.curr_feat)
-        self.tracklet_len = 0
-        self.state = TrackState.Tracked
-        self.is_activated = True
-        self.frame_id = frame_id
+        if update_kalman:
+            self.mean, self.covariance = self.kalman_filter.update(self.mean, self.covariance, self.tlwh_to_xywh(new_track.tlwh))
+        self.mark_matched(new_track.score, new_track.curr_feat, frame_id, reactivate=True)
         if new_id:
             self.track_id = self.next_id()
-        # Não atualizar cls_id - manter classe original
-        self.score = new_track.score
 
-    def update(self, new_track, frame_id):
+    def update(self, new_track, frame_id, update_kalman=True):
         """
         Update a matched track
         :type new_track: STrack
         :type frame_id: int
-        :type update_feature: bool
+        :type update_kalman: bool (False when the Kalman correction was already done by multi_update)
         :return:
         """
-        self.frame_id = frame_id
-        self.tracklet_len += 1
-
-        new_tlwh = new_track.tlwh
+        if update_kalman:
+            new_tlwh = new_track.tlwh
+            self.mean, self.covariance = self.kalman_filter.update(self.mean, self.covariance, self.tlwh_to_xywh(new_tlwh))
+        self.mark_matched(new_track.score, new_track.curr_feat, frame_id)
 
-        self.mean, self.covariance = self.kalman_filter.update(self.mean, self.covariance, self.tlwh_to_xywh(new_tlwh))
-
-        if new_track.curr_feat is not None:
-            self.update_features(new_track.curr_feat)
-        
+    def mark_matched(self, score, feat, frame_id, reactivate=False):
+        """
+        Estado de um track associado a uma detecção (score, embedding), sem a
+        correção de Kalman: update() (reactivate=False) ou re_activate().
+        """
+        if feat is not None:
+            self.update_features(feat)
         # Não atualizar cls_id - manter classe original do primeiro frame
-
+        self.tracklet_len = 0 if reactivate else self.tracklet_len + 1
         self.state = TrackState.Tracked
         self.is_activated = True
-
-        self.score = new_track.score
-
-        if new_track.curr_feat is not None:
-            self.update_features(new_track.curr_feat)
-
-        self.state = TrackState.Tracked
-        self.is_activated = True
-
-        self.score = new_track.score
+        self.frame_id = frame_id
+        self.score = score
 
     @property
     def tlwh(self):
@@ -224,7 +344,9 @@ class BoTSORT(object):
 
         self.tracked_stracks = []  # type: list[STrack]
         self.lost_stracks = []  # type: list[STrack]
-        self.removed_stracks = []  # type: list[STrack]
+        self.long_lost_stracks = []  # type: list[STrack]
+        self.removed_stracks = deque()  # type: deque[STrack]
+        self.removed_ids = set()  # ids em removed_stracks (teste de pertinência O(1))
         BaseTrack.clear_count()
 
         self.frame_id = 0
@@ -241,7 +363,26 @@ class BoTSORT(object):
             self.appearance_thresh = args.appearance_thresh
             with_reid = args.with_reid
             gmc_method = getattr(args, 'cmc_method', 'sparseOptFlow')
+            gmc_downscale = getattr(args, 'gmc_downscale', 2)
+            gmc_max_features = getattr(args, 'gmc_max_features', 1000)
+            gmc_min_features = getattr(args, 'gmc_min_features', None)
+            gmc_async = getattr(args, 'gmc_async', False)
+            gmc_cache_dir = getattr(args, 'gmc_cache_dir', None)
+            gmc_video = getattr(args, 'gmc_video', None)
+            gmc_detections_source = getattr(args, 'gmc_detections_source', None)
+            gmc_ecc_levels = getattr(args, 'gmc_ecc_levels', 3)
+            gmc_ecc_iterations = getattr(args, 'gmc_ecc_iterations', 50)
+            gmc_ecc_budget_ms = getattr(args, 'gmc_ecc_budget_ms', None)
+            gmc_static_bypass = getattr(args, 'gmc_static_bypass', False)
+            gmc_static_check_interval = getattr(args, 'gmc_static_check_interval', 30)
             mot20 = getattr(args, 'mot20', False)
+            removed_buffer = getattr(args, 'removed_buffer', 1000)
+            archive_path = getattr(args, 'archive_path', None)
+            tiered_association = getattr(args, 'tiered_association', False)
+            long_lost_after = getattr(args, 'long_lost_after', 30)
+            sparse_association = getattr(args, 'sparse_association', False)
+            class_aware = getattr(args, 'class_aware', False)
+            class_workers = getattr(args, 'class_workers', 0)
         else:
             # Cria args a partir de kwargs
             class Args:
@@ -256,7 +397,26 @@ class BoTSORT(object):
             self.appearance_thresh = kwargs.get('appearance_thresh', 0.25)
             with_reid = kwargs.get('with_reid', False)
             gmc_method = kwargs.get('gmc_method', 'sparseOptFlow')
+            gmc_downscale = kwargs.get('gmc_downscale', 2)
+            gmc_max_features = kwargs.get('gmc_max_features', 1000)
+            gmc_min_features = kwargs.get('gmc_min_features', None)
+            gmc_async = kwargs.get('gmc_async', False)
+            gmc_cache_dir = kwargs.get('gmc_cache_dir', None)
+            gmc_video = kwargs.get('gmc_video', None)
+            gmc_detections_source = kwargs.get('gmc_detections_source', None)
+            gmc_ecc_levels = kwargs.get('gmc_ecc_levels', 3)
+            gmc_ecc_iterations = kwargs.get('gmc_ecc_iterations', 50)
+            gmc_ecc_budget_ms = kwargs.get('gmc_ecc_budget_ms', None)
+            gmc_static_bypass = kwargs.get('gmc_static_bypass', False)
+            gmc_static_check_interval = kwargs.get('gmc_static_check_interval', 30)
             mot20 = kwargs.get('mot20', False)
+            removed_buffer = kwargs.get('removed_buffer', 1000)
+            archive_path = kwargs.get('archive_path', None)
+            tiered_association = kwargs.get('tiered_association', False)
+            long_lost_after = kwargs.get('long_lost_after', 30)
+            sparse_association = kwargs.get('sparse_association', False)
+            class_aware = kwargs.get('class_aware', False)
+            class_workers = kwargs.get('class_workers', 0)
             
             # Atributos necessários para o args
             self.args.track_high_thresh = self.track_high_thresh
@@ -271,7 +431,33 @@ class BoTSORT(object):
             self.args.match_thresh = kwargs.get('match_thresh', 0.8)
 
         self.max_time_lost = self.buffer_size
+
+        # Associação em camadas: tracks perdidos há mais de `long_lost_after` frames
+        # saem do pool principal (LongLost), têm a predição adiada (antecipada quando
+        # o GMC traz rotação/escala, para o ruído sair igual ao frame a frame) e só
+        # disputam as detecções que sobraram, após um pré-filtro espacial. Tracks perdidos cuja
+        # box prevista saiu do frame são removidos antes do fim do buffer.
+        self.tiered_association = bool(tiered_association)
+        self.long_lost_after = int(frame_rate / 30.0 * long_lost_after)
+
+        # Associação esparsa: IoU/gating só nos pares que se sobrepõem (índice de
+        # intervalos) e LAP por componente conexa; mesmo resultado da densa, mais
+        # rápida em cenas com centenas de objetos. Sem ReID (embeddings são densos).
+        self.sparse_association = bool(sparse_association)
+
+        # Associação por classe: um problema de associação independente por classe
+        # (a classe do track nunca muda), opcionalmente em `class_workers` threads
+        self.class_aware = bool(class_aware)
+        self.class_pool = (ThreadPoolExecutor(max_workers=int(class_workers))
+                           if self.class_aware and class_workers and int(class_workers) > 1 else None)
+
+        # Histórico de tracks removidos limitado aos `removed_buffer` mais recentes
+        # (None/0 = sem limite); os tracks finalizados (que saem de tracked/lost)
+        # podem ir para um log em disco
+        self.removed_buffer = int(removed_buffer) if removed_buffer else None
+        self.archiver = TrackArchiver(archive_path) if archive_path else None
         self.kalman_filter = KalmanFilter()
+        self.track_bank = TrackBank()
 
         # ReID module
         if with_reid:
@@ -282,7 +468,24 @@ class BoTSORT(object):
         else:
             self.encoder = None
 
-        self.gmc = GMC(method=gmc_method, verbose=[])
+        # sparseOptFlow: frame reduzido `gmc_downscale` vezes, até `gmc_max_features`
+        # pontos rastreados; novos cantos só quando sobram menos de `gmc_min_features`
+        # `gmc_async`: o warp é calculado numa thread a partir de prefetch_gmc(),
+        # em paralelo com o detector, e o update só pega o resultado.
+        # `gmc_cache_dir` + `gmc_video` (arquivo local): os warps são gravados num
+        # sidecar e reproduzidos nas execuções seguintes sobre o mesmo vídeo. As
+        # detecções mascaradas no GMC são as acima de track_high_thresh, então a
+        # chave do sidecar inclui o limiar junto com `gmc_detections_source`.
+        # ecc: pirâmide com orçamento de iterações/tempo. `gmc_static_bypass`:
+        # câmera parada detectada -> identidade, conferindo a cada N frames
+        self.gmc = GMC(method=gmc_method, downscale=gmc_downscale, verbose=[],
+                       max_features=gmc_max_features, min_features=gmc_min_features,
+                       async_mode=bool(gmc_async), cache_dir=gmc_cache_dir or None, video=gmc_video,
+                       ecc_levels=gmc_ecc_levels, ecc_iterations=gmc_ecc_iterations,
+                       ecc_budget_ms=gmc_ecc_budget_ms, static_bypass=bool(gmc_static_bypass),
+                       static_check_interval=gmc_static_check_interval,
+                       detections_source=dict(source=gmc_detections_source,
+                                              track_high_thresh=self.track_high_thresh))
 
     def update(self, output_results, img, frame_time=None):
         self.frame_id += 1
@@ -347,16 +550,16 @@ class BoTSORT(object):
         if self.args.with_reid and self.encoder is not None:
             features_keep = self.encoder.inference(img, dets)
 
+        # Detecções como linhas de arrays (DetectionSet); um STrack só é criado
+        # para as detecções que iniciam um track novo
         if len(dets) > 0:
             '''Detections'''
             if self.args.with_reid and self.encoder is not None:
-                detections = [STrack(STrack.tlbr_to_tlwh(tlbr), s, f, cls_id=int(c)) for
-                              (tlbr, s, f, c) in zip(dets, scores_keep, features_keep, classes_keep)]
+                detections = DetectionSet(dets, scores_keep, classes_keep, features_keep)
             else:
-                detections = [STrack(STrack.tlbr_to_tlwh(tlbr), s, cls_id=int(c)) for
-                              (tlbr, s, c) in zip(dets, scores_keep, classes_keep)]
+                detections = DetectionSet(dets, scores_keep, classes_keep)
         else:
-            detections = []
+            detections = DetectionSet()
 
         ''' Add newly detected tracklets to tracked_stracks'''
         unconfirmed = []
@@ -373,50 +576,24 @@ class BoTSORT(object):
         # Predict the current location with KF
         STrack.multi_predict(strack_pool, dt=dt)
 
+        # Long-lost: predição adiada, só acumula o dt e o número de frames
+        if self.long_lost_stracks:
+            long_lost_slots = STrack.slots(self.long_lost_stracks)
+            self.track_bank.pending_dt[long_lost_slots] += dt
+            self.track_bank.pending_steps[long_lost_slots] += 1
+
         # Fix camera motion
         warp = self.gmc.apply(img, dets)
-        STrack.multi_gmc(strack_pool, warp)
-        STrack.multi_gmc(unconfirmed, warp)
+        if self.long_lost_stracks and not np.array_equal(warp[:2, :2], np.eye(2)):
+            # Warp com rotação/escala não comuta com o ruído Q da predição: os
+            # passos adiados rodam antes, como na predição frame a frame (só
+            # translação desloca a média e não mexe na covariância)
+            self._predict_long_lost(long_lost_slots)
+        STrack.multi_gmc(strack_pool + unconfirmed + self.long_lost_stracks, warp)
 
         # Associate with high score detection boxes
-        ious_dists = matching.iou_distance(strack_pool, detections)
-        ious_dists_mask = (ious_dists > self.proximity_thresh)
-
-        if not self.args.mot20:
-            ious_dists = matching.fuse_score(ious_dists, detections)
-
-        if self.args.with_reid:
-            emb_dists = matching.embedding_distance(strack_pool, detections) / 2.0
-            raw_emb_dists = emb_dists.copy()
-            emb_dists[emb_dists > self.appearance_thresh] = 1.0
-            emb_dists[ious_dists_mask] = 1.0
-            dists = np.minimum(ious_dists, emb_dists)
-
-            # Popular ReID method (JDE / FairMOT)
-            # raw_emb_dists = matching.embedding_distance(strack_pool, detections)
-            # dists = matching.fuse_motion(self.kalman_filter, raw_emb_dists, strack_pool, detections)
-            # emb_dists = dists
-
-            # IoU making ReID
-            # dists = matching.embedding_distance(strack_pool, detections)
-            # dists[ious_dists_mask] = 1.0
-        else:
-            dists = ious_dists
-
-        # Ajuda quando há pulo de frames/jitter: combina custo de IoU com distância de Mahalanobis do KF
-        dists = matching.fuse_motion(self.kalman_filter, dists, strack_pool, detections, only_position=True)
-
-        matches, u_track, u_detection = matching.linear_assignment(dists, thresh=self.args.match_thresh)
-
-        for itracked, idet in matches:
-            track = strack_pool[itracked]
-            det = detections[idet]
-            if track.state == TrackState.Tracked:
-                track.update(detections[idet], self.frame_id)
-                activated_starcks.append(track)
-            else:
-                track.re_activate(det, self.frame_id, new_id=False)
-                refind_stracks.append(track)
+        matches, u_track, u_detection = self._associate(self._first_assignment, strack_pool, detections)
+        self._apply_matches(strack_pool, detections, matches, activated_starcks, refind_stracks)
 
         ''' Step 3: Second association, with low score detection boxes'''
         if len(scores):
@@ -434,23 +611,14 @@ class BoTSORT(object):
         # association the untrack to the low score detections
         if len(dets_second) > 0:
             '''Detections'''
-            detections_second = [STrack(STrack.tlbr_to_tlwh(tlbr), s, cls_id=int(c)) for
-                                 (tlbr, s, c) in zip(dets_second, scores_second, classes_second)]
+            detections_second = DetectionSet(dets_second, scores_second, classes_second)
         else:
-            detections_second = []
+            detections_second = DetectionSet()
 
         r_tracked_stracks = [strack_pool[i] for i in u_track if strack_pool[i].state == TrackState.Tracked]
-        dists = matching.iou_distance(r_tracked_stracks, detections_second)
-        matches, u_track, u_detection_second = matching.linear_assignment(dists, thresh=0.5)
-        for itracked, idet in matches:
-            track = r_tracked_stracks[itracked]
-            det = detections_second[idet]
-            if track.state == TrackState.Tracked:
-                track.update(det, self.frame_id)
-                activated_starcks.append(track)
-            else:
-                track.re_activate(det, self.frame_id, new_id=False)
-                refind_stracks.append(track)
+        matches, u_track, u_detection_second = self._associate(
+            self._second_assignment, r_tracked_stracks, detections_second)
+        self._apply_matches(r_tracked_stracks, detections_second, matches, activated_starcks, refind_stracks)
 
         for it in u_track:
             track = r_tracked_stracks[it]
@@ -458,26 +626,14 @@ class BoTSORT(object):
                 track.mark_lost()
                 lost_stracks.append(track)
 
-        '''Deal with unconfirmed tracks, usually tracks with only one beginning frame'''
-        detections = [detections[i] for i in u_detection]
-        ious_dists = matching.iou_distance(unconfirmed, detections)
-        ious_dists_mask = (ious_dists > self.proximity_thresh)
-        if not self.args.mot20:
-            ious_dists = matching.fuse_score(ious_dists, detections)
-
-        if self.args.with_reid:
-            emb_dists = matching.embedding_distance(unconfirmed, detections) / 2.0
-            raw_emb_dists = emb_dists.copy()
-            emb_dists[emb_dists > self.appearance_thresh] = 1.0
-            emb_dists[ious_dists_mask] = 1.0
-            dists = np.minimum(ious_dists, emb_dists)
-        else:
-            dists = ious_dists
+        '''Tiered: long-lost tracks only compete for the high score detections left'''
+        if self.long_lost_stracks and len(u_detection):
+            u_detection = self._associate_long_lost(detections, u_detection, activated_starcks, refind_stracks)
 
-        matches, u_unconfirmed, u_detection = matching.linear_assignment(dists, thresh=0.7)
-        for itracked, idet in matches:
-            unconfirmed[itracked].update(detections[idet], self.frame_id)
-            activated_starcks.append(unconfirmed[itracked])
+        '''Deal with unconfirmed tracks, usually tracks with only one beginning frame'''
+        detections = detections[u_detection]
+        matches, u_unconfirmed, u_detection = self._associate(self._unconfirmed_assignment, unconfirmed, detections)
+        self._apply_matches(unconfirmed, detections, matches, activated_starcks, refind_stracks)
         for it in u_unconfirmed:
             track = unconfirmed[it]
             track.mark_removed()
@@ -485,28 +641,58 @@ class BoTSORT(object):
 
         """ Step 4: Init new stracks"""
         for inew in u_detection:
-            track = detections[inew]
-            if track.score < self.new_track_thresh:
+            tlwh, score, feat, cls_id = detections.row(inew)
+            if score < self.new_track_thresh:
                 continue
 
-            track.activate(self.kalman_filter, self.frame_id)
+            track = STrack(tlwh, score, feat, cls_id=cls_id)
+            track.activate(self.kalman_filter, self.frame_id, self.track_bank)
             activated_starcks.append(track)
 
         """ Step 5: Update state"""
+        long_lost_stracks = []
         for track in self.lost_stracks:
             if self.frame_id - track.end_frame > self.max_time_lost:
                 track.mark_removed()
                 removed_stracks.append(track)
+            elif (self.tiered_association and track.state == TrackState.Lost
+                  and self.frame_id - track.end_frame > self.long_lost_after):
+                track.mark_long_lost()
+                long_lost_stracks.append(track)
+
+        if self.tiered_association:
+            for track in self.long_lost_stracks:
+                if track.state == TrackState.LongLost and self.frame_id - track.end_frame > self.max_time_lost:
+                    track.mark_removed()
+                    removed_stracks.append(track)
+            if img is not None:
+                removed_stracks.extend(self._retire_outside_frame(
+                    self.lost_stracks + lost_stracks + self.long_lost_stracks, img.shape[1], img.shape[0]))
 
         """ Merge """
+        previous_stracks = self.tracked_stracks + self.lost_stracks + self.long_lost_stracks
         self.tracked_stracks = [t for t in self.tracked_stracks if t.state == TrackState.Tracked]
         self.tracked_stracks = joint_stracks(self.tracked_stracks, activated_starcks)
         self.tracked_stracks = joint_stracks(self.tracked_stracks, refind_stracks)
         self.lost_stracks = sub_stracks(self.lost_stracks, self.tracked_stracks)
         self.lost_stracks.extend(lost_stracks)
-        self.lost_stracks = sub_stracks(self.lost_stracks, self.removed_stracks)
-        self.removed_stracks.extend(removed_stracks)
+        self.lost_stracks = [t for t in self.lost_stracks
+                             if t.track_id not in self.removed_ids and t.state != TrackState.LongLost]
+        self._add_removed(removed_stracks)
         self.tracked_stracks, self.lost_stracks = remove_duplicate_stracks(self.tracked_stracks, self.lost_stracks)
+        self.long_lost_stracks = [t for t in self.long_lost_stracks if t.state == TrackState.LongLost]
+        self.long_lost_stracks.extend(long_lost_stracks)
+
+        # Liberar no TrackBank os slots de tracks que saíram de tracked/lost
+        # (removidos ou duplicatas descartadas): estes estão finalizados
+        kept_ids = {t.track_id for t in self.tracked_stracks}
+        kept_ids.update(t.track_id for t in self.lost_stracks)
+        kept_ids.update(t.track_id for t in self.long_lost_stracks)
+        for track in previous_stracks + activated_starcks:
+            if track.slot is not None and track.track_id not in kept_ids:
+                if self.archiver is not None:
+                    self.archiver.add(track)
+                track.release()
 
         # Retornar apenas tracks confirmados/ativados.
         # Isso evita IDs efêmeros (1 frame) que geram contagem duplicada.
@@ -514,6 +700,240 @@ class BoTSORT(object):
         return output_stracks
 
 
+    def _associate(self, assign, tracks, detections):
+        """
+        Executa uma etapa de associação `assign(tracks, detections)`.
+
+        Com `class_aware`, tracks e detecções são separados por classe (a classe
+        de um track nunca muda) e cada classe vira um problema independente e
+        menor (IoU, fusões e LAP), opcionalmente em paralelo no pool de threads;
+        pares entre classes diferentes nunca são associados.
+
+        Returns:
+            (matches, u_track, u_detection) com índices em `tracks`/`detections`
+        """
+        if not self.class_aware or len(tracks) == 0 or len(detections) == 0:
+            return assign(tracks, detections)
+
+        track_cls = np.fromiter((t.cls_id for t in tracks), dtype=np.int64, count=len(tracks))
+        det_cls = detections.cls_id
+        groups = [(np.flatnonzero(track_cls == c), np.flatnonzero(det_cls == c))
+                  for c in np.intersect1d(track_cls, det_cls)]
+
+        def solve(group):
+            track_idx, det_idx = group
+            matches, _, _ = assign([tracks[i] for i in track_idx], detections[det_idx])
+            matches = np.asarray(matches, dtype=np.intp).reshape(-1, 2)
+            return np.stack([track_idx[matches[:, 0]], det_idx[matches[:, 1]]], axis=1)
+
+        if self.class_pool is not None and len(groups) > 1:
+            results = list(self.class_pool.map(solve, groups))
+        else:
+            results = [solve(group) for group in groups]
+
+        matches = np.concatenate(results + [np.empty((0, 2), dtype=np.intp)])
+        matches = matches[np.argsort(matches[:, 0], kind='stable')]
+        u_track = np.setdiff1d(np.arange(len(tracks)), matches[:, 0])
+        u_detection = np.setdiff1d(np.arange(len(detections)), matches[:, 1])
+        return matches, u_track, u_detection
+
+    def _first_assignment(self, tracks, detections):
+        """Primeira associação: detecções de score alto x tracks ativos e perdidos."""
+        if self.sparse_association and not self.args.with_reid:
+            # Custos só nos pares que se sobrepõem; mesmo resultado do caminho denso
+            return matching.sparse_assignment(
+                tracks, detections, self.args.match_thresh, kf=self.kalman_filter,
+                use_score=not self.args.mot20, only_position=True)
+
+        ious_dists = matching.iou_distance(tracks, detections)
+        ious_dists_mask = (ious_dists > self.proximity_thresh)
+
+        if not self.args.mot20:
+            ious_dists = matching.fuse_score(ious_dists, detections)
+
+        if self.args.with_reid:
+            emb_dists = matching.embedding_distance(tracks, detections) / 2.0
+            raw_emb_dists = emb_dists.copy()
+            emb_dists[emb_dists > self.appearance_thresh] = 1.0
+            emb_dists[ious_dists_mask] = 1.0
+            dists = np.minimum(ious_dists, emb_dists)
+
+            # Popular ReID method (JDE / FairMOT)
+            # raw_emb_dists = matching.embedding_distance(tracks, detections)
+            # dists = matching.fuse_motion(self.kalman_filter, raw_emb_dists, tracks, detections)
+            # emb_dists = dists
+
+            # IoU making ReID
+            # dists = matching.embedding_distance(tracks, detections)
+            # dists[ious_dists_mask] = 1.0
+        else:
+            dists = ious_dists
+
+        # Ajuda quando há pulo de frames/jitter: combina custo de IoU com distância de Mahalanobis do KF
+        dists = matching.fuse_motion(self.kalman_filter, dists, tracks, detections, only_position=True)
+
+        return matching.linear_assignment(dists, thresh=self.args.match_thresh)
+
+    def _second_assignment(self, tracks, detections):
+        """Segunda associação: detecções de score baixo x tracks ainda não associados (só IoU)."""
+        if self.sparse_association:
+            return matching.sparse_assignment(tracks, detections, 0.5, use_score=False)
+        dists = matching.iou_distance(tracks, detections)
+        return matching.linear_assignment(dists, thresh=0.5)
+
+    def _unconfirmed_assignment(self, tracks, detections):
+        """Tracks não confirmados (um só frame) x detecções de score alto que sobraram."""
+        if self.sparse_association and not self.args.with_reid:
+            return matching.sparse_assignment(
+                tracks, detections, 0.7, use_score=not self.args.mot20)
+
+        ious_dists = matching.iou_distance(tracks, detections)
+        ious_dists_mask = (ious_dists > self.proximity_thresh)
+        if not self.args.mot20:
+            ious_dists = matching.fuse_score(ious_dists, detections)
+
+        if self.args.with_reid:
+            emb_dists = matching.embedding_distance(tracks, detections) / 2.0
+            raw_emb_dists = emb_dists.copy()
+            emb_dists[emb_dists > self.appearance_thresh] = 1.0
+            emb_dists[ious_dists_mask] = 1.0
+            dists = np.minimum(ious_dists, emb_dists)
+        else:
+            dists = ious_dists
+
+        return matching.linear_assignment(dists, thresh=0.7)
+
+    def _long_lost_assignment(self, tracks, detections):
+        """Custos da associação long-lost: IoU + score + gating de Mahalanobis."""
+        dists = matching.iou_distance(tracks, detections)
+        if not self.args.mot20:
+            dists = matching.fuse_score(dists, detections)
+        dists = matching.fuse_motion(self.kalman_filter, dists, tracks, detections, only_position=True)
+        return matching.linear_assignment(dists, thresh=self.args.match_thresh)
+
+    def _associate_long_lost(self, detections, u_detection, activated_stracks, refind_stracks):
+        """
+        Associação pequena e separada entre tracks long-lost e as detecções de
+        score alto que sobraram das etapas principais.
+
+        Pré-filtro: só entram tracks cuja box prevista (centro + velocidade x dt
+        pendente; w/h não variam em tracks perdidos) sobrepõe alguma detecção, ou
+        seja, os únicos com IoU > 0. Só esses candidatos recebem a predição de
+        Kalman adiada: todos os frames acumulados de uma vez
+        (KalmanFilter.multi_predict_steps). A média sai igual à da predição
+        frame a frame; a covariância também, exceto que o ruído dos passos
+        adiados usa o dt médio (aproximação quando o intervalo entre frames
+        varia). Um warp do GMC com rotação/escala força a predição pendente
+        antes de ser aplicado (ver update), porque o ruído Q não comuta com
+        ele; warps só de translação não mexem na covariância.
+
+        Returns:
+            Índices (em `detections`) das detecções que continuam sem track
+        """
+        u_detection = list(u_detection)
+        dets_left = detections[u_detection]
+        bank = self.track_bank
+        slots = STrack.slots(self.long_lost_stracks)
+
+        mean = bank.mean[slots]
+        center = mean[:, :2] + mean[:, 4:6] * bank.pending_dt[slots, None]
+        half = mean[:, 2:4] / 2
+        det_tlbr = dets_left.tlbr
+        det_center = (det_tlbr[:, :2] + det_tlbr[:, 2:]) / 2
+        det_half = (det_tlbr[:, 2:] - det_tlbr[:, :2]) / 2
+        overlap = np.all(np.abs(center[:, None] - det_center[None]) < half[:, None] + det_half[None], axis=2)
+        candidates = np.flatnonzero(overlap.any(axis=1))
+        if len(candidates) == 0:
+            return u_detection
+
+        tracks = [self.long_lost_stracks[i] for i in candidates]
+        self._predict_long_lost(slots[candidates])
+
+        matches, _, u_left = self._associate(self._long_lost_assignment, tracks, dets_left)
+        self._apply_matches(tracks, dets_left, matches, activated_stracks, refind_stracks)
+        return [u_detection[i] for i in u_left]
+
+    def _predict_long_lost(self, slots):
+        """Aplica de uma vez a predição adiada dos tracks long-lost em `slots` e zera o pendente."""
+        bank = self.track_bank
+        pending = slots[bank.pending_steps[slots] > 0]
+        if len(pending) == 0:
+            return
+        bank.mean[pending], bank.covariance[pending] = self.kalman_filter.multi_predict_steps(
+            bank.mean[pending], bank.covariance[pending], bank.pending_dt[pending], bank.pending_steps[pending])
+        bank.pending_dt[pending] = 0
+        bank.pending_steps[pending] = 0
+
+    def _retire_outside_frame(self, stracks, width, height):
+        """Marca como removidos os tracks perdidos cuja box prevista está toda fora do frame."""
+        stracks = [t for t in stracks if t.state in (TrackState.Lost, TrackState.LongLost)]
+        if not stracks:
+            return []
+        slots = STrack.slots(stracks)
+        mean = self.track_bank.mean[slots]
+        center = mean[:, :2] + mean[:, 4:6] * self.track_bank.pending_dt[slots, None]
+        half = mean[:, 2:4] / 2
+        outside = ((center[:, 0] + half[:, 0] < 0) | (center[:, 0] - half[:, 0] > width) |
+                   (center[:, 1] + half[:, 1] < 0) | (center[:, 1] - half[:, 1] > height))
+        retired = [stracks[i] for i in np.flatnonzero(outside)]
+        for track in retired:
+            track.mark_removed()
+        return retired
+
+    def _add_removed(self, stracks):
+        """
+        Acrescenta tracks ao histórico de removidos, descartando os mais antigos
+        além de `removed_buffer`.
+        """
+        for track in stracks:
+            if track.track_id in self.removed_ids:
+                continue
+            if self.removed_buffer is not None and len(self.removed_stracks) >= self.removed_buffer:
+                self.removed_ids.discard(self.removed_stracks.popleft().track_id)
+            self.removed_stracks.append(track)
+            self.removed_ids.add(track.track_id)
+
+    def prefetch_gmc(self, img):
+        """
+        Inicia o GMC do frame numa thread (só com `gmc_async`).
+
+        Chamar logo após capturar o frame, antes do detector; o update() com o
+        mesmo `img` usa o warp já calculado. Sem `gmc_async` não faz nada.
+
+        Args:
+            img: frame BGR capturado (não pode ser modificado até o update)
+        """
+        self.gmc.submit(img)
+
+    def close(self, stream_finished=False):
+        """
+        Grava no disco os tracks finalizados ainda pendentes e encerra os pools de threads.
+
+        Args:
+            stream_finished: o vídeo foi lido até o fim; só então o sidecar do
+                GMC em gravação é marcado como completo (reproduzível)
+        """
+        if self.archiver is not None:
+            self.archiver.close()
+        if self.class_pool is not None:
+            self.class_pool.shutdown()
+            self.class_pool = None
+        self.gmc.close(complete=stream_finished)
+
+    def _apply_matches(self, tracks, detections, matches, activated_stracks, refind_stracks):
+        """Aplica os pares de uma etapa de associação com um único multi_update."""
+        if len(matches) == 0:
+            return
+        matched = [tracks[i] for i, _ in matches]
+        was_tracked = [track.state == TrackState.Tracked for track in matched]
+        STrack.multi_update(matched, detections[[j for _, j in matches]], self.frame_id)
+        for track, tracked in zip(matched, was_tracked):
+            if tracked:
+                activated_stracks.append(track)
+            else:
+                refind_stracks.append(track)
+
+
 def joint_stracks(tlista, tlistb):
     exists = {}
     res = []
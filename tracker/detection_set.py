@@ -0,0 +1,99 @@
+import numpy as np
+
+
+class DetectionSet(object):
+    """
+    Detections of one frame as rows of shared arrays.
+
+    The association stages only read boxes, scores, classes and (with ReID)
+    features, so detections are kept as row indices into the frame arrays
+    instead of one STrack per detection. Indexing with an index array or a
+    boolean mask returns a DetectionSet over the selected rows, sharing the
+    same arrays; an STrack is built (from `row`) only for a detection that
+    starts a new track.
+
+    Parameters
+    ----------
+    tlbr : ndarray
+        (N, 4) boxes (min x, min y, max x, max y).
+    scores : ndarray
+        (N,) detection scores (dtype kept).
+    classes : ndarray
+        (N,) class ids.
+    features : ndarray | None
+        (N, D) ReID embeddings, or None.
+    """
+
+    __slots__ = ('_tlwh', '_tlbr', '_xywh', '_score', '_cls_id', '_features', '_curr_feat', 'rows')
+
+    def __init__(self, tlbr=None, scores=None, classes=None, features=None):
+        if tlbr is None or len(tlbr) == 0:
+            tlbr = np.empty((0, 4), dtype=np.float32)
+            scores = np.empty(0, dtype=np.float32)
+            classes = np.empty(0, dtype=np.float32)
+            features = None
+
+        # Same arithmetic as STrack.tlbr_to_tlwh / .tlbr / .to_xywh, in the input dtype first
+        tlwh = np.array(tlbr)
+        tlwh[:, 2:] -= tlwh[:, :2]
+        self._tlwh = tlwh.astype(np.float64)
+        self._tlbr = self._tlwh.copy()
+        self._tlbr[:, 2:] += self._tlbr[:, :2]
+        self._xywh = self._tlwh.copy()
+        self._xywh[:, :2] += self._xywh[:, 2:] / 2
+
+        self._score = np.asarray(scores)
+        self._cls_id = np.asarray(classes).astype(np.int64)
+        self._features = None if features is None else np.asarray(features)
+        self._curr_feat = None
+        if self._features is not None:
+            self._curr_feat = self._features / np.linalg.norm(self._features, axis=1, keepdims=True)
+        self.rows = np.arange(len(self._tlwh))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        """DetectionSet over `rows[index]` (index array or boolean mask)."""
+        index = np.asarray(index)
+        if index.dtype != bool:
+            index = index.astype(np.intp)
+        subset = DetectionSet.__new__(DetectionSet)
+        for name in DetectionSet.__slots__:
+            setattr(subset, name, getattr(self, name))
+        subset.rows = self.rows[index]
+        return subset
+
+    @property
+    def tlwh(self):
+        """(K, 4) float64 boxes (top left x, top left y, width, height)."""
+        return self._tlwh[self.rows]
+
+    @property
+    def tlbr(self):
+        """(K, 4) float64 boxes (min x, min y, max x, max y)."""
+        return self._tlbr[self.rows]
+
+    @property
+    def xywh(self):
+        """(K, 4) float64 boxes (center x, center y, width, height), the Kalman measurement."""
+        return self._xywh[self.rows]
+
+    @property
+    def score(self):
+        return self._score[self.rows]
+
+    @property
+    def cls_id(self):
+        return self._cls_id[self.rows]
+
+    @property
+    def curr_feat(self):
+        """(K, D) L2-normalized embeddings, or None without ReID."""
+        return None if self._curr_feat is None else self._curr_feat[self.rows]
+
+    def row(self, i):
+        """(tlwh, score, feat, cls_id) of the i-th detection of the set, as STrack() takes them."""
+        row = self.rows[i]
+        feat = None if self._features is None else self._features[row].copy()
+        return self._tlwh[row], self._score[row], feat, int(self._cls_id[row])
@@ -3,10 +3,16 @@ import matplotlib.pyplot as plt
 import numpy as np
 import copy
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tracker.gmc_cache import GMCRecorder, GMCReplay, open_sidecar, sidecar_key, sidecar_path, video_identity
 
 
 class GMC:
-    def __init__(self, method='sparseOptFlow', downscale=2, verbose=None):
+    def __init__(self, method='sparseOptFlow', downscale=2, verbose=None, max_features=1000, min_features=None,
+                 async_mode=False, cache_dir=None, video=None, ecc_levels=3, ecc_iterations=50,
+                 ecc_budget_ms=None, static_bypass=False, static_check_interval=30, static_probe_frames=10,
+                 static_thresh=2.0, detections_source=None):
         super(GMC, self).__init__()
 
         self.method = method
@@ -23,14 +29,24 @@ class GMC:
             self.matcher = cv2.BFMatcher(cv2.NORM_L2)
 
         elif self.method == 'ecc':
-            number_of_iterations = 5000
-            termination_eps = 1e-6
+            # Coarse-to-fine: ECC runs on each pyramid level (coarsest first) with
+            # at most ecc_iterations per level; once ecc_budget_ms is spent, the
+            # finer levels are skipped and the current warp is scaled up
+            number_of_iterations = max(1, int(ecc_iterations))
+            termination_eps = 1e-4
             self.warp_mode = cv2.MOTION_EUCLIDEAN
             self.criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, number_of_iterations, termination_eps)
+            self.ecc_levels = max(1, int(ecc_levels))
+            self.ecc_budget = ecc_budget_ms / 1000.0 if ecc_budget_ms else None
+            self.prevPyramid = None
 
         elif self.method == 'sparseOptFlow':
-            self.feature_params = dict(maxCorners=1000, qualityLevel=0.01, minDistance=1, blockSize=3,
+            self.feature_params = dict(maxCorners=int(max_features), qualityLevel=0.01, minDistance=1, blockSize=3,
                                        useHarrisDetector=False, k=0.04)
+            # Points are tracked from frame to frame; new corners are detected only
+            # when fewer than min_features survive (default: half the budget)
+            self.min_features = int(max_features) // 2 if min_features is None else int(min_features)
+            self.featureMask = None
             # self.gmc_file = open('GMC_results.txt', 'w')
 
         elif self.method == 'file' or self.method == 'files':
@@ -61,9 +77,135 @@ class GMC:
         self.prevKeyPoints = None
         self.prevDescriptors = None
 
+        # Double-buffered grayscale frames (sparseOptFlow, ecc): the current frame
+        # is written into the buffer that held the frame before the previous one
+        self.grayFrame = None
+        self.frameBuffers = None
+
         self.initializedFirstFrame = False
 
+        # Static-camera bypass: after static_probe_frames consecutive frames with
+        # an identity warp and an unchanged thumbnail, the camera is taken as
+        # fixed and the identity is returned without running the method; every
+        # static_check_interval frames the thumbnail is compared again and any
+        # change resumes the estimation
+        self.static_bypass = bool(static_bypass) and self.method not in ('none', 'file')
+        self.static_check_interval = max(1, int(static_check_interval))
+        self.static_probe_frames = max(1, int(static_probe_frames))
+        self.static_thresh = float(static_thresh)
+        self.static = False
+        self.staticCount = 0
+        self.staticFrames = 0
+        self.probeThumb = None
+
+        # Async mode: submit() computes the warp of a frame on a single worker
+        # thread (frames stay in order; cv2 releases the GIL) while the caller
+        # runs the detector, and apply() picks up the result
+        self.executor = ThreadPoolExecutor(max_workers=1) if async_mode and self.method != 'none' else None
+        self.pending = []
+        self.lastDetections = None
+
+        # Warp cache: with `cache_dir` and a local `video` file, the warps are
+        # recorded to a sidecar keyed by the video and the parameters above, and
+        # a later run over the same video replays them (memory-mapped) instead
+        # of computing them. orb/sift/sparseOptFlow mask the detections out of
+        # the features, so for them the key also covers `detections_source`
+        # (JSON-serializable description of what produced the detections: model,
+        # thresholds) and `async_mode` (the mask then uses the previous frame)
+        self.replay = None
+        self.recorder = None
+        identity = video_identity(video) if cache_dir and self.method != 'none' else None
+        if identity is not None:
+            params = dict(method=self.method, downscale=self.downscale)
+            if self.method == 'sparseOptFlow':
+                params.update(max_features=self.feature_params['maxCorners'], min_features=self.min_features)
+            elif self.method == 'ecc':
+                params.update(ecc_levels=self.ecc_levels, ecc_iterations=self.criteria[1], ecc_budget=self.ecc_budget)
+            if self.method in ('orb', 'sift', 'sparseOptFlow'):
+                params.update(detections_source=detections_source, async_mode=self.executor is not None)
+            if self.static_bypass:
+                params.update(static_check_interval=self.static_check_interval,
+                              static_probe_frames=self.static_probe_frames, static_thresh=self.static_thresh)
+            key = sidecar_key(identity, params)
+            sidecar = open_sidecar(sidecar_path(cache_dir, video, key), key)
+            if isinstance(sidecar, GMCReplay):
+                self.replay = sidecar
+            else:
+                self.recorder = sidecar
+
+    def submit(self, raw_frame):
+        """Start the warp of `raw_frame` on the worker thread (no-op unless async).
+
+        The detections of this frame are not known yet, so the feature mask
+        uses the detections of the previous apply() call. `raw_frame` must not
+        be modified until apply() is called with it.
+        """
+        if self.executor is None:
+            return
+        future = self.executor.submit(self._compute, raw_frame, self.lastDetections)
+        self.pending.append((raw_frame, future))
+
     def apply(self, raw_frame, detections=None):
+        self.lastDetections = detections
+        if not self.pending:
+            return self._compute(raw_frame, detections)
+
+        # Warps of submitted frames that were never applied are chained into
+        # this one, so the result still maps the previously applied frame
+        H = np.eye(2, 3)
+        while self.pending:
+            frame, future = self.pending.pop(0)
+            H = self._compose(H, future.result())
+            if frame is raw_frame:
+                return H
+        return self._compose(H, self._compute(raw_frame, detections))
+
+    def close(self, complete=False):
+        """Wait for the submitted frames, stop the worker thread and finish the recording.
+
+        The sidecar is marked complete (replayable) only with `complete=True`,
+        i.e. when the caller read the video to the end.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self.pending = []
+        if self.recorder is not None:
+            self.recorder.close(complete=complete)
+            self.recorder = None
+
+    @staticmethod
+    def _compose(H1, H2):
+        """2x3 warp of H1 followed by H2."""
+        H = np.empty((2, 3))
+        H[:, :2] = H2[:, :2] @ H1[:, :2]
+        H[:, 2] = H2[:, :2] @ H1[:, 2] + H2[:, 2]
+        return H
+
+    def _compute(self, raw_frame, detections=None):
+        if self.replay is not None:
+            H = self.replay.next()
+            if H is not None:
+                if self.replay.index == len(self.replay):
+                    # Last recorded frame: run the method on it too, so that a
+                    # following frame gets a real warp instead of a first-frame identity
+                    self._estimate(raw_frame, detections)
+                return H
+            # The sidecar ended before the video: compute the remaining warps
+            # and record them after the replayed ones
+            print('Warning: GMC sidecar ended at frame %d, computing the warps' % len(self.replay))
+            self.recorder = GMCRecorder(self.replay.path, self.replay.key, append=True)
+            self.replay = None
+
+        if self.static_bypass:
+            H = self._bypassStatic(raw_frame, detections)
+        else:
+            H = self._estimate(raw_frame, detections)
+        if self.recorder is not None:
+            self.recorder.add(H)
+        return H
+
+    def _estimate(self, raw_frame, detections=None):
         if self.method == 'orb' or self.method == 'sift':
             return self.applyFeaures(raw_frame, detections)
         elif self.method == 'ecc':
@@ -80,33 +222,43 @@ class GMC:
     def applyEcc(self, raw_frame, detections=None):
 
         # Initialize
-        height, width, _ = raw_frame.shape
-        frame = cv2.cvtColor(raw_frame, cv2.COLOR_BGR2GRAY)
+        t0 = time.perf_counter()
         H = np.eye(2, 3, dtype=np.float32)
+        frame, _ = self._swapFrameBuffers(raw_frame)
 
-        # Downscale image (TODO: consider using pyramids)
-        if self.downscale > 1.0:
-            frame = cv2.GaussianBlur(frame, (3, 3), 1.5)
-            frame = cv2.resize(frame, (width // self.downscale, height // self.downscale))
-            width = width // self.downscale
-            height = height // self.downscale
+        # Image pyramid (level 0 = downscaled frame), down to ~32 px
+        pyramid = [frame]
+        while len(pyramid) < self.ecc_levels and min(pyramid[-1].shape) >= 64:
+            pyramid.append(cv2.pyrDown(pyramid[-1]))
 
         # Handle first frame
-        if not self.initializedFirstFrame:
-            # Initialize data
-            self.prevFrame = frame.copy()
+        if not self.initializedFirstFrame or len(self.prevPyramid) != len(pyramid):
+            self.prevPyramid = pyramid
 
             # Initialization done
             self.initializedFirstFrame = True
 
-            return H
+            return H.astype(np.float64)
+
+        # Run the ECC algorithm coarse-to-fine; the translation doubles at each finer level
+        level = len(pyramid) - 1
+        while True:
+            try:
+                (cc, H) = cv2.findTransformECC(self.prevPyramid[level], pyramid[level], H, self.warp_mode,
+                                               self.criteria, None, 1)
+            except cv2.error:
+                print('Warning: find transform failed at pyramid level %d' % level)
+            if level == 0 or (self.ecc_budget is not None and time.perf_counter() - t0 > self.ecc_budget):
+                break
+            level -= 1
+            H[:, 2] *= 2
 
-        # Run the ECC algorithm. The results are stored in warp_matrix.
-        # (cc, H) = cv2.findTransformECC(self.prevFrame, frame, H, self.warp_mode, self.criteria)
-        try:
-            (cc, H) = cv2.findTransformECC(self.prevFrame, frame, H, self.warp_mode, self.criteria, None, 1)
-        except:
-            print('Warning: find transform failed. Set warp as identity')
+        # Levels left unrefined and downscale
+        H = H.astype(np.float64)
+        H[:, 2] *= (2 ** level) * self.downscale
+
+        # Store to next iteration (the level-0 image is the swapped frame buffer)
+        self.prevPyramid = pyramid
 
         return H
 
@@ -238,63 +390,61 @@ class GMC:
 
     def applySparseOptFlow(self, raw_frame, detections=None):
 
-        t0 = time.time()
-
         # Initialize
-        height, width, _ = raw_frame.shape
-        frame = cv2.cvtColor(raw_frame, cv2.COLOR_BGR2GRAY)
         H = np.eye(2, 3)
-
-        # Downscale image
-        if self.downscale > 1.0:
-            # frame = cv2.GaussianBlur(frame, (3, 3), 1.5)
-            frame = cv2.resize(frame, (width // self.downscale, height // self.downscale))
-
-        # find the keypoints
-        keypoints = cv2.goodFeaturesToTrack(frame, mask=None, **self.feature_params)
+        frame, prevFrame = self._swapFrameBuffers(raw_frame)
+        height, width = frame.shape
+        mask = self._featureMask(frame.shape, detections)
 
         # Handle first frame
         if not self.initializedFirstFrame:
-            # Initialize data
-            self.prevFrame = frame.copy()
-            self.prevKeyPoints = copy.copy(keypoints)
+            self.prevKeyPoints = self._detectKeyPoints(frame, mask)
 
             # Initialization done
             self.initializedFirstFrame = True
 
             return H
 
-        # find correspondences
-        matchedKeypoints, status, err = cv2.calcOpticalFlowPyrLK(self.prevFrame, frame, self.prevKeyPoints, None)
-
-        # leave good correspondences only
-        prevPoints = []
-        currPoints = []
+        # find correspondences of the points tracked so far
+        if self.prevKeyPoints is not None and len(self.prevKeyPoints) > 0:
+            matchedKeypoints, status, err = cv2.calcOpticalFlowPyrLK(prevFrame, frame, self.prevKeyPoints, None)
 
-        for i in range(len(status)):
-            if status[i]:
-                prevPoints.append(self.prevKeyPoints[i])
-                currPoints.append(matchedKeypoints[i])
+            # leave good correspondences only (inside the frame and off the detections)
+            valid = status.reshape(-1).astype(bool)
+            curr = matchedKeypoints.reshape(-1, 2)
+            x = curr[:, 0]
+            y = curr[:, 1]
+            valid &= (x >= 0) & (x < width) & (y >= 0) & (y < height)
+            valid[valid] = mask[y[valid].astype(np.intp), x[valid].astype(np.intp)] > 0
 
-        prevPoints = np.array(prevPoints)
-        currPoints = np.array(currPoints)
+            prevPoints = self.prevKeyPoints[valid]
+            currPoints = matchedKeypoints[valid]
+        else:
+            prevPoints = currPoints = np.empty((0, 1, 2), dtype=np.float32)
 
         # Find rigid matrix
-        if (np.size(prevPoints, 0) > 4) and (np.size(prevPoints, 0) == np.size(prevPoints, 0)):
-            H, inliesrs = cv2.estimateAffinePartial2D(prevPoints, currPoints, cv2.RANSAC)
+        if np.size(prevPoints, 0) > 4:
+            warp, inliers = cv2.estimateAffinePartial2D(prevPoints, currPoints, cv2.RANSAC)
 
-            # Handle downscale
-            if self.downscale > 1.0:
-                H[0, 2] *= self.downscale
-                H[1, 2] *= self.downscale
+            if warp is not None:
+                H = warp
+
+                # Handle downscale
+                if self.downscale > 1.0:
+                    H[0, 2] *= self.downscale
+                    H[1, 2] *= self.downscale
+
+                # RANSAC outliers move with the scene, not with the camera
+                currPoints = currPoints[inliers.reshape(-1).astype(bool)]
         else:
             print('Warning: not enough matching points')
 
-        # Store to next iteration
-        self.prevFrame = frame.copy()
-        self.prevKeyPoints = copy.copy(keypoints)
-
-        t1 = time.time()
+        # Store to next iteration: keep tracking the surviving points and
+        # detect new corners only when too few are left
+        if np.size(currPoints, 0) < self.min_features:
+            self.prevKeyPoints = self._detectKeyPoints(frame, mask)
+        else:
+            self.prevKeyPoints = currPoints
 
         # gmc_line = str(1000 * (t1 - t0)) + "\t" + str(H[0, 0]) + "\t" + str(H[0, 1]) + "\t" + str(
         #     H[0, 2]) + "\t" + str(H[1, 0]) + "\t" + str(H[1, 1]) + "\t" + str(H[1, 2]) + "\n"
@@ -302,6 +452,81 @@ class GMC:
 
         return H
 
+    def _bypassStatic(self, raw_frame, detections=None):
+        """Run the method until the camera looks static, then return identity with periodic checks."""
+        if self.static:
+            self.staticFrames += 1
+            if self.staticFrames % self.static_check_interval:
+                return np.eye(2, 3)
+            if self._probeChanged(raw_frame):
+                # The camera moved: restart the method from this frame
+                self.static = False
+                self.staticCount = 0
+                self.initializedFirstFrame = False
+                return self._estimate(raw_frame, detections)
+            return np.eye(2, 3)
+
+        H = self._estimate(raw_frame, detections)
+        still = np.abs(H[:, 2]).max() < 0.5 and np.abs(H[:, :2] - np.eye(2)).max() < 1e-3
+        changed = self._probeChanged(raw_frame)
+        self.staticCount = self.staticCount + 1 if still and not changed else 0
+        if self.staticCount >= self.static_probe_frames:
+            self.static = True
+            self.staticFrames = 0
+        return H
+
+    def _probeChanged(self, raw_frame):
+        """Median absolute difference of an 80x45 thumbnail against the last probe, above static_thresh."""
+        small = cv2.resize(raw_frame, (80, 45), interpolation=cv2.INTER_AREA)
+        thumb = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+        changed = self.probeThumb is None or np.median(np.abs(thumb - self.probeThumb)) > self.static_thresh
+        self.probeThumb = thumb
+        return changed
+
+    def _swapFrameBuffers(self, raw_frame):
+        """Write the downscaled grayscale frame into the spare buffer; return (frame, prevFrame)."""
+        height, width, _ = raw_frame.shape
+        size = (width // self.downscale, height // self.downscale)
+
+        if self.frameBuffers is None or self.frameBuffers[0].shape != (size[1], size[0]):
+            self.grayFrame = np.empty((height, width), dtype=np.uint8)
+            self.frameBuffers = [np.empty((size[1], size[0]), dtype=np.uint8) for _ in range(2)]
+            self.initializedFirstFrame = False
+
+        prevFrame, frame = self.frameBuffers
+        if self.downscale > 1.0:
+            cv2.cvtColor(raw_frame, cv2.COLOR_BGR2GRAY, dst=self.grayFrame)
+            cv2.resize(self.grayFrame, size, dst=frame)
+        else:
+            cv2.cvtColor(raw_frame, cv2.COLOR_BGR2GRAY, dst=frame)
+
+        # The current frame becomes the previous one of the next call
+        self.frameBuffers = [frame, prevFrame]
+        return frame, prevFrame
+
+    def _featureMask(self, shape, detections=None):
+        """Mask (reused buffer) of the frame border and the detection boxes, as in applyFeaures."""
+        height, width = shape
+        if self.featureMask is None or self.featureMask.shape != shape:
+            self.featureMask = np.empty(shape, dtype=np.uint8)
+
+        mask = self.featureMask
+        mask.fill(0)
+        mask[int(0.02 * height): int(0.98 * height), int(0.02 * width): int(0.98 * width)] = 255
+        if detections is not None and len(detections):
+            boxes = (np.asarray(detections)[:, :4] / self.downscale).astype(np.int_)
+            np.maximum(boxes, 0, out=boxes)
+            for x1, y1, x2, y2 in boxes:
+                mask[y1:y2, x1:x2] = 0
+        return mask
+
+    def _detectKeyPoints(self, frame, mask):
+        """Corners to track from `frame` inside `mask`; (N, 1, 2) float32."""
+        keypoints = cv2.goodFeaturesToTrack(frame, mask=mask, **self.feature_params)
+        if keypoints is None:
+            return np.empty((0, 1, 2), dtype=np.float32)
+        return keypoints
+
     def applyFile(self, raw_frame, detections=None):
         line = self.gmcFile.readline()
         tokens = line.split("\t")
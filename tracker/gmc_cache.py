@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+# Header of a GMC sidecar, followed by one `WARP_DTYPE` record per frame
+SIDECAR_MAGIC = b'GMCW'
+SIDECAR_VERSION = 1
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', np.uint32),
+    ('complete', np.uint8),
+    ('key', 'S40'),
+    ('reserved', 'S15'),
+])
+WARP_DTYPE = np.dtype((np.float64, (2, 3)))
+
+
+def video_identity(path, head_bytes=1 << 20):
+    """
+    Identity of a local video file: size plus a hash of its first `head_bytes`.
+
+    Returns None for anything that is not a local file (camera index,
+    HTTP/RTSP stream), whose frames cannot be replayed.
+    """
+    if not isinstance(path, str) or not os.path.isfile(path):
+        return None
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        digest.update(f.read(head_bytes))
+    return '%d-%s' % (os.path.getsize(path), digest.hexdigest())
+
+
+def sidecar_key(identity, params):
+    """SHA-1 of the video identity and the GMC parameters that change the warps."""
+    payload = json.dumps({'video': identity, 'gmc': params}, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def sidecar_path(cache_dir, video, key):
+    """Sidecar file of `video` under `cache_dir`, named after the video and its `sidecar_key`."""
+    stem = os.path.splitext(os.path.basename(video))[0]
+    return os.path.join(cache_dir, '%s.%s.gmc' % (stem, key[:16]))
+
+
+class GMCRecorder(object):
+    """
+    Writes the 2x3 warp of each frame to a sidecar file.
+
+    Records are buffered and appended in batches, as in `TrackArchiver`.
+    The header is marked complete only by `close(complete=True)`, when the
+    video was read to the end; an interrupted recording is never replayed
+    (it is recorded again on the next run).
+
+    Parameters
+    ----------
+    path : str
+        Sidecar file.
+    key : str
+        `sidecar_key` of the video and GMC parameters.
+    batch_size : int
+        Number of buffered warps that triggers a write.
+    append : bool
+        Keep the warps already in `path` and record after them (a replay
+        that ran out) instead of overwriting the file.
+    """
+
+    def __init__(self, path, key, batch_size=256, append=False):
+        self.path = path
+        self.key = key
+        self.batch_size = max(1, int(batch_size))
+        self._pending = []
+        self.written = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if append and read_header(path) is not None:
+            # Drops a partial trailing record, if any, and reopens the recording
+            self.written = (os.path.getsize(path) - HEADER_DTYPE.itemsize) // WARP_DTYPE.itemsize
+            os.truncate(path, HEADER_DTYPE.itemsize + self.written * WARP_DTYPE.itemsize)
+            self._write_header(complete=False, mode='r+b')
+        else:
+            self._write_header(complete=False, mode='wb')
+
+    def add(self, warp):
+        self._pending.append(warp)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        records = np.array(self._pending, dtype=np.float64).reshape(-1, 2, 3)
+        with open(self.path, 'ab') as f:
+            records.tofile(f)
+        self.written += len(records)
+        self._pending = []
+
+    def close(self, complete=False):
+        """Write the remaining warps; mark the sidecar complete only if the whole video was recorded."""
+        self.flush()
+        if complete:
+            self._write_header(complete=True, mode='r+b')
+
+    def _write_header(self, complete, mode):
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = SIDECAR_MAGIC
+        header['version'] = SIDECAR_VERSION
+        header['complete'] = complete
+        header['key'] = self.key.encode('ascii')
+        with open(self.path, mode) as f:
+            header.tofile(f)
+
+
+class GMCReplay(object):
+    """
+    Memory-mapped warps of a complete sidecar, returned in frame order.
+
+    Parameters
+    ----------
+    path : str
+        Sidecar file written by `GMCRecorder`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header = read_header(path)
+        count = (os.path.getsize(path) - HEADER_DTYPE.itemsize) // WARP_DTYPE.itemsize
+        self.warps = (np.memmap(path, dtype=np.float64, mode='r', offset=HEADER_DTYPE.itemsize,
+                                shape=(count, 2, 3)) if count else np.empty((0, 2, 3)))
+        self.key = header['key'].decode('ascii')
+        self.index = 0
+
+    def __len__(self):
+        return len(self.warps)
+
+    def next(self):
+        """Warp of the next frame (a copy), or None past the last recorded frame."""
+        if self.index >= len(self.warps):
+            return None
+        warp = np.array(self.warps[self.index])
+        self.index += 1
+        return warp
+
+
+def read_header(path):
+    """Header record of a sidecar, or None if the file is missing or not a sidecar."""
+    if not os.path.isfile(path) or os.path.getsize(path) < HEADER_DTYPE.itemsize:
+        return None
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+    if header['magic'] != SIDECAR_MAGIC or header['version'] != SIDECAR_VERSION:
+        return None
+    return header
+
+
+def open_sidecar(path, key):
+    """
+    `GMCReplay` if `path` is a complete sidecar recorded with `key`, else a
+    `GMCRecorder` that (re)writes it.
+    """
+    header = read_header(path)
+    if header is not None and header['complete'] and header['key'].decode('ascii') == key:
+        return GMCReplay(path)
+    return GMCRecorder(path, key)
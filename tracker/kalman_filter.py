@@ -201,10 +201,7 @@ class KalmanFilter(object):
             self._std_weight_velocity * mean[:, 3]]
         sqr = np.square(np.r_[std_pos, std_vel]).T
 
-        motion_cov = []
-        for i in range(len(mean)):
-            motion_cov.append(np.diag(sqr[i]) * (1.0 + dt))
-        motion_cov = np.asarray(motion_cov)
+        motion_cov = _stacked_diag(sqr) * (1.0 + dt)
 
         mean = np.dot(mean, motion_mat.T)
         left = np.dot(motion_mat, covariance).transpose((1, 0, 2))
@@ -212,6 +209,55 @@ class KalmanFilter(object):
 
         return mean, covariance
 
+    def multi_predict_steps(self, mean, covariance, dt, steps):
+        """Run `steps` prediction steps at once (Vectorized version).
+
+        Equivalent to calling `multi_predict` `steps` times with a uniform
+        time delta `dt / steps` while the size velocities (vw, vh) are zero, as
+        they are for lost tracks: the process noise of every step is summed in
+        closed form instead of being accumulated step by step.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean matrix of the object states.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the object states.
+        dt : ndarray
+            Total time delta of each state (N,).
+        steps : ndarray
+            Number of frames each state skipped (N,), at least 1.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the mean vector and covariance matrix of the predicted
+            state.
+        """
+        dt = np.asarray(dt, dtype=np.float64)
+        k = np.maximum(np.asarray(steps, dtype=np.float64), 1.0)
+        h = dt / k
+        ndim = self.ndim
+        pos, vel = np.arange(ndim), ndim + np.arange(ndim)
+
+        motion_mat = np.tile(np.eye(2 * ndim), (len(mean), 1, 1))
+        motion_mat[:, pos, vel] = dt[:, None]
+        new_mean = np.einsum('nij,nj->ni', motion_mat, mean)
+        new_covariance = motion_mat @ covariance @ motion_mat.transpose(0, 2, 1)
+
+        # Noise of step i propagated through the remaining steps: F(s) Q F(s)^T with
+        # s = 0, h, ..., (k-1)h, summed per (position, velocity) pair
+        std = np.r_[[self._std_weight_position] * 4, [self._std_weight_velocity] * 4]
+        sqr = np.square(std * mean[:, [2, 3, 2, 3, 2, 3, 2, 3]]) * (1.0 + h)[:, None]
+        q_pos, q_vel = sqr[:, :ndim], sqr[:, ndim:]
+        sum_s = h * k * (k - 1) / 2
+        sum_s2 = h * h * (k - 1) * k * (2 * k - 1) / 6
+        new_covariance[:, pos, pos] += k[:, None] * q_pos + sum_s2[:, None] * q_vel
+        new_covariance[:, pos, vel] += sum_s[:, None] * q_vel
+        new_covariance[:, vel, pos] += sum_s[:, None] * q_vel
+        new_covariance[:, vel, vel] += k[:, None] * q_vel
+        return new_mean, new_covariance
+
     def update(self, mean, covariance, measurement):
         """Run Kalman filter correction step.
 
@@ -246,6 +292,41 @@ class KalmanFilter(object):
             kalman_gain, projected_cov, kalman_gain.T))
         return new_mean, new_covariance
 
+    def multi_update(self, mean, covariance, measurement):
+        """Run Kalman filter correction step (Vectorized version).
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional matrix of predicted state means.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the states.
+        measurement : ndarray
+            The Nx4 dimensional matrix of measurements (x, y, w, h), one per
+            state.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the measurement-corrected state distributions.
+
+        """
+        mean = np.asarray(mean, dtype=np.float64)
+        covariance = np.asarray(covariance, dtype=np.float64)
+
+        # Batched project(): H = [I 0], so projecting is slicing the blocks
+        std = self._std_weight_position * mean[:, [2, 3, 2, 3]]
+        projected_mean = mean[:, :4]
+        projected_cov = covariance[:, :4, :4] + _stacked_diag(np.square(std))
+
+        # K = P H^T S^-1  <=>  K^T = S^-1 (H P), with S symmetric positive definite
+        kalman_gain = np.linalg.solve(projected_cov, covariance[:, :4, :]).transpose(0, 2, 1)
+        innovation = measurement - projected_mean
+
+        new_mean = mean + np.einsum('nij,nj->ni', kalman_gain, innovation)
+        new_covariance = covariance - kalman_gain @ projected_cov @ kalman_gain.transpose(0, 2, 1)
+        return new_mean, new_covariance
+
     def gating_distance(self, mean, covariance, measurements,
                         only_position=False, metric='maha'):
         """Compute gating distance between state distribution and measurements.
@@ -288,4 +369,111 @@ class KalmanFilter(object):
             squared_maha = np.sum(z * z, axis=0)
             return squared_maha
         else:
-            raise ValueError('invalid distance metric')
\ No newline at end of file
+            raise ValueError('invalid distance metric')
+
+    def multi_gating_distance(self, means, covariances, measurements,
+                              only_position=False, metric='maha'):
+        """Compute gating distance between every track and every measurement
+        (Vectorized version of `gating_distance`).
+
+        Parameters
+        ----------
+        means : ndarray
+            The Tx8 dimensional mean matrix of the track states.
+        covariances : ndarray
+            The Tx8x8 dimensional covariance matrices of the track states.
+        measurements : ndarray
+            A Dx4 dimensional matrix of D measurements in format (x, y, w, h).
+        only_position : Optional[bool]
+            If True, distance computation is done with respect to the bounding
+            box center position only.
+        Returns
+        -------
+        ndarray
+            Returns a TxD matrix where element (i, j) contains the squared
+            Mahalanobis distance between track i and `measurements[j]`.
+        """
+        measurements = np.asarray(measurements, dtype=np.float64)
+        ndim = 2 if only_position else 4
+        mean, covariance = self._project_gating(means, covariances, ndim)
+
+        d = measurements[None, :, :ndim] - mean[:, None, :]
+        if metric == 'gaussian':
+            return np.sum(d * d, axis=2)
+        elif metric == 'maha':
+            if ndim == 2:
+                # Closed-form inverse of the 2x2 innovation covariance
+                a = covariance[:, 0, 0, None]
+                b = covariance[:, 0, 1, None]
+                c = covariance[:, 1, 1, None]
+                dx, dy = d[..., 0], d[..., 1]
+                return (c * dx * dx - 2 * b * dx * dy + a * dy * dy) / (a * c - b * b)
+            cholesky_factor = np.linalg.cholesky(covariance)
+            z = np.linalg.solve(cholesky_factor, d.transpose(0, 2, 1))
+            return np.sum(z * z, axis=1)
+        else:
+            raise ValueError('invalid distance metric')
+
+    def pair_gating_distance(self, means, covariances, measurements, rows, cols,
+                             only_position=False, metric='maha'):
+        """Compute gating distance only for the (track, measurement) pairs
+        `(rows[k], cols[k])` (sparse version of `multi_gating_distance`).
+
+        With `only_position=True` the values are bit-identical to the
+        corresponding entries of `multi_gating_distance`.
+
+        Parameters
+        ----------
+        means : ndarray
+            The Tx8 dimensional mean matrix of the track states.
+        covariances : ndarray
+            The Tx8x8 dimensional covariance matrices of the track states.
+        measurements : ndarray
+            A Dx4 dimensional matrix of D measurements in format (x, y, w, h).
+        rows, cols : ndarray
+            Track and measurement index of each of the K pairs.
+        only_position : Optional[bool]
+            If True, distance computation is done with respect to the bounding
+            box center position only.
+        Returns
+        -------
+        ndarray
+            Returns an array of length K with the squared Mahalanobis distance
+            of each pair.
+        """
+        measurements = np.asarray(measurements, dtype=np.float64)
+        ndim = 2 if only_position else 4
+        mean, covariance = self._project_gating(means, covariances, ndim)
+
+        d = measurements[cols, :ndim] - mean[rows]
+        if metric == 'gaussian':
+            return np.sum(d * d, axis=1)
+        elif metric == 'maha':
+            if ndim == 2:
+                a = covariance[rows, 0, 0]
+                b = covariance[rows, 0, 1]
+                c = covariance[rows, 1, 1]
+                dx, dy = d[:, 0], d[:, 1]
+                return (c * dx * dx - 2 * b * dx * dy + a * dy * dy) / (a * c - b * b)
+            cholesky_factor = np.linalg.cholesky(covariance)
+            z = np.linalg.solve(cholesky_factor[rows], d[..., None])[..., 0]
+            return np.sum(z * z, axis=1)
+        else:
+            raise ValueError('invalid distance metric')
+
+    def _project_gating(self, means, covariances, ndim):
+        """Batched project() restricted to the first `ndim` measurement dimensions."""
+        means = np.asarray(means, dtype=np.float64)
+        covariances = np.asarray(covariances, dtype=np.float64)
+        # H = [I 0], so projecting is slicing the blocks
+        std = self._std_weight_position * means[:, [2, 3, 2, 3][:ndim]]
+        covariance = covariances[:, :ndim, :ndim] + _stacked_diag(np.square(std))
+        return means[:, :ndim], covariance
+
+
+def _stacked_diag(values):
+    """Stack of diagonal matrices (N, k, k) from an Nxk matrix of diagonals."""
+    n, k = values.shape
+    out = np.zeros((n, k, k), dtype=values.dtype)
+    out[:, np.arange(k), np.arange(k)] = values
+    return out
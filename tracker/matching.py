@@ -1,31 +1,81 @@
 import numpy as np
 import scipy
 import lap
+from scipy.sparse.csgraph import connected_components
 from scipy.spatial.distance import cdist
 
 # from cython_bbox import bbox_overlaps as bbox_ious
 from tracker import kalman_filter
+from tracker.detection_set import DetectionSet
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def _bbox_ious_numpy(a, b):
+    """IoU (len(a), len(b)) com broadcasting; mesma ordem de operações do loop original."""
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+
+    inter = np.minimum(a[:, None, 2], b[None, :, 2])
+    inter -= np.maximum(a[:, None, 0], b[None, :, 0])
+    np.maximum(inter, 0, out=inter)
+    ih = np.minimum(a[:, None, 3], b[None, :, 3])
+    ih -= np.maximum(a[:, None, 1], b[None, :, 1])
+    np.maximum(ih, 0, out=ih)
+    inter *= ih
+
+    union = np.add.outer(area_a, area_b, out=ih)
+    union -= inter
+    union += 1e-6
+    inter /= union
+    return inter.astype(np.float32)
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _bbox_ious_numba(a, b):
+        ious = np.empty((a.shape[0], b.shape[0]), dtype=np.float32)
+        for i in range(a.shape[0]):
+            area_a = (a[i, 2] - a[i, 0]) * (a[i, 3] - a[i, 1])
+            for j in range(b.shape[0]):
+                iw = max(0.0, min(a[i, 2], b[j, 2]) - max(a[i, 0], b[j, 0]))
+                ih = max(0.0, min(a[i, 3], b[j, 3]) - max(a[i, 1], b[j, 1]))
+                inter = iw * ih
+                area_b = (b[j, 2] - b[j, 0]) * (b[j, 3] - b[j, 1])
+                ious[i, j] = inter / (area_a + area_b - inter + 1e-6)
+        return ious
+else:
+    _bbox_ious_numba = None
 
-def bbox_ious(a, b):
-    import numpy as np
-    ious = np.zeros((a.shape[0], b.shape[0]), dtype=np.float32)
-    for i in range(a.shape[0]):
-        for j in range(b.shape[0]):
-            xa1, ya1, xa2, ya2 = a[i]
-            xb1, yb1, xb2, yb2 = b[j]
-
-            inter_x1 = max(xa1, xb1)
-            inter_y1 = max(ya1, yb1)
-            inter_x2 = min(xa2, xb2)
-            inter_y2 = min(ya2, yb2)
-
-            inter = max(0, inter_x2 - inter_x1) * max(0, inter_y2 - inter_y1)
-            area_a = (xa2 - xa1) * (ya2 - ya1)
-            area_b = (xb2 - xb1) * (yb2 - yb1)
-            union = area_a + area_b - inter + 1e-6
-
-            ious[i, j] = inter / union
-    return ious
+# Backend padrão: numba (JIT) quando instalado, senão NumPy vetorizado
+BBOX_IOU_BACKEND = "numba" if numba is not None else "numpy"
+
+# Abaixo de tracks x detecções = SPARSE_MIN_PAIRS a associação esparsa usa a matriz
+# densa (mesmo resultado; o custo fixo do índice e das componentes não compensa)
+SPARSE_MIN_PAIRS = 20000
+
+
+def bbox_ious(a, b, backend=None):
+    """
+    IoU entre todas as boxes tlbr de `a` (N, 4) e `b` (M, 4).
+
+    Args:
+        a, b: arrays float64 [x1, y1, x2, y2]
+        backend: "numpy", "numba" ou None (BBOX_IOU_BACKEND)
+
+    Returns:
+        (N, M) float32
+    """
+    backend = backend or BBOX_IOU_BACKEND
+    if backend == "numba":
+        if _bbox_ious_numba is None:
+            raise ImportError("numba não instalado: pip install numba (ou use backend='numpy')")
+        return _bbox_ious_numba(np.ascontiguousarray(a, dtype=np.float64),
+                                np.ascontiguousarray(b, dtype=np.float64))
+    return _bbox_ious_numpy(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
 
 
 def merge_matches(m1, m2, shape):
@@ -90,6 +140,191 @@ def ious(atlbrs, btlbrs):
     return ious
 
 
+def overlap_pairs(atlbrs, btlbrs):
+    """
+    Pares (i, j) de boxes tlbr que se sobrepõem (IoU > 0), sem montar a matriz densa.
+
+    Índice espacial: as boxes de `b` vão para colunas uniformes em x (largura da
+    maior box de `b`) e, dentro de cada coluna, ficam ordenadas por y1. Cada box
+    de `a` consulta só as colunas que alcança e, nelas, o intervalo de y1 que
+    pode sobrepô-la (busca binária); o teste exato de sobreposição nos dois eixos
+    descarta o resto. Todo par fora do resultado tem IoU exatamente 0.
+
+    Returns:
+        (rows, cols): arrays de índices em `a` e `b`, ordenados por linha
+    """
+    a = np.asarray(atlbrs, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(btlbrs, dtype=np.float64).reshape(-1, 4)
+    if len(a) == 0 or len(b) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    # +1 px de margem contra arredondamento nas somas de coordenadas
+    cell = np.max(np.maximum(b[:, 2] - b[:, 0], 0)) + 1.0
+    max_h = np.max(np.maximum(b[:, 3] - b[:, 1], 0)) + 1.0
+    x0 = b[:, 0].min()
+    y0 = min(b[:, 1].min(), a[:, 1].min() - max_h)
+    span = max(b[:, 1].max(), a[:, 3].max()) - y0 + 2.0
+
+    # Chave (coluna, y1): colunas em faixas disjuntas de tamanho `span`
+    b_col = np.floor((b[:, 0] - x0) / cell)
+    keys = b_col * span + (b[:, 1] - y0)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+
+    # Box de b só pode sobrepor a se b.x1 está em (a.x1 - cell, a.x2) e b.y1 em (a.y1 - max_h, a.y2)
+    col_lo = np.maximum(np.floor((a[:, 0] - cell - x0) / cell), 0)
+    col_hi = np.minimum(np.floor((a[:, 2] - x0) / cell), b_col.max())
+    n_cols = np.maximum(col_hi - col_lo + 1, 0).astype(np.intp)
+    query = np.repeat(np.arange(len(a)), n_cols)
+    query_col = col_lo[query] + (np.arange(len(query)) - np.repeat(np.cumsum(n_cols) - n_cols, n_cols))
+    lo = np.searchsorted(keys, query_col * span + (a[query, 1] - max_h - y0), side='left')
+    hi = np.searchsorted(keys, query_col * span + (a[query, 3] - y0), side='right')
+
+    counts = np.maximum(hi - lo, 0)
+    rows = np.repeat(query, counts)
+    offsets = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+    cols = order[np.arange(len(rows)) + offsets]
+
+    ar, bc = a[rows], b[cols]
+    keep = ((np.minimum(ar[:, 2], bc[:, 2]) > np.maximum(ar[:, 0], bc[:, 0])) &
+            (np.minimum(ar[:, 3], bc[:, 3]) > np.maximum(ar[:, 1], bc[:, 1])))
+    return rows[keep], cols[keep]
+
+
+def pair_ious(atlbrs, btlbrs, rows, cols):
+    """
+    IoU só dos pares (rows[k], cols[k]); mesmos valores float32 de bbox_ious.
+    """
+    a = np.asarray(atlbrs, dtype=np.float64).reshape(-1, 4)[rows]
+    b = np.asarray(btlbrs, dtype=np.float64).reshape(-1, 4)[cols]
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+
+    inter = np.minimum(a[:, 2], b[:, 2])
+    inter -= np.maximum(a[:, 0], b[:, 0])
+    np.maximum(inter, 0, out=inter)
+    ih = np.minimum(a[:, 3], b[:, 3])
+    ih -= np.maximum(a[:, 1], b[:, 1])
+    np.maximum(ih, 0, out=ih)
+    inter *= ih
+
+    union = np.add(area_a, area_b, out=ih)
+    union -= inter
+    union += 1e-6
+    inter /= union
+    return inter.astype(np.float32)
+
+
+def sparse_linear_assignment(rows, cols, costs, shape, thresh):
+    """
+    linear_assignment para custos esparsos: só os pares (rows[k], cols[k]) têm
+    custo `costs[k]`; os demais são tratados como acima de `thresh`.
+
+    Os pares com custo <= thresh formam um grafo bipartido; cada componente
+    conexa é resolvida separadamente com lapjv (componentes de um só par casam
+    direto). Como pares acima do limiar nunca entram numa atribuição com
+    cost_limit, o resultado é o mesmo da matriz densa.
+
+    Returns:
+        (matches, unmatched_a, unmatched_b) como em linear_assignment
+    """
+    n_rows, n_cols = shape
+    edge = costs <= thresh
+    rows, cols, costs = rows[edge], cols[edge], costs[edge]
+    x = np.full(n_rows, -1, dtype=np.intp)
+    y = np.full(n_cols, -1, dtype=np.intp)
+
+    if len(costs):
+        graph = scipy.sparse.coo_matrix((np.ones(len(rows)), (rows, n_rows + cols)),
+                                        shape=(n_rows + n_cols, n_rows + n_cols))
+        n_labels, labels = connected_components(graph, directed=False)
+        component = labels[rows]
+        sizes = np.bincount(component, minlength=n_labels)
+
+        single = sizes[component] == 1
+        x[rows[single]] = cols[single]
+        y[cols[single]] = rows[single]
+
+        # Componentes com mais de um par: vértices e arestas agrupados por componente,
+        # com o índice local de cada linha/coluna na sua submatriz
+        multi_comp = np.flatnonzero(sizes > 1)
+        r, r_start, r_local = _group_vertices(labels[:n_rows], multi_comp)
+        c, c_start, c_local = _group_vertices(labels[n_rows:], multi_comp)
+        edges = np.flatnonzero(~single)
+        edges = edges[np.argsort(component[edges], kind='stable')]
+        e_start = np.searchsorted(component[edges], np.r_[multi_comp, n_labels])
+        for k in range(len(multi_comp)):
+            rs, cs = r[r_start[k]:r_start[k + 1]], c[c_start[k]:c_start[k + 1]]
+            e = edges[e_start[k]:e_start[k + 1]]
+            sub = np.full((len(rs), len(cs)), np.inf, dtype=costs.dtype)
+            sub[r_local[rows[e]], c_local[cols[e]]] = costs[e]
+            _, sx, _ = lap.lapjv(sub, extend_cost=True, cost_limit=thresh)
+            hit = sx >= 0
+            x[rs[hit]] = cs[sx[hit]]
+            y[cs[sx[hit]]] = rs[hit]
+
+    matched = np.flatnonzero(x >= 0)
+    matches = np.stack([matched, x[matched]], axis=1)
+    return matches, np.flatnonzero(x < 0), np.flatnonzero(y < 0)
+
+
+def _group_vertices(labels, components):
+    """
+    Vértices cujo rótulo está em `components` (ordenados), agrupados por componente.
+
+    Returns:
+        (vertices, start, local): vértices agrupados, início de cada componente em
+        `vertices` (len(components) + 1) e índice local de cada vértice no grupo
+    """
+    vertices = np.flatnonzero(np.isin(labels, components))
+    vertices = vertices[np.argsort(labels[vertices], kind='stable')]
+    start = np.searchsorted(labels[vertices], components)
+    start = np.r_[start, len(vertices)]
+    local = np.zeros(len(labels), dtype=np.intp)
+    local[vertices] = np.arange(len(vertices)) - np.repeat(start[:-1], np.diff(start))
+    return vertices, start, local
+
+
+def sparse_assignment(tracks, detections, thresh, kf=None, use_score=True, only_position=True, lambda_=0.98):
+    """
+    Associação IoU (+ fuse_score, + fuse_motion se `kf`) calculada só nos pares
+    que se sobrepõem, com o mesmo resultado de
+
+        dists = iou_distance(tracks, detections)
+        dists = fuse_score(dists, detections)            # se use_score
+        dists = fuse_motion(kf, dists, tracks, detections, only_position, lambda_)  # se kf
+        linear_assignment(dists, thresh)
+
+    Pares sem sobreposição custam 1 (ou >= lambda_ com fuse_motion); se `thresh`
+    não ficar abaixo disso, eles poderiam casar e o caminho denso é usado. Problemas
+    menores que SPARSE_MIN_PAIRS também vão pelo caminho denso.
+    """
+    zero_iou_cost = lambda_ if kf is not None else 1.0
+    if thresh >= zero_iou_cost or len(tracks) * len(detections) < SPARSE_MIN_PAIRS:
+        dists = iou_distance(tracks, detections)
+        if use_score:
+            dists = fuse_score(dists, detections)
+        if kf is not None:
+            dists = fuse_motion(kf, dists, tracks, detections, only_position, lambda_)
+        return linear_assignment(dists, thresh)
+
+    atlbrs, btlbrs = tracks_tlbr(tracks), tracks_tlbr(detections)
+    rows, cols = overlap_pairs(atlbrs, btlbrs)
+    costs = 1 - pair_ious(atlbrs, btlbrs, rows, cols)
+    if use_score and len(costs):
+        det_scores = detection_scores(detections)
+        costs = 1 - (1 - costs) * det_scores[cols]
+    if kf is not None and len(costs):
+        gating_threshold = kalman_filter.chi2inv95[2 if only_position else 4]
+        measurements = detection_xywh(detections)
+        means, covariances = tracks_state(tracks)
+        gating_distance = kf.pair_gating_distance(
+            means, covariances, measurements, rows, cols, only_position, metric='maha')
+        costs[gating_distance > gating_threshold] = np.inf
+        costs[:] = lambda_ * costs + (1 - lambda_) * gating_distance
+    return sparse_linear_assignment(rows, cols, costs, (len(tracks), len(detections)), thresh)
+
+
 def tlbr_expand(tlbr, scale=1.2):
     w = tlbr[2] - tlbr[0]
     h = tlbr[3] - tlbr[1]
@@ -117,14 +352,54 @@ def iou_distance(atracks, btracks):
         atlbrs = atracks
         btlbrs = btracks
     else:
-        atlbrs = [track.tlbr for track in atracks]
-        btlbrs = [track.tlbr for track in btracks]
+        atlbrs = tracks_tlbr(atracks)
+        btlbrs = tracks_tlbr(btracks)
     _ious = ious(atlbrs, btlbrs)
     cost_matrix = 1 - _ious
 
     return cost_matrix
 
 
+def _bank_slots(tracks):
+    """(bank, slots) when every track owns a slot of the same TrackBank, else (None, None)."""
+    if len(tracks) > 0 and getattr(tracks[0], 'slot', None) is not None:
+        bank = tracks[0].bank
+        slots = [track.slot for track in tracks]
+        if None not in slots and all(track.bank is bank for track in tracks):
+            return bank, slots
+    return None, None
+
+
+def tracks_tlbr(tracks):
+    """
+    Boxes (min x, min y, max x, max y) of a list of tracks or a DetectionSet.
+
+    Tracks that own a TrackBank slot are read in one slice of the bank and a
+    DetectionSet returns its rows; other tracks fall back to the per-track
+    property.
+    """
+    if isinstance(tracks, DetectionSet):
+        return tracks.tlbr
+    bank, slots = _bank_slots(tracks)
+    if bank is not None:
+        return bank.tlbr(slots)
+    return [track.tlbr for track in tracks]
+
+
+def detection_scores(detections):
+    """Scores of a DetectionSet or of a list of tracks."""
+    if isinstance(detections, DetectionSet):
+        return detections.score
+    return np.array([det.score for det in detections])
+
+
+def detection_xywh(detections):
+    """Kalman measurements (center x, center y, w, h) of a DetectionSet or of a list of tracks."""
+    if isinstance(detections, DetectionSet):
+        return detections.xywh
+    return np.asarray([det.to_xywh() for det in detections])
+
+
 def v_iou_distance(atracks, btracks):
     """
     Compute cost based on IoU
@@ -149,7 +424,7 @@ def v_iou_distance(atracks, btracks):
 def embedding_distance(tracks, detections, metric='cosine'):
     """
     :param tracks: list[STrack]
-    :param detections: list[BaseTrack]
+    :param detections: list[BaseTrack] | DetectionSet
     :param metric:
     :return: cost_matrix np.ndarray
     """
@@ -157,24 +432,38 @@ def embedding_distance(tracks, detections, metric='cosine'):
     cost_matrix = np.zeros((len(tracks), len(detections)), dtype=np.float64)
     if cost_matrix.size == 0:
         return cost_matrix
-    det_features = np.asarray([track.curr_feat for track in detections], dtype=np.float64)
+    if isinstance(detections, DetectionSet):
+        det_features = np.asarray(detections.curr_feat, dtype=np.float64)
+    else:
+        det_features = np.asarray([track.curr_feat for track in detections], dtype=np.float64)
     track_features = np.asarray([track.smooth_feat for track in tracks], dtype=np.float64)
 
     cost_matrix = np.maximum(0.0, cdist(track_features, det_features, metric))  # / 2.0  # Nomalized features
     return cost_matrix
 
 
+def tracks_state(tracks):
+    """
+    Kalman means (Tx8) and covariances (Tx8x8) of a list of tracks, read in
+    one slice of the TrackBank when the tracks own slots.
+    """
+    bank, slots = _bank_slots(tracks)
+    if bank is not None:
+        return bank.mean[slots], bank.covariance[slots]
+    return (np.asarray([track.mean for track in tracks]),
+            np.asarray([track.covariance for track in tracks]))
+
+
 def gate_cost_matrix(kf, cost_matrix, tracks, detections, only_position=False):
     if cost_matrix.size == 0:
         return cost_matrix
     gating_dim = 2 if only_position else 4
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
     # measurements = np.asarray([det.to_xyah() for det in detections])
-    measurements = np.asarray([det.to_xywh() for det in detections])
-    for row, track in enumerate(tracks):
-        gating_distance = kf.gating_distance(
-            track.mean, track.covariance, measurements, only_position)
-        cost_matrix[row, gating_distance > gating_threshold] = np.inf
+    measurements = detection_xywh(detections)
+    means, covariances = tracks_state(tracks)
+    gating_distance = kf.multi_gating_distance(means, covariances, measurements, only_position)
+    cost_matrix[gating_distance > gating_threshold] = np.inf
     return cost_matrix
 
 
@@ -184,12 +473,12 @@ def fuse_motion(kf, cost_matrix, tracks, detections, only_position=False, lambda
     gating_dim = 2 if only_position else 4
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
     # measurements = np.asarray([det.to_xyah() for det in detections])
-    measurements = np.asarray([det.to_xywh() for det in detections])
-    for row, track in enumerate(tracks):
-        gating_distance = kf.gating_distance(
-            track.mean, track.covariance, measurements, only_position, metric='maha')
-        cost_matrix[row, gating_distance > gating_threshold] = np.inf
-        cost_matrix[row] = lambda_ * cost_matrix[row] + (1 - lambda_) * gating_distance
+    measurements = detection_xywh(detections)
+    means, covariances = tracks_state(tracks)
+    gating_distance = kf.multi_gating_distance(
+        means, covariances, measurements, only_position, metric='maha')
+    cost_matrix[gating_distance > gating_threshold] = np.inf
+    cost_matrix[:] = lambda_ * cost_matrix + (1 - lambda_) * gating_distance
     return cost_matrix
 
 
@@ -200,7 +489,7 @@ def fuse_iou(cost_matrix, tracks, detections):
     iou_dist = iou_distance(tracks, detections)
     iou_sim = 1 - iou_dist
     fuse_sim = reid_sim * (1 + iou_sim) / 2
-    det_scores = np.array([det.score for det in detections])
+    det_scores = detection_scores(detections)
     det_scores = np.expand_dims(det_scores, axis=0).repeat(cost_matrix.shape[0], axis=0)
     #fuse_sim = fuse_sim * (1 + det_scores) / 2
     fuse_cost = 1 - fuse_sim
@@ -211,7 +500,7 @@ def fuse_score(cost_matrix, detections):
     if cost_matrix.size == 0:
         return cost_matrix
     iou_sim = 1 - cost_matrix
-    det_scores = np.array([det.score for det in detections])
+    det_scores = detection_scores(detections)
     det_scores = np.expand_dims(det_scores, axis=0).repeat(cost_matrix.shape[0], axis=0)
     fuse_sim = iou_sim * det_scores
     fuse_cost = 1 - fuse_sim
@@ -0,0 +1,84 @@
+import numpy as np
+
+from tracker.basetrack import TrackState
+
+
+class TrackBank(object):
+    """
+    Structure-of-arrays store for the state of live tracks.
+
+    Every activated track owns one slot (row) of contiguous, preallocated
+    arrays, so batched operations (Kalman prediction, camera-motion warp,
+    IoU, gating) run on fancy-indexed slices instead of gathering and
+    scattering per-track objects. Slots are recycled through a free list;
+    the arrays grow geometrically when they run out.
+
+    Fields
+    ------
+    mean : (capacity, 8) float64
+        Kalman state (x, y, w, h, vx, vy, vw, vh).
+    covariance : (capacity, 8, 8) float64
+        Kalman state covariance.
+    score, cls_id, frame_id, state : (capacity,)
+        Per-track scalars mirrored from the track handles.
+    pending_dt, pending_steps : (capacity,) float64, int64
+        Time and number of frames not yet applied by the Kalman prediction
+        (tracks predicted lazily, see BoTSORT's tiered association).
+    """
+
+    FIELDS = {
+        'mean': ((8,), np.float64),
+        'covariance': ((8, 8), np.float64),
+        'score': ((), np.float64),
+        'cls_id': ((), np.int64),
+        'frame_id': ((), np.int64),
+        'state': ((), np.int8),
+        'pending_dt': ((), np.float64),
+        'pending_steps': ((), np.int64),
+    }
+
+    def __init__(self, capacity=64):
+        self.capacity = 0
+        self.live = np.zeros(0, dtype=bool)
+        for name, (shape, dtype) in self.FIELDS.items():
+            setattr(self, name, np.zeros((0,) + shape, dtype=dtype))
+        self._free = []
+        self._grow(max(1, int(capacity)))
+
+    def __len__(self):
+        return int(self.live.sum())
+
+    def _grow(self, capacity):
+        """Reallocate every field with `capacity` rows, keeping the current rows."""
+        old = self.capacity
+        for name in list(self.FIELDS) + ['live']:
+            arr = getattr(self, name)
+            new = np.zeros((capacity,) + arr.shape[1:], dtype=arr.dtype)
+            new[:old] = arr
+            setattr(self, name, new)
+        self.state[old:] = TrackState.Removed
+        # Pop order: lowest free slot first
+        self._free.extend(range(capacity - 1, old - 1, -1))
+        self.capacity = capacity
+
+    def alloc(self):
+        """Reserve a free slot and return its index."""
+        if not self._free:
+            self._grow(2 * self.capacity)
+        slot = self._free.pop()
+        self.live[slot] = True
+        return slot
+
+    def release(self, slot):
+        """Return `slot` to the free list."""
+        self.live[slot] = False
+        self.state[slot] = TrackState.Removed
+        self._free.append(slot)
+
+    def tlbr(self, slots):
+        """Boxes (min x, min y, max x, max y) of the given slots as an Kx4 array."""
+        xywh = self.mean[slots, :4]
+        ret = np.empty_like(xywh)
+        ret[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        ret[:, 2:] = ret[:, :2] + xywh[:, 2:]
+        return ret